@@ -0,0 +1,25 @@
+# Benchmarks are run as modules from the repository root, e.g.
+#
+#     uv run python -m benchmarks.image_loading
+#
+# The hot path benchmarks (listings, autocomplete, reminders and thumbnails) seed their
+# database with the same generator as the seed command, and report latency percentiles
+# and throughput for each case.
+#
+# Each one runs against a throwaway database, so point Shopkeeper at one before anything
+# imports its config. Discord is never contacted, so the credentials are placeholders.
+import os
+import tempfile
+
+_benchmark_dir = tempfile.mkdtemp(prefix="shopkeeper-benchmark-")
+
+for key, value in {
+    "SHOPKEEPER_TOKEN": "benchmark",
+    "SHOPKEEPER_GUILD_ID": "1",
+    "SHOPKEEPER_CHANNEL_ID": "1",
+    "SHOPKEEPER_OWNER_ID": "1",
+    "SHOPKEEPER_DB_PATH": os.path.join(_benchmark_dir, "shopkeeper.sqlite"),
+    "SHOPKEEPER_IMAGE_PATH": os.path.join(_benchmark_dir, "images"),
+    "SHOPKEEPER_THUMBNAIL_PATH": os.path.join(_benchmark_dir, "thumbnails"),
+}.items():
+    os.environ[key] = value
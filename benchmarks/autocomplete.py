@@ -0,0 +1,75 @@
+"""Benchmark the listing autocomplete of the /edit commands, which Discord calls on
+every keystroke and gives up on if it doesn't answer within three seconds.
+
+Each case is typed by a different listing owner on each run, with the admin cases typed
+by the bot's owner.
+"""
+
+import asyncio
+from types import SimpleNamespace
+from typing import Annotated, Any, cast
+
+import discord
+import typer
+
+from benchmarks.harness import (
+    OWNERS,
+    measure,
+    prepare_database,
+    print_header,
+    print_result,
+)
+from shopkeeper.config import config
+from shopkeeper.db import read_engine
+from shopkeeper.features.edit import edit_autocomplete
+
+CASES = {
+    "empty": "",
+    "one letter": "k",
+    "prefix": "keyb",
+    "word": "keyboard",
+    "two words": "vintage key",
+    "no matches": "zzzz",
+    "admin: empty": "admin:",
+    "admin: prefix": "admin:keyb",
+}
+
+
+def interaction(user_id: int) -> discord.Interaction[Any]:
+    return cast(
+        discord.Interaction[Any], SimpleNamespace(user=SimpleNamespace(id=user_id))
+    )
+
+
+async def run(iterations: int) -> None:
+    print_header()
+
+    for name, current in CASES.items():
+        print_result(
+            await measure(
+                f"autocomplete: {name}",
+                lambda index, current=current: edit_autocomplete(
+                    interaction(
+                        config.owner_id
+                        if current.startswith("admin:")
+                        else index % OWNERS + 1
+                    ),
+                    current,
+                ),
+                iterations=iterations,
+            )
+        )
+
+    await read_engine.dispose()
+
+
+def main(
+    listings: Annotated[int, typer.Option(help="Number of listings to seed.")] = 10000,
+    iterations: Annotated[int, typer.Option(help="Timed calls per case.")] = 200,
+) -> None:
+    prepare_database(listings=listings, images=0, events=1)
+    asyncio.run(run(iterations))
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,106 @@
+"""Shared setup and reporting for the benchmarks: seeding the throwaway database, timing
+calls and printing latency percentiles and throughput."""
+
+import asyncio
+import statistics
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import typer
+
+from shopkeeper.seeding import SeedSummary, create_schema, seed
+
+# How many users the seeded listings are spread between, with ids from 1 up
+OWNERS = 100
+
+
+@dataclass
+class Result:
+    name: str
+    # Seconds taken by each call
+    latencies: list[float]
+    # Seconds taken by all of the calls together, which overlap when run concurrently
+    wall_time: float
+
+    def percentile(self, percent: int) -> float:
+        if len(self.latencies) == 1:
+            return self.latencies[0]
+        return statistics.quantiles(self.latencies, n=100, method="inclusive")[
+            percent - 1
+        ]
+
+    @property
+    def throughput(self) -> float:
+        return len(self.latencies) / self.wall_time
+
+
+def prepare_database(
+    *, listings: int, images: int, events: int, distinct_images: int = 20
+) -> SeedSummary:
+    """Create the benchmark database and fill it with synthetic data."""
+    create_schema()
+    summary = seed(
+        listings=listings,
+        images_per_listing=images,
+        events_per_listing=events,
+        distinct_images=distinct_images,
+        owners=OWNERS,
+        random_seed=0,
+    )
+    typer.echo(
+        f"Seeded {summary.listings} listings, {summary.images} images and "
+        f"{summary.events} events\n"
+    )
+    return summary
+
+
+async def measure(
+    name: str,
+    call: Callable[[int], Awaitable[object]],
+    *,
+    iterations: int,
+    concurrency: int = 1,
+    warmup: int = 1,
+) -> Result:
+    """Time a call, given the iteration's index, with up to the given number of calls
+    in flight at once. Warm up calls are given the indices after the timed ones."""
+    for index in range(warmup):
+        await call(iterations + index)
+
+    latencies: list[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(index: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await call(index)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(timed(index) for index in range(iterations)))
+    return Result(name, latencies, time.perf_counter() - start)
+
+
+def print_header() -> None:
+    typer.echo(
+        f"{'benchmark':<48} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>9}"
+    )
+
+
+def print_result(result: Result) -> None:
+    typer.echo(
+        f"{result.name:<48} {result.percentile(50) * 1000:>9.2f} "
+        f"{result.percentile(95) * 1000:>9.2f} {result.percentile(99) * 1000:>9.2f} "
+        f"{result.throughput:>9.1f}"
+    )
+
+
+__all__ = [
+    "OWNERS",
+    "Result",
+    "measure",
+    "prepare_database",
+    "print_header",
+    "print_result",
+]
@@ -0,0 +1,158 @@
+"""Compare loading listing images with a joined eager load against a select-in load.
+
+A joined load repeats every listing's columns once per image, while a select-in load
+fetches the images in a second, batched query. This reports the number and total size
+of the rows SQLite returns, and the wall time of loading every visible listing with its
+images.
+"""
+
+import asyncio
+import sqlite3
+import statistics
+import time
+from typing import Annotated, Any
+
+import typer
+from sqlalchemy import create_engine, event, insert, select
+from sqlalchemy.orm import joinedload, selectinload
+
+# Only imported so that ListingImage can refer to it
+import shopkeeper.models.listing_image_variant  # noqa: F401 # pyright: ignore[reportUnusedImport]
+from shopkeeper.config import config
+from shopkeeper.db import Base, read_engine, read_session
+from shopkeeper.models.listing import Listing, ListingStatus, ListingType
+from shopkeeper.models.listing_image import ListingImage
+
+strategies = {"joinedload": joinedload, "selectinload": selectinload}
+
+
+def seed(listing_count: int, images_per_listing: int) -> None:
+    engine = create_engine(config.sync_db_connection_uri)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Listing),
+            [
+                {
+                    "id": i,
+                    "title": f"Listing {i}",
+                    "description": "A reasonably long description. " * 10,
+                    "price": f"${i}",
+                    "type": ListingType.Sell,
+                    "status": ListingStatus.Open,
+                    "owner_id": i % 50,
+                    "message_id": i,
+                    "thread_id": i,
+                }
+                for i in range(1, listing_count + 1)
+            ],
+        )
+
+        if images_per_listing > 0:
+            connection.execute(
+                insert(ListingImage),
+                [
+                    {
+                        "path": f"{listing_id}/{n}.jpg",
+                        "width": 1600,
+                        "height": 1200,
+                        "listing_id": listing_id,
+                    }
+                    for listing_id in range(1, listing_count + 1)
+                    for n in range(images_per_listing)
+                ],
+            )
+
+    engine.dispose()
+
+
+async def load_listings(strategy: str) -> int:
+    query = (
+        select(Listing)
+        .options(strategies[strategy](Listing.images))
+        .filter_by(is_hidden=False)
+        .order_by(Listing.id.desc())
+    )
+
+    async with read_session() as session:
+        return len((await session.execute(query)).unique().scalars().all())
+
+
+def measure_rows(statements: list[tuple[str, Any]]) -> tuple[int, int]:
+    """Count the rows returned by each statement the ORM issued, and roughly how many
+    bytes they hold, by running them again."""
+    rows = 0
+    size = 0
+
+    with sqlite3.connect(config.db_path) as connection:
+        for statement, parameters in statements:
+            for row in connection.execute(statement, parameters):
+                rows += 1
+                size += sum(
+                    len(value) if isinstance(value, (str, bytes)) else 8
+                    for value in row
+                )
+
+    return rows, size
+
+
+async def measure(strategy: str, repeat: int) -> tuple[int, int, float]:
+    statements: list[tuple[str, Any]] = []
+
+    def record_statement(
+        _conn: Any, _cursor: Any, statement: str, parameters: Any, *_: Any
+    ) -> None:
+        statements.append((statement, parameters))
+
+    # Warm up the connection pool and the page cache, and find out which queries are issued
+    event.listen(read_engine.sync_engine, "before_cursor_execute", record_statement)
+    await load_listings(strategy)
+    event.remove(read_engine.sync_engine, "before_cursor_execute", record_statement)
+
+    timings: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await load_listings(strategy)
+        timings.append(time.perf_counter() - start)
+
+    return *measure_rows(statements), statistics.median(timings)
+
+
+async def run(listing_counts: list[int], image_counts: list[int], repeat: int) -> None:
+    typer.echo(
+        f"{'listings':>8} {'images':>6}  {'strategy':<12} "
+        f"{'rows':>9} {'KiB':>9} {'median ms':>10}"
+    )
+
+    for listing_count in listing_counts:
+        for images_per_listing in image_counts:
+            seed(listing_count, images_per_listing)
+            # Connections opened before reseeding would still see the old schema
+            await read_engine.dispose()
+
+            for strategy in strategies:
+                rows, size, wall_time = await measure(strategy, repeat)
+                typer.echo(
+                    f"{listing_count:>8} {images_per_listing:>6}  {strategy:<12} "
+                    f"{rows:>9} {size // 1024:>9} {wall_time * 1000:>10.1f}"
+                )
+
+    await read_engine.dispose()
+
+
+def main(
+    listings: Annotated[
+        list[int], typer.Option(help="Numbers of listings to load.")
+    ] = [1000, 10000],
+    images: Annotated[
+        list[int], typer.Option(help="Numbers of images per listing.")
+    ] = [0, 1, 5, 10],
+    repeat: Annotated[int, typer.Option(help="Timed runs per case.")] = 5,
+) -> None:
+    asyncio.run(run(listings, images, repeat))
+
+
+if __name__ == "__main__":
+    typer.run(main)
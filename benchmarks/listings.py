@@ -0,0 +1,115 @@
+"""Benchmark the listing endpoints the web UI polls: searching with every combination of
+filters, and counting the current user's listings with issues.
+
+Requests go through the listings router in-process, including validation and
+serialisation, but not the network or the rest of the app. By default the search response
+cache is turned off so that every request queries the database.
+"""
+
+import asyncio
+from itertools import combinations
+from typing import Annotated, Any
+
+import httpx
+import typer
+from fastapi import FastAPI
+
+from benchmarks.harness import measure, prepare_database, print_header, print_result
+from shopkeeper.db import read_engine
+from shopkeeper.web.dependencies.auth import require_discord_user
+from shopkeeper.web.listing_cache import search_cache
+from shopkeeper.web.routers import listings_router
+from shopkeeper.web.schemas.discord_user import DiscordUser
+
+FILTERS: dict[str, dict[str, Any]] = {
+    "statuses": {"statuses": ["open"]},
+    "owners": {"owners": ["1", "2", "3"]},
+    "types": {"types": ["sell"]},
+    "has_issues": {"has_issues": True},
+    "query": {"query": "keyb"},
+}
+
+
+def filter_combinations() -> list[tuple[str, dict[str, Any]]]:
+    cases: list[tuple[str, dict[str, Any]]] = []
+
+    for count in range(len(FILTERS) + 1):
+        for names in combinations(FILTERS, count):
+            body: dict[str, Any] = {}
+            for name in names:
+                body.update(FILTERS[name])
+            cases.append(("+".join(names) or "no filters", body))
+
+    # Every sort other than the default, with a query so that relevance is allowed
+    for sort in ("price", "title", "relevance"):
+        cases.append((f"query, by {sort}", {**FILTERS["query"], "sort": sort}))
+
+    return cases
+
+
+def benchmark_app() -> FastAPI:
+    app = FastAPI()
+    app.include_router(listings_router, prefix="/api/listings")
+    app.dependency_overrides[require_discord_user] = lambda: DiscordUser(
+        id="1", username="benchmark", is_owner=False
+    )
+    return app
+
+
+async def run(iterations: int, concurrency: int) -> None:
+    print_header()
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=benchmark_app()),
+        base_url="http://benchmark",
+    ) as client:
+
+        async def search(body: dict[str, Any]) -> None:
+            response = await client.post("/api/listings/search", json=body)
+            response.raise_for_status()
+
+        for name, body in filter_combinations():
+            result = await measure(
+                f"search: {name}",
+                lambda _, body=body: search(body),
+                iterations=iterations,
+                concurrency=concurrency,
+            )
+            print_result(result)
+
+        async def issue_count(_: int) -> None:
+            response = await client.get("/api/listings/issue-count")
+            response.raise_for_status()
+
+        print_result(
+            await measure(
+                "issue count",
+                issue_count,
+                iterations=iterations,
+                concurrency=concurrency,
+            )
+        )
+
+    await read_engine.dispose()
+
+
+def main(
+    listings: Annotated[int, typer.Option(help="Number of listings to seed.")] = 10000,
+    images: Annotated[int, typer.Option(help="Number of images per listing.")] = 3,
+    iterations: Annotated[int, typer.Option(help="Timed requests per case.")] = 200,
+    concurrency: Annotated[int, typer.Option(help="Requests in flight at once.")] = 1,
+    cached: Annotated[
+        bool, typer.Option(help="Answer repeated searches from the response cache.")
+    ] = False,
+) -> None:
+    prepare_database(listings=listings, images=images, events=3)
+
+    if not cached:
+        # Every response is evicted as soon as it's added
+        search_cache.max_entries = 0
+
+    asyncio.run(run(iterations, concurrency))
+
+
+if __name__ == "__main__":
+    typer.run(main)
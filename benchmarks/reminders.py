@@ -0,0 +1,60 @@
+"""Benchmark finding the users due a reminder about their listings with issues and
+queueing the reminders, against a stubbed Discord client which reports every user as
+still being in the server.
+
+The reminder interval is set to zero, so every user with issues is due again on every
+run and each one does the full amount of work.
+"""
+
+import asyncio
+from typing import Annotated
+
+import typer
+
+import shopkeeper.web.tasks.reminders as reminders
+from benchmarks.harness import measure, prepare_database, print_header, print_result
+from shopkeeper.config import config
+from shopkeeper.db import read_engine, write_engine
+
+
+class StubGuild:
+    def get_member(self, user_id: int) -> object:
+        return object()
+
+
+class StubClient:
+    async def wait_until_ready(self) -> None:
+        pass
+
+    def get_guild(self, guild_id: int) -> StubGuild:
+        return StubGuild()
+
+
+async def run(iterations: int) -> None:
+    print_header()
+    print_result(
+        await measure(
+            "send reminders",
+            lambda _: reminders.send_reminders(),
+            iterations=iterations,
+        )
+    )
+
+    await read_engine.dispose()
+    await write_engine.dispose()
+
+
+def main(
+    listings: Annotated[int, typer.Option(help="Number of listings to seed.")] = 10000,
+    iterations: Annotated[int, typer.Option(help="Timed runs.")] = 50,
+) -> None:
+    prepare_database(listings=listings, images=1, events=1)
+
+    reminders.client = StubClient()  # type: ignore[assignment]
+    config.reminder_interval = 0
+
+    asyncio.run(run(iterations))
+
+
+if __name__ == "__main__":
+    typer.run(main)
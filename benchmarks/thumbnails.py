@@ -0,0 +1,98 @@
+"""Benchmark rendering listing image variants in the image processing pool.
+
+Every image is rendered from cold, as a request for a missing thumbnail would, once for a
+single thumbnail in each supported format and once for the full set of variants that
+backfill-image-variants and ingest generate. Latencies include waiting for a free worker,
+so throughput is the figure to compare across changes to the number of workers.
+"""
+
+import asyncio
+from typing import Annotated
+
+import typer
+from sqlalchemy import select
+
+# Only imported so that ListingImage can refer to it
+import shopkeeper.models.listing_image_variant  # noqa: F401 # pyright: ignore[reportUnusedImport]
+from benchmarks.harness import measure, prepare_database, print_header, print_result
+from shopkeeper.config import config
+from shopkeeper.db import read_engine, read_session
+from shopkeeper.imaging import (
+    THUMBNAIL_SIZE,
+    ensure_variant,
+    generate_variants,
+    image_processor,
+    supported_formats,
+)
+from shopkeeper.models.listing_image import ListingImage
+
+
+async def run(iterations: int, concurrency: int) -> None:
+    # One more image per case for warming up
+    needed = (iterations + 1) * (len(supported_formats()) + 1)
+
+    async with read_session() as session:
+        images = (
+            (
+                await session.execute(
+                    select(ListingImage)
+                    .filter_by(is_hidden=False)
+                    .order_by(ListingImage.id)
+                    .limit(needed)
+                )
+            )
+            .scalars()
+            .all()
+        )
+    if len(images) < needed:
+        raise typer.BadParameter("Not enough images seeded for that many iterations.")
+
+    # Each case takes fresh images, so that nothing is already rendered
+    remaining = iter(images)
+
+    print_header()
+
+    for format in supported_formats():
+        batch = [next(remaining) for _ in range(iterations + 1)]
+        print_result(
+            await measure(
+                f"thumbnail: {format.value}",
+                lambda index, batch=batch, format=format: ensure_variant(
+                    batch[index].id,
+                    config.image_path / batch[index].path,
+                    THUMBNAIL_SIZE,
+                    format,
+                ),
+                iterations=iterations,
+                concurrency=concurrency,
+            )
+        )
+
+    batch = [next(remaining) for _ in range(iterations + 1)]
+    print_result(
+        await measure(
+            "all variants",
+            lambda index: generate_variants(batch[index]),
+            iterations=iterations,
+            concurrency=concurrency,
+        )
+    )
+
+    image_processor.shutdown()
+    await read_engine.dispose()
+
+
+def main(
+    iterations: Annotated[int, typer.Option(help="Images rendered per case.")] = 50,
+    concurrency: Annotated[
+        int, typer.Option(help="Renders in flight at once.")
+    ] = config.image_workers,
+) -> None:
+    # Listings share a handful of files, but variants are stored per image, so every
+    # image is rendered from scratch regardless
+    prepare_database(listings=iterations * 3, images=3, events=1)
+    asyncio.run(run(iterations, concurrency))
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -19,14 +19,14 @@ export type GetListingsError = Fetcher.ErrorWrapper<{
     payload: Schemas.HTTPValidationError;
 }>;
 
-export type GetListingsResponse = Schemas.FullListingSchema[];
+export type GetListingsResponse = Schemas.ListingSearchResultsSchema;
 
 export type GetListingsVariables = {
     body?: Schemas.SearchListingsSchema;
 } & ShopkeeperContext['fetcherOptions'];
 
 /**
- * Retrieve a list of listings.
+ * Retrieve a page of listings.
  */
 export const fetchGetListings = (variables: GetListingsVariables, signal?: AbortSignal) =>
     shopkeeperFetch<GetListingsResponse, GetListingsError, Schemas.SearchListingsSchema, {}, {}, {}>({
@@ -37,7 +37,7 @@ export const fetchGetListings = (variables: GetListingsVariables, signal?: Abort
     });
 
 /**
- * Retrieve a list of listings.
+ * Retrieve a page of listings.
  */
 export function getListingsQuery(variables: GetListingsVariables): {
     queryKey: reactQuery.QueryKey;
@@ -64,7 +64,7 @@ export function getListingsQuery(variables: GetListingsVariables | reactQuery.Sk
 }
 
 /**
- * Retrieve a list of listings.
+ * Retrieve a page of listings.
  */
 export const useSuspenseGetListings = <TData = GetListingsResponse>(
     variables: GetListingsVariables,
@@ -82,7 +82,7 @@ export const useSuspenseGetListings = <TData = GetListingsResponse>(
 };
 
 /**
- * Retrieve a list of listings.
+ * Retrieve a page of listings.
  */
 export const useGetListings = <TData = GetListingsResponse>(
     variables: GetListingsVariables | reactQuery.SkipToken,
@@ -2,6 +2,11 @@ import { ShopkeeperContext } from './shopkeeperContext';
 
 const baseUrl = ''; // TODO add your baseUrl
 
+// Responses which came with an ETag, by request, so that repeating the request can be answered with a 304 instead
+// of the whole response again. Oldest entries are evicted first.
+const conditionalCache = new Map<string, { etag: string; data: unknown }>();
+const conditionalCacheSize = 100;
+
 export type ErrorWrapper<TError> = TError | { status: 'unknown'; payload: string };
 
 export type ShopkeeperFetcherOptions<TBody, THeaders, TQueryParams, TPathParams> = {
@@ -47,12 +52,26 @@ export async function shopkeeperFetch<
             delete requestHeaders['Content-Type'];
         }
 
-        const response = await window.fetch(`${baseUrl}${resolveUrl(url, queryParams, pathParams)}`, {
+        const resolvedUrl = `${baseUrl}${resolveUrl(url, queryParams, pathParams)}`;
+        const requestBody = body ? (body instanceof FormData ? body : JSON.stringify(body)) : undefined;
+        const cacheKey =
+            requestBody instanceof FormData ? undefined : `${method.toUpperCase()} ${resolvedUrl} ${requestBody ?? ''}`;
+        const cached = cacheKey !== undefined ? conditionalCache.get(cacheKey) : undefined;
+        if (cached) {
+            requestHeaders['If-None-Match'] = cached.etag;
+        }
+
+        const response = await window.fetch(resolvedUrl, {
             signal,
             method: method.toUpperCase(),
-            body: body ? (body instanceof FormData ? body : JSON.stringify(body)) : undefined,
+            body: requestBody,
             headers: requestHeaders,
         });
+        if (response.status === 304 && cached && cacheKey !== undefined) {
+            conditionalCache.delete(cacheKey);
+            conditionalCache.set(cacheKey, cached);
+            return cached.data as TData;
+        }
         if (!response.ok) {
             try {
                 error = await response.json();
@@ -63,7 +82,16 @@ export async function shopkeeperFetch<
                 };
             }
         } else if (response.headers.get('content-type')?.includes('json')) {
-            return await response.json();
+            const data = await response.json();
+            const etag = response.headers.get('etag');
+            if (etag && cacheKey !== undefined) {
+                conditionalCache.delete(cacheKey);
+                conditionalCache.set(cacheKey, { etag, data });
+                if (conditionalCache.size > conditionalCacheSize) {
+                    conditionalCache.delete(conditionalCache.keys().next().value!);
+                }
+            }
+            return data;
         } else {
             // if it is not a json response, assume it is a blob and cast it to TData
             return (await response.blob()) as unknown as TData;
@@ -64,6 +64,13 @@ export type ListingImageSchema = {
     height: number;
     url: string;
     thumbnail_url: string;
+    srcset: ListingImageVariantSchema[];
+};
+
+export type ListingImageVariantSchema = {
+    url: string;
+    width: number;
+    height: number;
 };
 
 export type ListingIssueDetailsSchema = {
@@ -89,6 +96,13 @@ export type ListingSchema = {
     issues: ListingIssueDetailsSchema[];
 };
 
+export type ListingSearchResultsSchema = {
+    listings: FullListingSchema[];
+    next_cursor: string | null;
+};
+
+export type ListingSortKey = 'created' | 'price' | 'title' | 'relevance';
+
 export type ListingStatus = 'open' | 'pending' | 'closed';
 
 export type ListingType = 'buy' | 'sell';
@@ -98,6 +112,20 @@ export type SearchListingsSchema = {
     owners?: string[] | null;
     types?: ListingType[] | null;
     has_issues?: boolean | null;
+    query?: string | null;
+    /**
+     * Prices are free text, so price order is text order rather than by amount: "£100" comes before "£20", and listings without a price come first.
+     *
+     * @default created
+     */
+    sort?: ListingSortKey;
+    /**
+     * @default 50
+     * @maximum 200
+     * @minimum 1
+     */
+    limit?: number;
+    cursor?: string | null;
 };
 
 export type ValidationError = {
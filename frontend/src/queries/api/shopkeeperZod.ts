@@ -11,12 +11,19 @@ export const discordUserSchema = z.object({
 
 export const listingStatusSchema = z.union([z.literal('open'), z.literal('pending'), z.literal('closed')]);
 
+export const listingImageVariantSchemaSchema = z.object({
+    url: z.string(),
+    width: z.number(),
+    height: z.number(),
+});
+
 export const listingImageSchemaSchema = z.object({
     id: z.number(),
     width: z.number(),
     height: z.number(),
     url: z.string(),
     thumbnail_url: z.string(),
+    srcset: z.array(listingImageVariantSchemaSchema),
 });
 
 export const validationErrorSchema = z.object({
@@ -36,11 +43,22 @@ export const listingIssueDetailsSchemaSchema = z.object({
     resolution_location: listingIssueResolutionLocationSchema,
 });
 
+export const listingSortKeySchema = z.union([
+    z.literal('created'),
+    z.literal('price'),
+    z.literal('title'),
+    z.literal('relevance'),
+]);
+
 export const searchListingsSchemaSchema = z.object({
     statuses: z.array(listingStatusSchema).optional().nullable(),
     owners: z.array(z.string()).optional().nullable(),
     types: z.array(listingTypeSchema).optional().nullable(),
     has_issues: z.boolean().optional().nullable(),
+    query: z.string().optional().nullable(),
+    sort: listingSortKeySchema.optional(),
+    limit: z.number().min(1).max(200).optional(),
+    cursor: z.string().optional().nullable(),
 });
 
 export const createListingSchemaSchema = z.object({
@@ -70,6 +88,11 @@ export const fullListingSchemaSchema = z.object({
     images: z.array(listingImageSchemaSchema),
 });
 
+export const listingSearchResultsSchemaSchema = z.object({
+    listings: z.array(fullListingSchemaSchema),
+    next_cursor: z.string().nullable(),
+});
+
 export const hTTPValidationErrorSchema = z.object({
     detail: z.array(validationErrorSchema).optional(),
 });
@@ -0,0 +1,87 @@
+import { queryClient } from '@/lib/query';
+import { fetchGetListings, getListingsQuery, getUserIssueCountQuery } from '@/queries/api/shopkeeperComponents';
+import type { FullListingSchema, SearchListingsSchema } from '@/queries/api/shopkeeperSchemas';
+import { infiniteQueryOptions } from '@tanstack/react-query';
+import { useEffect } from 'react';
+
+export type ListingFilters = Omit<SearchListingsSchema, 'cursor'>;
+
+export function getListingsInfiniteQuery(filters: ListingFilters) {
+    return infiniteQueryOptions({
+        // Shares the generated query's key prefix so invalidating ['api', 'listings'] still refreshes it
+        queryKey: [...getListingsQuery({ body: filters }).queryKey, 'infinite'],
+        queryFn: ({ pageParam, signal }) => fetchGetListings({ body: { ...filters, cursor: pageParam } }, signal),
+        initialPageParam: null as string | null,
+        getNextPageParam: (lastPage) => lastPage.next_cursor,
+    });
+}
+
+type ListingStreamEvent =
+    | { id: number; type: string; matches: true; listing: FullListingSchema }
+    // Nothing else about listings which don't match is sent, e.g. once they're hidden
+    | { id: number; type: string; matches: false };
+
+function listingStreamUrl(filters: ListingFilters) {
+    const params = new URLSearchParams();
+    filters.statuses?.forEach((status) => params.append('statuses', status));
+    filters.owners?.forEach((owner) => params.append('owners', owner));
+    filters.types?.forEach((type) => params.append('types', type));
+    if (filters.has_issues !== undefined && filters.has_issues !== null) {
+        params.set('has_issues', String(filters.has_issues));
+    }
+    if (filters.query) {
+        params.set('query', filters.query);
+    }
+    return `/api/listings/events?${params}`;
+}
+
+/**
+ * Keep the listings shown for the filters up to date with changes streamed from the server, patching listings in
+ * place rather than refetching every page. The browser reconnects by itself, resuming from the last event received.
+ */
+export function useListingStream(filters: ListingFilters) {
+    const filtersKey = JSON.stringify(filters);
+
+    useEffect(() => {
+        const { queryKey } = getListingsInfiniteQuery(JSON.parse(filtersKey));
+        const source = new EventSource(listingStreamUrl(JSON.parse(filtersKey)));
+
+        source.addEventListener('listing', (event: MessageEvent<string>) => {
+            const streamEvent: ListingStreamEvent = JSON.parse(event.data);
+            let shown = false;
+
+            queryClient.setQueryData(queryKey, (data) => {
+                if (!data) {
+                    return data;
+                }
+
+                return {
+                    ...data,
+                    pages: data.pages.map((page) => ({
+                        ...page,
+                        listings: page.listings.flatMap((existing) => {
+                            if (existing.id !== streamEvent.id) {
+                                return [existing];
+                            }
+                            shown = true;
+                            return streamEvent.matches ? [streamEvent.listing] : [];
+                        }),
+                    })),
+                };
+            });
+
+            // Where a listing that wasn't shown before belongs depends on the sort, so leave placing it to the server
+            if (streamEvent.matches && !shown) {
+                queryClient.invalidateQueries({ queryKey });
+            }
+            queryClient.invalidateQueries({ queryKey: getUserIssueCountQuery({}).queryKey });
+        });
+
+        // Sent when too much was missed while disconnected to catch up on
+        source.addEventListener('reset', () => {
+            queryClient.invalidateQueries({ queryKey });
+        });
+
+        return () => source.close();
+    }, [filtersKey]);
+}
@@ -4,13 +4,7 @@ import ListingFiltersDialog from '@/components/dialogs/Filters';
 import { queryClient } from '@/lib/query';
 import { defaultQueryParams, useStore } from '@/lib/state';
 import { arraysEqual, cn, pluralize } from '@/lib/utils';
-import {
-    getListingsQuery,
-    useGetUserIssueCount,
-    useHideImage,
-    useHideListing,
-    useSuspenseGetListings,
-} from '@/queries/api/shopkeeperComponents';
+import { useGetUserIssueCount, useHideImage, useHideListing } from '@/queries/api/shopkeeperComponents';
 import type {
     FullListingSchema,
     ListingImageSchema,
@@ -18,12 +12,14 @@ import type {
     ListingIssueResolutionLocation,
 } from '@/queries/api/shopkeeperSchemas';
 import { listingStatusSchema, listingTypeSchema } from '@/queries/api/shopkeeperZod';
+import { getListingsInfiniteQuery, useListingStream } from '@/queries/listings';
 import {
     Button,
     Card,
     CardBody,
     CardFooter,
     CardHeader,
+    Input,
     Modal,
     ModalBody,
     ModalContent,
@@ -32,7 +28,7 @@ import {
     Tooltip,
     useDisclosure,
 } from '@heroui/react';
-import { keepPreviousData } from '@tanstack/react-query';
+import { keepPreviousData, useSuspenseInfiniteQuery } from '@tanstack/react-query';
 import { createFileRoute, stripSearchParams, useNavigate } from '@tanstack/react-router';
 import { zodValidator } from '@tanstack/zod-adapter';
 import useEmblaCarousel from 'embla-carousel-react';
@@ -45,14 +41,15 @@ import {
     FilterX,
     Image,
     LucideProps,
+    Search,
     Text,
 } from 'lucide-react';
-import { Masonry, type RenderComponentProps } from 'masonic';
-import React, { useCallback } from 'react';
+import { Masonry, type RenderComponentProps, useInfiniteLoader } from 'masonic';
+import React, { useCallback, useRef, useState } from 'react';
 import Markdown from 'react-markdown';
 import remarkGemoji from 'remark-gemoji';
 import remarkGfm from 'remark-gfm';
-import { useWindowSize } from 'usehooks-ts';
+import { useDebounceCallback, useWindowSize } from 'usehooks-ts';
 import { z } from 'zod';
 
 const searchSchema = z.object({
@@ -60,6 +57,7 @@ const searchSchema = z.object({
     type: z.array(listingTypeSchema).default(defaultQueryParams.type),
     owner: z.array(z.string()).optional(),
     has_issues: z.boolean().optional(),
+    q: z.string().optional(),
 });
 
 export const Route = createFileRoute('/')({
@@ -68,10 +66,17 @@ export const Route = createFileRoute('/')({
     search: {
         middlewares: [stripSearchParams(defaultQueryParams)],
     },
-    loaderDeps: ({ search: { status, type, owner, has_issues } }) => ({ status, type, owner, has_issues }),
-    loader: ({ deps: { status, type, owner, has_issues } }) =>
-        queryClient.ensureQueryData(
-            getListingsQuery({ body: { statuses: status, types: type, owners: owner, has_issues } }),
+    loaderDeps: ({ search: { status, type, owner, has_issues, q } }) => ({ status, type, owner, has_issues, q }),
+    loader: ({ deps: { status, type, owner, has_issues, q } }) =>
+        queryClient.ensureInfiniteQueryData(
+            getListingsInfiniteQuery({
+                statuses: status,
+                types: type,
+                owners: owner,
+                has_issues,
+                query: q,
+                sort: q ? 'relevance' : 'created',
+            }),
         ),
 });
 
@@ -167,6 +172,12 @@ function ListingImage({ image }: { image: ListingImageSchema }) {
                 height={image.height}
                 loading="lazy"
                 src={image.thumbnail_url}
+                srcSet={
+                    image.srcset.length > 0
+                        ? image.srcset.map((variant) => `${variant.url} ${variant.width}w`).join(', ')
+                        : undefined
+                }
+                sizes="(min-width: 1280px) 25vw, (min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
                 onClick={onOpen}
             />
             <Modal isOpen={isOpen} onOpenChange={onOpenChange}>
@@ -301,6 +312,40 @@ function ListingCard({ data: listing }: RenderComponentProps<FullListingSchema>)
     );
 }
 
+function ListingSearchInput() {
+    const { q } = Route.useSearch();
+    const navigate = useNavigate({ from: Route.fullPath });
+    const [value, setValue] = useState(q ?? '');
+
+    // Follow the search param when it's changed elsewhere, e.g. by resetting the filters
+    const [previousQ, setPreviousQ] = useState(q);
+    if (q !== previousQ) {
+        setPreviousQ(q);
+        if ((q ?? '') !== value.trim()) {
+            setValue(q ?? '');
+        }
+    }
+
+    const setQuery = useDebounceCallback((query: string) => {
+        navigate({ search: (prevSearch) => ({ ...prevSearch, q: query.trim() || undefined }) });
+    }, 300);
+
+    return (
+        <Input
+            aria-label="Search listings"
+            placeholder="Search listings"
+            startContent={<Search className="text-foreground-500 h-4 w-4" />}
+            isClearable
+            value={value}
+            onValueChange={(query) => {
+                setValue(query);
+                setQuery(query);
+            }}
+            className="md:w-64"
+        />
+    );
+}
+
 function RouteComponent() {
     const filters = Route.useSearch();
     const navigate = useNavigate({ from: Route.fullPath });
@@ -321,20 +366,49 @@ function RouteComponent() {
     const filterHasIssues = filters.has_issues;
     const hasIssuesFilterSet = filterHasIssues !== undefined;
 
-    const filtersActive = statusFilterSet || ownerFilterSet || typeFilterSet || hasIssuesFilterSet;
+    const searchQuery = filters.q;
+
+    const filtersActive = statusFilterSet || ownerFilterSet || typeFilterSet || hasIssuesFilterSet || !!searchQuery;
 
     const { width: windowWidth } = useWindowSize();
-    const { data: listings } = useSuspenseGetListings(
+    const listingFilters = {
+        statuses: filteredStatuses,
+        owners: filteredOwners,
+        types: filteredTypes,
+        has_issues: filterHasIssues,
+        query: searchQuery,
+        sort: searchQuery ? ('relevance' as const) : ('created' as const),
+    };
+    const {
+        data: listings,
+        hasNextPage,
+        isFetchingNextPage,
+        fetchNextPage,
+    } = useSuspenseInfiniteQuery({
+        ...getListingsInfiniteQuery(listingFilters),
+        select: (data) => data.pages.flatMap((page) => page.listings),
+        placeholderData: keepPreviousData,
+    });
+    useListingStream(listingFilters);
+    const loadMoreListings = useInfiniteLoader(
+        () => {
+            if (hasNextPage && !isFetchingNextPage) {
+                fetchNextPage();
+            }
+        },
         {
-            body: {
-                statuses: filteredStatuses,
-                owners: filteredOwners,
-                types: filteredTypes,
-                has_issues: filterHasIssues,
-            },
+            isItemLoaded: (index, items) => !!items[index],
+            totalItems: hasNextPage ? Infinity : listings.length,
         },
-        { placeholderData: keepPreviousData },
     );
+    // Masonic can't handle items disappearing from its list, so remount it whenever the list shrinks
+    // (filters changing, listings being hidden) but not when another page is appended
+    const masonryKey = useRef({ key: 0, length: 0 });
+    if (listings.length < masonryKey.current.length) {
+        masonryKey.current.key += 1;
+    }
+    masonryKey.current.length = listings.length;
+
     const { data: issueCount } = useGetUserIssueCount({});
     const currentUserId = useStore((state) => state.user?.id);
 
@@ -385,6 +459,7 @@ function RouteComponent() {
                             <span>Reset filters</span>
                         </Button>
                     )}
+                    <ListingSearchInput />
                     <div className="space-x-2">
                         <ListingFiltersDialog />
                         <CreateListingDialog />
@@ -399,7 +474,8 @@ function RouteComponent() {
                         columnGutter={8}
                         columnCount={columnCount}
                         itemKey={({ id }) => id}
-                        key={listings.length}
+                        onRender={loadMoreListings}
+                        key={masonryKey.current.key}
                     />
                 ) : (
                     <div className="text-foreground-500 flex justify-center italic">
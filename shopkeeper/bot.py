@@ -1,36 +1,138 @@
+import asyncio
+import re
 import traceback
+from types import SimpleNamespace
 
+import aiohttp
 import discord
+import discord.abc
 from discord import app_commands
-from sqlalchemy import select
+from sqlalchemy import Select, select
 
 import shopkeeper.models.listing as listing
 import shopkeeper.models.listing_image as listing_image
 
 from .config import config
-from .db import async_session
+from .db import read_session, write_session
+from .imaging import ImageProcessorBusy, generate_variants, ingest_attachments
+from .metrics import Counter, Histogram
 
 guild = discord.Object(config.guild_id)
 
+channel_lookups = Counter(
+    "shopkeeper_discord_channel_lookups_total",
+    "Channel and thread lookups, by whether the gateway cache or the REST API answered them.",
+    ("source",),
+)
+
+
+discord_request_seconds = Histogram(
+    "shopkeeper_discord_request_seconds",
+    "Time taken by Discord REST API requests, by method, route and response status.",
+    ("method", "route", "status"),
+)
+discord_rate_limits = Counter(
+    "shopkeeper_discord_rate_limits_total",
+    "Discord REST API requests which were rate limited, by method and route.",
+    ("method", "route"),
+)
+
+
+def discord_route(path: str) -> str:
+    """Replace the ids and tokens in a Discord API path, so that requests to the same
+    endpoint share labels."""
+    path = re.sub(r"/\d+", "/{id}", path)
+    return re.sub(r"/(webhooks|interactions)/\{id\}/[^/]+", r"/\1/{id}/{token}", path)
+
+
+async def on_request_start(
+    _: aiohttp.ClientSession,
+    context: SimpleNamespace,
+    __: aiohttp.TraceRequestStartParams,
+) -> None:
+    context.started_at = asyncio.get_running_loop().time()
+
+
+async def on_request_end(
+    _: aiohttp.ClientSession,
+    context: SimpleNamespace,
+    params: aiohttp.TraceRequestEndParams,
+) -> None:
+    route = discord_route(params.url.path)
+    discord_request_seconds.observe(
+        asyncio.get_running_loop().time() - context.started_at,
+        method=params.method,
+        route=route,
+        status=str(params.response.status),
+    )
+    if params.response.status == 429:
+        discord_rate_limits.inc(method=params.method, route=route)
+
+
+async def on_request_exception(
+    _: aiohttp.ClientSession,
+    context: SimpleNamespace,
+    params: aiohttp.TraceRequestExceptionParams,
+) -> None:
+    discord_request_seconds.observe(
+        asyncio.get_running_loop().time() - context.started_at,
+        method=params.method,
+        route=discord_route(params.url.path),
+        status="error",
+    )
+
+
+http_trace = aiohttp.TraceConfig()
+http_trace.on_request_start.append(on_request_start)
+http_trace.on_request_end.append(on_request_end)
+http_trace.on_request_exception.append(on_request_exception)
+
+
+def open_listing_by_thread_query(thread_id: int) -> "Select[tuple[listing.Listing]]":
+    return (
+        select(listing.Listing)
+        .filter_by(thread_id=thread_id)
+        .filter(listing.Listing.status != listing.ListingStatus.Closed)
+    )
+
+
+def owned_listing_by_thread_query(
+    thread_id: int, owner_id: int
+) -> "Select[tuple[listing.Listing]]":
+    return select(listing.Listing).filter_by(thread_id=thread_id, owner_id=owner_id)
+
 
 class ShopkeeperBot(discord.Client):
     def __init__(self, *, intents: discord.Intents):
-        super().__init__(intents=intents)
+        super().__init__(intents=intents, http_trace=http_trace)
 
         self.tree = app_commands.CommandTree(self)
 
+    async def resolve_channel(
+        self, channel_id: int
+    ) -> discord.abc.GuildChannel | discord.Thread | discord.abc.PrivateChannel:
+        """Look up a channel or thread, only making a request to Discord if it isn't in the
+        gateway cache (e.g. archived threads)."""
+        channel = self.get_channel(channel_id)
+
+        if channel is None:
+            channel_lookups.inc(source="rest")
+            return await self.fetch_channel(channel_id)
+
+        channel_lookups.inc(source="cache")
+        return channel
+
+    def messageable(self, channel_id: int) -> discord.PartialMessageable:
+        """Get a handle for sending messages to, or editing messages in, a channel without
+        looking it up at all."""
+        return self.get_partial_messageable(channel_id, guild_id=config.guild_id)
+
     async def on_thread_update(self, before: discord.Thread, after: discord.Thread):
         try:
             if after.archived and not before.archived:
-                async with async_session() as session:
+                async with read_session() as session:
                     thread_listing = (
-                        await session.execute(
-                            select(listing.Listing)
-                            .filter_by(thread_id=after.id)
-                            .filter(
-                                listing.Listing.status != listing.ListingStatus.Closed
-                            )
-                        )
+                        await session.execute(open_listing_by_thread_query(after.id))
                     ).scalar_one_or_none()
 
                     if not thread_listing:
@@ -45,26 +147,58 @@ class ShopkeeperBot(discord.Client):
             if not message.attachments:
                 return
 
-            async with async_session() as session:
-                async with session.begin():
-                    message_listing = (
-                        await session.execute(
-                            select(listing.Listing).filter_by(
-                                thread_id=message.channel.id, owner_id=message.author.id
-                            )
+            async with read_session() as session:
+                message_listing = (
+                    await session.execute(
+                        owned_listing_by_thread_query(
+                            message.channel.id, message.author.id
                         )
-                    ).scalar_one_or_none()
+                    )
+                ).scalar_one_or_none()
 
-                    if not message_listing:
-                        return
+            if not message_listing:
+                return
+
+            # Downloaded before the write transaction is opened, so that it isn't held
+            # while waiting on Discord
+            ingested_images = await ingest_attachments(message.attachments)
+            if not ingested_images:
+                return
 
-                    for attachment in message.attachments:
-                        await listing_image.ListingImage.from_attachment(
-                            listing_id=message_listing.id,
-                            attachment=attachment,
-                            session=session,
+            async with write_session() as session:
+                try:
+                    async with session.begin():
+                        images = [
+                            await listing_image.ListingImage.from_ingested(
+                                listing_id=message_listing.id,
+                                image=image,
+                                session=session,
+                            )
+                            for image in ingested_images
+                        ]
+                        await listing.Listing.update_issue_flags(
+                            session, [message_listing.id]
                         )
-                    await session.commit()
+                finally:
+                    # Anything not moved into the blob store by now never will be
+                    for image in ingested_images:
+                        await asyncio.to_thread(
+                            image.temporary_path.unlink, missing_ok=True
+                        )
+
+            # Each image's variants are committed by themselves, so that one image
+            # failing doesn't hold up the rest. Any that fail will be rendered on first
+            # request or by backfill-image-variants instead.
+            for image in images:
+                try:
+                    variants = await generate_variants(image)
+                    async with write_session() as session:
+                        session.add_all(variants)
+                        await session.commit()
+                except ImageProcessorBusy:
+                    continue
+                except Exception:
+                    traceback.print_exc()
         except:  # noqa
             traceback.print_exc()
 
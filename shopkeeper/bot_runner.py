@@ -0,0 +1,70 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
+
+from fastapi_utils.tasks import repeat_every
+
+from shopkeeper.bot import client, guild
+from shopkeeper.config import config
+from shopkeeper.imaging import image_processor
+from shopkeeper.loop_watchdog import loop_watchdog
+from shopkeeper.outbox import outbox_worker
+from shopkeeper.shared_metrics import shared_metrics
+from shopkeeper.web.tasks import publish_event_digest, send_reminders
+
+
+# Checked often, as whether each user is due a reminder is tracked separately
+@repeat_every(seconds=config.reminder_check_interval)
+async def run_background_tasks():
+    await send_reminders()
+
+
+# Changes are posted to the events channel in one digest per interval, rather than one
+# message per change
+@repeat_every(seconds=config.events_digest_interval)
+async def publish_event_digests():
+    await publish_event_digest()
+
+
+@asynccontextmanager
+async def running_bot() -> AsyncGenerator["asyncio.Task[None]", None]:
+    """Connect to the gateway and run everything that talks to Discord in the
+    background: the outbox worker, reminders and event digests. Only one of these may
+    run at a time, however many web workers there are.
+
+    Yields the gateway connection's task, which finishes if the connection is lost for
+    good."""
+    await client.login(config.token)
+    if config.init_on_startup:
+        await client.tree.sync(guild=guild)
+
+    connection = asyncio.create_task(client.connect())
+    outbox_worker.start()
+    await run_background_tasks()
+    await publish_event_digests()
+
+    try:
+        yield connection
+    finally:
+        await outbox_worker.stop(timeout=10)
+        await client.close()
+
+
+async def run_bot() -> None:
+    """Run the bot by itself, until it's disconnected or interrupted."""
+    loop_watchdog.start()
+    if config.share_metrics:
+        shared_metrics.start()
+
+    try:
+        async with running_bot() as connection:
+            await connection
+    finally:
+        image_processor.shutdown()
+        await shared_metrics.stop()
+        loop_watchdog.stop()
+        # Checked however the bot stopped, as it's usually interrupted
+        loop_watchdog.raise_for_blocks()
+
+
+__all__ = ["run_bot", "running_bot"]
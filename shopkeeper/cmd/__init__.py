@@ -1,32 +1,83 @@
+import asyncio
+import os
+
 import alembic.config
 import typer
 import uvicorn
+from sqlalchemy import delete, select, update
 
 from shopkeeper.bot import client, guild
+from shopkeeper.bot_runner import run_bot
 from shopkeeper.config import config
+from shopkeeper.db import read_session, write_session
 from shopkeeper.features import *  # noqa: F401, F403
+from shopkeeper.imaging import generate_variants, image_processor
+from shopkeeper.imaging.blobs import orphaned_files, remove_files
+from shopkeeper.models.blob import Blob
+from shopkeeper.models.listing import Listing
+from shopkeeper.models.listing_image import ListingImage
+from shopkeeper.shared_metrics import shared_metrics
 
 from .utils import async_command
 
 app = typer.Typer()
 
 
-@app.command()
-def start() -> None:
-    """Run Shopkeeper."""
-
-    if config.init_on_startup:
-        upgrade()
-
+def run_web_server(workers: int = 1) -> None:
     uvicorn.run(
         "shopkeeper.web.app:app",
         host=config.bind_host,
         port=config.bind_port,
+        workers=workers,
         proxy_headers=config.behind_reverse_proxy,
         forwarded_allow_ips="*" if config.behind_reverse_proxy else None,
+        # Listing event streams never finish by themselves, so would otherwise hold up
+        # shutting down forever
+        timeout_graceful_shutdown=10,
     )
 
 
+@app.command()
+def start() -> None:
+    """Run Shopkeeper, with the bot and web server in one process."""
+
+    if config.init_on_startup:
+        upgrade()
+
+    run_web_server()
+
+
+@app.command()
+def bot() -> None:
+    """Run only the Discord bot, for when the web server is run separately with the web
+    command."""
+
+    if config.init_on_startup:
+        upgrade()
+
+    config.share_metrics = True
+    asyncio.run(run_bot())
+
+
+@app.command()
+def web(
+    workers: int = typer.Option(1, help="How many web server processes to run."),
+) -> None:
+    """Run only the web server, for when the bot is run separately with the bot command.
+    Messages to Discord are left in the outbox for the bot to deliver."""
+
+    # Read by each worker process as it loads the config, so that none of them
+    # connects to the gateway, and they all share their metrics with the bot
+    os.environ["SHOPKEEPER_EMBEDDED_BOT"] = "false"
+    config.embedded_bot = False
+    os.environ["SHOPKEEPER_SHARE_METRICS"] = "true"
+    config.share_metrics = True
+    # Left over from the last time the workers ran
+    shared_metrics.clear()
+
+    run_web_server(workers)
+
+
 @app.command()
 @async_command
 async def sync() -> None:
@@ -44,4 +95,186 @@ def upgrade() -> None:
     alembic.config.main(argv=["--raiseerr", "upgrade", "head"])
 
 
+@app.command()
+@async_command
+async def backfill_image_variants() -> None:
+    """Generate resized variants for existing listing images that don't have any."""
+    async with read_session() as session:
+        images = (
+            (
+                await session.execute(
+                    select(ListingImage)
+                    .filter_by(is_hidden=False)
+                    .filter(~ListingImage.variants.any())
+                )
+            )
+            .scalars()
+            .all()
+        )
+
+    try:
+        for image in images:
+            # A session per image, so that a failure can't expire (and so lazily
+            # reload) the images still to go
+            try:
+                variants = await generate_variants(image)
+                async with write_session() as session:
+                    session.add_all(variants)
+                    await session.commit()
+            except Exception as e:
+                typer.echo(
+                    f"Failed to generate variants for image {image.id}: {e}",
+                    err=True,
+                )
+    finally:
+        image_processor.shutdown()
+
+
+@app.command()
+@async_command
+async def gc_images(
+    dry_run: bool = typer.Option(
+        False, help="Report what would be removed without removing anything."
+    ),
+) -> None:
+    """Remove images which no visible listing image uses any more, and files in the image
+    store which aren't images at all."""
+    async with write_session() as session:
+        async with session.begin():
+            blobs = (
+                await session.execute(
+                    select(
+                        Blob,
+                        select(ListingImage.id)
+                        .filter(ListingImage.blob_hash == Blob.hash)
+                        .filter_by(is_hidden=False)
+                        .exists()
+                        .label("is_in_use"),
+                    ).filter(Blob.ref_count == 0)
+                )
+            ).all()
+
+            unused_blobs = [blob for blob, is_in_use in blobs if not is_in_use]
+            for blob, is_in_use in blobs:
+                if is_in_use:
+                    typer.echo(
+                        f"Blob {blob.hash} has no references but is used by a visible image, skipping",
+                        err=True,
+                    )
+
+            if unused_blobs and not dry_run:
+                hashes = [blob.hash for blob in unused_blobs]
+                await session.execute(
+                    update(ListingImage)
+                    .filter(ListingImage.blob_hash.in_(hashes))
+                    .values(blob_hash=None)
+                )
+                await session.execute(delete(Blob).filter(Blob.hash.in_(hashes)))
+                # Removed while the write lock is still held, so that an image being
+                # ingested can't reuse one of the blobs in the meantime
+                reclaimed = remove_files(
+                    [config.image_path / blob.path for blob in unused_blobs]
+                )
+            else:
+                reclaimed = sum(blob.byte_size for blob in unused_blobs)
+
+        blob_paths = set((await session.execute(select(Blob.path))).scalars().all())
+
+    orphans = orphaned_files(blob_paths)
+    if not dry_run:
+        reclaimed += remove_files(orphans)
+    else:
+        reclaimed += sum(path.stat().st_size for path in orphans)
+
+    typer.echo(
+        f"{'Would remove' if dry_run else 'Removed'} {len(unused_blobs)} unused images "
+        f"and {len(orphans)} other files, {reclaimed / 1024 / 1024:.1f} MiB in total."
+    )
+
+
+@app.command()
+@async_command
+async def check_issue_flags(
+    fix: bool = typer.Option(False, help="Recompute the flags that are out of date."),
+) -> None:
+    """Check that the stored issue flags of every listing match its current issues."""
+    async with write_session() as session:
+        stale_listings = (
+            await session.execute(
+                select(
+                    Listing.id,
+                    Listing.issue_flags,
+                    Listing.get_issue_flags_expression().label("expected_flags"),
+                ).filter(Listing.issue_flags != Listing.get_issue_flags_expression())
+            )
+        ).all()
+
+        for listing_id, issue_flags, expected_flags in stale_listings:
+            typer.echo(
+                f"Listing {listing_id} has issue flags {issue_flags:#b}, expected {expected_flags:#b}"
+            )
+
+        if stale_listings and fix:
+            await Listing.update_issue_flags(
+                session, [listing_id for listing_id, _, _ in stale_listings]
+            )
+            await session.commit()
+            typer.echo(f"Fixed {len(stale_listings)} listings.")
+        elif stale_listings:
+            raise typer.Exit(code=1)
+
+
+@app.command()
+def seed(
+    listings: int = typer.Option(1000, help="How many listings to create."),
+    images: int = typer.Option(3, help="How many images each listing has."),
+    events: int = typer.Option(5, help="How many events each listing has."),
+    distinct_images: int = typer.Option(
+        50, help="How many different image files the listings share between them."
+    ),
+    owners: int = typer.Option(100, help="How many users own the listings."),
+    random_seed: int = typer.Option(0, help="Seed for generating the same data again."),
+) -> None:
+    """Fill an empty database with synthetic listings, images and events, e.g. for
+    benchmarking. Point Shopkeeper at a scratch database first."""
+    from shopkeeper.seeding import create_schema, seed
+
+    create_schema()
+
+    try:
+        summary = seed(
+            listings=listings,
+            images_per_listing=images,
+            events_per_listing=events,
+            distinct_images=distinct_images,
+            owners=owners,
+            random_seed=random_seed,
+        )
+    except ValueError as e:
+        typer.echo(e, err=True)
+        raise typer.Exit(code=1)
+
+    typer.echo(
+        f"Created {summary.listings} listings with {summary.images} images "
+        f"({summary.blobs} files) and {summary.events} events."
+    )
+
+
+@app.command()
+def check_query_plans() -> None:
+    """Check that no hot path database query needs a full table scan, and that no
+    paginated one needs to sort every matching row."""
+    from shopkeeper.query_plans import check_query_plans
+
+    plans = check_query_plans()
+
+    for plan in plans:
+        typer.echo(f"{'FAIL' if plan.failed else 'ok'}: {plan.name}")
+        for detail in plan.details:
+            typer.echo(f"    {detail}")
+
+    if any(plan.failed for plan in plans):
+        raise typer.Exit(code=1)
+
+
 __all__ = ["app"]
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -12,15 +13,53 @@ class Config(BaseSettings):
     channel_id: int
     client_id: str | None = None
     client_secret: str | None = None
+    db_busy_timeout: int = 5000  # milliseconds
+    db_cache_size: int = 64 * 1024  # KiB
     db_log_queries: bool = False
+    db_mmap_size: int = 256 * 1024 * 1024  # bytes
     db_path: str = "shopkeeper.sqlite"
+    db_read_pool_size: int = 4
+    # Run the bot inside the web server. Turned off by the web command, for running the
+    # bot separately with the bot command.
+    embedded_bot: bool = True
     events_channel_id: int | None = None
+    events_digest_interval: int = 60  # seconds
     guild_id: int
+    image_accel_redirect_prefix: str = "/internal"
+    image_download_concurrency: int = 4
+    image_download_timeout: float = 60.0  # seconds
+    image_lookup_cache_size: int = 4096  # images
+    image_lookup_cache_ttl: float = 60.0  # seconds
+    image_max_dimension: int = 2048  # pixels
     image_path: Path = Path("images")
+    image_queue_depth: int = 32
+    # Only used when behind_reverse_proxy is set
+    image_sendfile_header: Literal["X-Accel-Redirect", "X-Sendfile"] | None = None
+    image_workers: int = 2
     init_on_startup: bool = True
+    listing_cache_size: int = 256  # responses
+    listing_stream_buffer_size: int = 100  # events per client
+    listing_stream_heartbeat_interval: float = 15.0  # seconds
+    listing_stream_poll_interval: float = 5.0  # seconds
+    loop_block_threshold: float = 0.1  # seconds
+    # Fail on shutdown if anything blocked the event loop, e.g. for test runs
+    loop_watchdog_strict: bool = False
+    # Where the bot and web workers share their metrics, when run as separate processes
+    metrics_path: Path = Path("metrics")
+    metrics_share_interval: float = 5.0  # seconds
+    outbox_poll_interval: float = 5.0  # seconds
     owner_id: int
+    profile_requests: bool = False
+    profile_db_time_threshold: float = 0.25  # seconds
+    profile_repeated_statement_threshold: int = 10
+    profile_statement_threshold: int = 50
+    profile_top_statements: int = 5
     session_secret: str = "replace-me"
+    # Turned on by the bot and web commands, which run in processes of their own
+    share_metrics: bool = False
+    thumbnail_path: Path = Path("thumbnails")
     token: str
+    reminder_check_interval: int = 60 * 60  # 1 hour
     reminder_interval: int = 60 * 60 * 24 * 14  # 14 days
 
     @property
@@ -1,11 +1,27 @@
 import enum
+import time
 import typing
+from typing import Any
 
 import sqlalchemy
-from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import (
+    AsyncAttrs,
+    AsyncEngine,
+    async_sessionmaker,
+    create_async_engine,
+)
 from sqlalchemy.orm import DeclarativeBase
 
 from .config import config
+from .metrics import Histogram
+from .profiling import current_query_profile
+
+db_query_seconds = Histogram(
+    "shopkeeper_db_query_seconds",
+    "Time taken to execute database statements, by engine and kind of statement.",
+    ("engine", "statement"),
+)
 
 
 class Base(AsyncAttrs, DeclarativeBase):
@@ -15,6 +31,68 @@ class Base(AsyncAttrs, DeclarativeBase):
     }
 
 
-engine = create_async_engine(config.async_db_connection_uri, echo=config.db_log_queries)
+def _set_pragmas(engine: AsyncEngine, pragmas: dict[str, str | int]) -> None:
+    @event.listens_for(engine.sync_engine, "connect")
+    def set_pragmas(dbapi_connection: Any, _: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+        cursor.close()
+
+
+def _instrument(engine: AsyncEngine, name: str) -> None:
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def start_timer(conn: Any, *_: Any) -> None:
+        conn.info["query_started_at"] = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def observe_duration(conn: Any, _: Any, statement: str, *__: Any) -> None:
+        started_at = conn.info.pop("query_started_at", None)
+        if started_at is None:
+            return
+
+        duration = time.perf_counter() - started_at
+        db_query_seconds.observe(
+            duration,
+            engine=name,
+            statement=statement.lstrip().split(None, 1)[0].upper(),
+        )
+
+        profile = current_query_profile.get()
+        if profile is not None:
+            profile.record(statement, duration)
+
+
+connection_pragmas: dict[str, str | int] = {
+    # WAL lets readers run concurrently with each other and with the writer
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    # Negative values are interpreted by SQLite as KiB rather than pages
+    "cache_size": -config.db_cache_size,
+    "mmap_size": config.db_mmap_size,
+    "busy_timeout": config.db_busy_timeout,
+    "temp_store": "MEMORY",
+}
+
+# All writes go through a single connection, so writers queue in the pool rather than
+# contending for SQLite's write lock
+write_engine = create_async_engine(
+    config.async_db_connection_uri,
+    echo=config.db_log_queries,
+    pool_size=1,
+    max_overflow=0,
+)
+_set_pragmas(write_engine, connection_pragmas)
+_instrument(write_engine, "write")
+
+read_engine = create_async_engine(
+    config.async_db_connection_uri,
+    echo=config.db_log_queries,
+    pool_size=config.db_read_pool_size,
+    max_overflow=0,
+)
+_set_pragmas(read_engine, {**connection_pragmas, "query_only": "ON"})
+_instrument(read_engine, "read")
 
-async_session = async_sessionmaker(engine, expire_on_commit=False)
+write_session = async_sessionmaker(write_engine, expire_on_commit=False)
+read_session = async_sessionmaker(read_engine, expire_on_commit=False)
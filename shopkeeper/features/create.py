@@ -3,7 +3,7 @@ import traceback
 import discord
 
 from shopkeeper.bot import client, guild
-from shopkeeper.db import async_session
+from shopkeeper.db import write_session
 from shopkeeper.models.listing import Listing, ListingType
 
 
@@ -27,7 +27,7 @@ class CreateListingModal(discord.ui.Modal):
         super().__init__(title=type_titles[listing_type])
 
     async def on_submit(self, interaction: discord.Interaction):
-        async with async_session() as session:
+        async with write_session() as session:
             new_listing = await Listing.create(
                 type=self.listing_type,
                 title=self.listing_title.value,
@@ -7,8 +7,9 @@ from sqlalchemy import select
 
 from shopkeeper.bot import client, guild
 from shopkeeper.config import config
-from shopkeeper.db import async_session
+from shopkeeper.db import read_session, write_session
 from shopkeeper.models.listing import Listing, ListingStatus
+from shopkeeper.models.listing_search import listing_matches
 
 
 class EditListingInfoModal(discord.ui.Modal):
@@ -30,7 +31,7 @@ class EditListingInfoModal(discord.ui.Modal):
 
     async def on_submit(self, interaction: discord.Interaction) -> None:
         try:
-            async with async_session() as session:
+            async with write_session() as session:
                 await Listing.edit(
                     self.listing.id,
                     interaction.user.id,
@@ -55,7 +56,7 @@ class EditListingInfoModal(discord.ui.Modal):
 async def edit_autocomplete(
     interaction: discord.Interaction, current: str
 ) -> list[app_commands.Choice[int]]:
-    async with async_session() as session:
+    async with read_session() as session:
         is_admin_query = interaction.user.id == config.owner_id and current.startswith(
             "admin:"
         )
@@ -63,11 +64,16 @@ async def edit_autocomplete(
         if is_admin_query:
             current = current.removeprefix("admin:")
 
-        query = (
-            select(Listing)
-            .filter(Listing.title.ilike(f"%{current}%"))
-            .filter(Listing.status != ListingStatus.Closed)
-        )
+        # Discord only accepts up to 25 autocomplete choices
+        query = select(Listing).filter(Listing.status != ListingStatus.Closed).limit(25)
+
+        matches = listing_matches(current)
+        if matches is not None:
+            query = query.join(matches, matches.c.rowid == Listing.id).order_by(
+                matches.c.rank
+            )
+        else:
+            query = query.order_by(Listing.id.desc())
 
         if is_admin_query:
             query = query.filter(Listing.owner_id != interaction.user.id)
@@ -93,7 +99,7 @@ class EditListing(app_commands.Group):
         """Edit the status of a listing."""
         try:
             await interaction.response.defer(ephemeral=True)
-            async with async_session() as session:
+            async with write_session() as session:
                 await Listing.edit(
                     listing,
                     interaction.user.id,
@@ -114,7 +120,7 @@ class EditListing(app_commands.Group):
     @app_commands.describe(listing="The listing to edit.")
     async def info(self, interaction: discord.Interaction, listing: int) -> None:
         """Edit information about a listing."""
-        async with async_session() as session:
+        async with read_session() as session:
             listing_instance = await session.get(Listing, listing)
 
             if listing_instance is None:
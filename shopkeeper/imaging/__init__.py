@@ -0,0 +1,26 @@
+from .blobs import store_blob
+from .executor import ImageProcessorBusy, image_processor
+from .formats import negotiate_format, supported_formats
+from .ingest import IngestedImage, ingest_attachments
+from .variants import (
+    THUMBNAIL_SIZE,
+    VARIANT_SIZES,
+    ensure_variant,
+    generate_variants,
+    variant_path,
+)
+
+__all__ = [
+    "THUMBNAIL_SIZE",
+    "VARIANT_SIZES",
+    "ImageProcessorBusy",
+    "IngestedImage",
+    "ensure_variant",
+    "generate_variants",
+    "image_processor",
+    "ingest_attachments",
+    "negotiate_format",
+    "store_blob",
+    "supported_formats",
+    "variant_path",
+]
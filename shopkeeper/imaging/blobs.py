@@ -0,0 +1,83 @@
+import os
+import time
+import uuid
+from pathlib import Path
+
+from shopkeeper.config import config
+
+# Downloads in progress, kept on the same filesystem as the store so they can be renamed in
+INCOMING_DIRECTORY = ".incoming"
+FORMAT_EXTENSIONS = {"PNG": ".png", "JPEG": ".jpg"}
+# Files which aren't a blob are only removed once they're this old, so that a download
+# which is about to become a blob is never swept away
+ORPHAN_GRACE_PERIOD = 60 * 60  # seconds
+
+
+def incoming_path() -> Path:
+    return config.image_path / INCOMING_DIRECTORY / f"{uuid.uuid4()}.tmp"
+
+
+def store_blob(temporary_path: Path, path: str) -> None:
+    """Move a downloaded file to its blob path. If the blob already exists, the download
+    has the same contents, so replacing it is harmless (and restores it if it's missing)."""
+    destination = config.image_path / path
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(temporary_path, destination)
+
+
+def orphaned_files(blob_paths: set[str]) -> list[Path]:
+    """Find files in the image store which aren't a blob and are past the grace period,
+    such as images stored before content addressing or downloads abandoned by a crash."""
+    cutoff = time.time() - ORPHAN_GRACE_PERIOD
+    orphans: list[Path] = []
+
+    for directory, _, filenames in os.walk(config.image_path):
+        in_incoming = Path(directory) == config.image_path / INCOMING_DIRECTORY
+        for filename in filenames:
+            # Other dotfiles (e.g. .gitkeep) weren't put there by Shopkeeper
+            if filename.startswith(".") and not in_incoming:
+                continue
+
+            path = Path(directory) / filename
+            if (
+                path.relative_to(config.image_path).as_posix() not in blob_paths
+                and path.stat().st_mtime < cutoff
+            ):
+                orphans.append(path)
+
+    return orphans
+
+
+def remove_files(paths: list[Path]) -> int:
+    """Remove files from the image store along with any directories left empty, returning
+    the number of bytes reclaimed."""
+    reclaimed = 0
+
+    for path in paths:
+        try:
+            reclaimed += path.stat().st_size
+            path.unlink()
+        except FileNotFoundError:
+            continue
+
+        for directory in path.parents:
+            if directory == config.image_path or not directory.is_relative_to(
+                config.image_path
+            ):
+                break
+            try:
+                directory.rmdir()
+            except OSError:
+                # Not empty
+                break
+
+    return reclaimed
+
+
+__all__ = [
+    "FORMAT_EXTENSIONS",
+    "incoming_path",
+    "orphaned_files",
+    "remove_files",
+    "store_blob",
+]
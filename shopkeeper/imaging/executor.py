@@ -0,0 +1,100 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable
+
+from shopkeeper.config import config
+from shopkeeper.metrics import Counter, Histogram
+
+image_job_wait_seconds = Histogram(
+    "shopkeeper_image_job_wait_seconds",
+    "Time image processing jobs spent queued before a worker picked them up.",
+    ("job",),
+)
+image_job_run_seconds = Histogram(
+    "shopkeeper_image_job_run_seconds",
+    "Time image processing jobs spent running in a worker.",
+    ("job",),
+)
+image_jobs_rejected = Counter(
+    "shopkeeper_image_jobs_rejected_total",
+    "Image processing jobs rejected because the queue was full.",
+    ("job",),
+)
+
+
+class ImageProcessorBusy(Exception):
+    """Raised when the image processor's queue is full and cannot accept more work."""
+
+
+def _run_timed[R](
+    fn: Callable[..., R], args: tuple[Any, ...]
+) -> tuple[R, float, float]:
+    started_at = time.time()
+    run_start = time.perf_counter()
+    result = fn(*args)
+    return result, started_at, time.perf_counter() - run_start
+
+
+class ImageProcessor:
+    """Runs Pillow work in a pool of worker processes, off the event loop."""
+
+    def __init__(self, workers: int, max_queue_depth: int) -> None:
+        self.workers = workers
+        self.max_queue_depth = max_queue_depth
+        self.queue_depth = 0
+        self._executor: ProcessPoolExecutor | None = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+
+        return self._executor
+
+    async def run[R](
+        self, fn: Callable[..., R], *args: Any, reject_when_busy: bool = True
+    ) -> R:
+        """Run a function in the pool, raising ImageProcessorBusy if the queue is full.
+        Jobs which can't be put off wait for their turn instead, but still count towards
+        the queue, so callers must bound how many of those they submit themselves."""
+        job = fn.__name__
+
+        if reject_when_busy and self.queue_depth >= self.max_queue_depth:
+            image_jobs_rejected.inc(job=job)
+            raise ImageProcessorBusy()
+
+        self.queue_depth += 1
+        submitted_at = time.time()
+
+        try:
+            (
+                result,
+                started_at,
+                run_time,
+            ) = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _run_timed, fn, args
+            )
+        finally:
+            self.queue_depth -= 1
+
+        image_job_wait_seconds.observe(max(started_at - submitted_at, 0), job=job)
+        image_job_run_seconds.observe(run_time, job=job)
+
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+image_processor = ImageProcessor(
+    workers=config.image_workers, max_queue_depth=config.image_queue_depth
+)
+
+__all__ = ["ImageProcessor", "ImageProcessorBusy", "image_processor"]
@@ -0,0 +1,32 @@
+from functools import cache
+
+from PIL import Image
+
+from shopkeeper.models.listing_image_variant import ImageFormat
+
+
+@cache
+def supported_formats() -> list[ImageFormat]:
+    """Get the formats the installed Pillow build is able to encode."""
+    Image.init()
+    return [format for format in ImageFormat if format.pillow_format in Image.SAVE]
+
+
+def negotiate_format(accept: str, available: list[ImageFormat]) -> ImageFormat:
+    """Pick the smallest available format the client explicitly accepts, falling back to JPEG."""
+    accepted: set[str] = set()
+
+    for media_range in accept.lower().split(","):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        if any(param.replace(" ", "") in ("q=0", "q=0.0") for param in params):
+            continue
+        accepted.add(media_type)
+
+    for format in ImageFormat:
+        if format in available and format.media_type in accepted:
+            return format
+
+    return ImageFormat.JPEG
+
+
+__all__ = ["negotiate_format", "supported_formats"]
@@ -0,0 +1,133 @@
+import asyncio
+import traceback
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Sequence
+
+import aiohttp
+import discord
+
+from shopkeeper.config import config
+from shopkeeper.metrics import Counter, Histogram
+
+from .blobs import FORMAT_EXTENSIONS, incoming_path
+from .executor import image_processor
+from .processing import normalize_image
+
+PERMITTED_FILE_TYPES = [".png", ".jpg", ".jpeg"]
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+attachment_downloads = Counter(
+    "shopkeeper_attachment_downloads_total",
+    "Attachments downloaded from Discord, by whether they were accepted as listing images.",
+    ("result",),
+)
+attachment_download_seconds = Histogram(
+    "shopkeeper_attachment_download_seconds",
+    "Time taken to download and normalize an attachment, including waiting for a slot.",
+)
+
+_download_slots = asyncio.Semaphore(config.image_download_concurrency)
+
+
+@dataclass
+class IngestedImage:
+    """A downloaded and verified image, waiting to be moved into the blob store."""
+
+    temporary_path: Path
+    hash: str
+    extension: str
+    byte_size: int
+    width: int
+    height: int
+
+
+async def download(http: aiohttp.ClientSession, url: str, destination: Path) -> None:
+    """Stream a file to disk chunk by chunk, with the file operations run in a thread so
+    that slow disks don't block the event loop."""
+    async with http.get(url, raise_for_status=True) as response:
+        file = await asyncio.to_thread(open, destination, "wb")
+        try:
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                await asyncio.to_thread(file.write, chunk)
+        finally:
+            await asyncio.to_thread(file.close)
+
+
+async def ingest_attachment(
+    http: aiohttp.ClientSession, attachment: discord.Attachment
+) -> IngestedImage | None:
+    """Download and normalize an attachment, returning None if it isn't an image type
+    listings can have. The caller is responsible for the downloaded file from then on."""
+    if Path(attachment.filename).suffix.lower() not in PERMITTED_FILE_TYPES:
+        attachment_downloads.inc(result="skipped")
+        return None
+
+    temporary_path = incoming_path()
+    loop = asyncio.get_running_loop()
+    started_at = loop.time()
+    await asyncio.to_thread(temporary_path.parent.mkdir, parents=True, exist_ok=True)
+
+    try:
+        async with _download_slots:
+            await download(http, attachment.url, temporary_path)
+
+            # The dimensions Discord reports are taken from the uploader, and the
+            # download may have been cut short, so the image is decoded before it's
+            # accepted. A listing image can't be rendered later like a variant can, so
+            # this waits for the pool rather than being rejected - holding the slot
+            # keeps ingest from queueing more than the download limit of jobs.
+            normalized = await image_processor.run(
+                normalize_image,
+                temporary_path,
+                config.image_max_dimension,
+                reject_when_busy=False,
+            )
+    except BaseException:
+        attachment_downloads.inc(result="failed")
+        await asyncio.to_thread(temporary_path.unlink, missing_ok=True)
+        raise
+
+    attachment_downloads.inc(result="accepted")
+    attachment_download_seconds.observe(loop.time() - started_at)
+    return IngestedImage(
+        temporary_path=temporary_path,
+        hash=normalized.hash,
+        # Named after what the file turned out to be, rather than what it was called
+        extension=FORMAT_EXTENSIONS[normalized.format],
+        byte_size=normalized.byte_size,
+        width=normalized.width,
+        height=normalized.height,
+    )
+
+
+async def ingest_attachments(
+    attachments: Sequence[discord.Attachment],
+) -> list[IngestedImage]:
+    """Download a message's attachments concurrently (up to the configured limit across
+    all messages), returning the images which were downloaded in attachment order.
+    Attachments which fail are reported and left out rather than failing the rest."""
+    async with aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=config.image_download_timeout)
+    ) as http:
+        results = await asyncio.gather(
+            *(ingest_attachment(http, attachment) for attachment in attachments),
+            return_exceptions=True,
+        )
+
+    images: list[IngestedImage] = []
+    for result in results:
+        if isinstance(result, BaseException):
+            traceback.print_exception(result)
+        elif result is not None:
+            images.append(result)
+
+    return images
+
+
+__all__ = [
+    "PERMITTED_FILE_TYPES",
+    "IngestedImage",
+    "ingest_attachment",
+    "ingest_attachments",
+]
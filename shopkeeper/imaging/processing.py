@@ -0,0 +1,126 @@
+import hashlib
+import os
+import uuid
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from PIL import Image, ImageOps
+from PIL.Image import Resampling
+
+type VariantOutput = tuple[Path, int, str]
+
+
+def _save_atomically(
+    img: Image.Image, destination: Path, format: str, **options: Any
+) -> None:
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = destination.with_name(f".{destination.name}.{uuid.uuid4()}.tmp")
+
+    try:
+        img.save(temporary_path, format=format, **options)
+        os.replace(temporary_path, destination)
+    finally:
+        temporary_path.unlink(missing_ok=True)
+
+
+class NormalizedImage(NamedTuple):
+    format: str
+    width: int
+    height: int
+    hash: str
+    byte_size: int
+
+
+def _has_metadata(img: Image.Image) -> bool:
+    return (
+        len(img.getexif()) > 0
+        or any(key in img.info for key in ("xmp", "XML:com.adobe.xmp", "comment"))
+        or bool(getattr(img, "text", None))
+    )
+
+
+def _hash_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_image(source: Path, max_dimension: int) -> NormalizedImage:
+    """Fully decode a downloaded image to check that it's a complete PNG or JPEG, then
+    rewrite it in place if needed so that it's the right way up, has no metadata (such
+    as the GPS location phone cameras record) and is no larger than the max dimension.
+
+    Images which are already fine are left byte for byte as they were, so that
+    re-encoding doesn't lose quality for nothing."""
+    with Image.open(source, formats=("PNG", "JPEG")) as img:
+        format = str(img.format)
+        is_oversized = max(img.size) > max_dimension
+
+        if is_oversized:
+            # Lets the JPEG decoder skip straight to the nearest power of two scale
+            # above the target, rather than decoding at full resolution
+            img.draft("RGB", (max_dimension, max_dimension))
+        # Pillow leaves the pixel access this returns untyped
+        img.load()  # pyright: ignore[reportUnknownMemberType]
+        width, height = img.size
+
+        if is_oversized or _has_metadata(img):
+            ImageOps.exif_transpose(img, in_place=True)
+            img.thumbnail((max_dimension, max_dimension), Resampling.LANCZOS)
+            width, height = img.size
+
+            # Saved without the EXIF data or any other metadata, other than the colour
+            # profile, which is needed to show colours correctly
+            options: dict[str, Any] = {"icc_profile": img.info.get("icc_profile")}
+            if format == "JPEG":
+                options["quality"] = 90
+
+            _save_atomically(img, source, format, **options)
+
+    return NormalizedImage(
+        format=format,
+        width=width,
+        height=height,
+        # Hashed after normalizing, as it's the normalized image that's stored
+        hash=_hash_file(source),
+        byte_size=source.stat().st_size,
+    )
+
+
+def render_variants(
+    source: Path, outputs: list[VariantOutput]
+) -> list[tuple[int, int, int]]:
+    """Render resized copies of an image, decoding the source only once.
+
+    Each output is a (destination, max dimension, Pillow format) tuple. Returns
+    the (width, height, byte size) of each rendered output, in the same order.
+    """
+    results: dict[int, tuple[int, int, int]] = {}
+
+    with Image.open(source) as img:
+        largest = max(size for _, size, _ in outputs)
+        img.draft("RGB", (largest, largest))
+        # Images stored before normalizing at ingest may still need rotating, and JPEG
+        # and WebP have no alpha channel support in all encoders we target
+        ImageOps.exif_transpose(img, in_place=True)
+        current = img.convert("RGB")
+
+        # Render largest first so each resize works from the previous, smaller, image
+        for index in sorted(
+            range(len(outputs)), key=lambda i: outputs[i][1], reverse=True
+        ):
+            destination, size, format = outputs[index]
+            current.thumbnail((size, size), Resampling.LANCZOS)
+            _save_atomically(current, destination, format)
+            results[index] = (
+                current.width,
+                current.height,
+                destination.stat().st_size,
+            )
+
+    return [results[index] for index in range(len(outputs))]
+
+
+__all__ = ["NormalizedImage", "normalize_image", "render_variants"]
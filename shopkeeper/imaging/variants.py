@@ -0,0 +1,93 @@
+import asyncio
+import hashlib
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from shopkeeper.config import config
+from shopkeeper.models.listing_image_variant import ImageFormat, ListingImageVariant
+
+from .executor import image_processor
+from .formats import supported_formats
+from .processing import VariantOutput, render_variants
+
+if TYPE_CHECKING:
+    from shopkeeper.models.listing_image import ListingImage
+
+VARIANT_SIZES = (160, 350, 800, 1600)
+THUMBNAIL_SIZE = 350
+
+_in_flight: dict[Path, asyncio.Future[list[tuple[int, int, int]]]] = {}
+
+
+def variant_path(image_id: int, size: int, format: ImageFormat) -> Path:
+    """Get the path a variant is stored at in the variant store."""
+    key = hashlib.sha256(f"{image_id}:{size}:{format.value}".encode()).hexdigest()
+    return config.thumbnail_path / key[:2] / f"{key}.{format.value}"
+
+
+def variant_sizes(image: "ListingImage") -> list[int]:
+    """Get the variant sizes worth generating for an image, skipping any that would upscale it."""
+    largest_dimension = max(image.width, image.height)
+    sizes = [size for size in VARIANT_SIZES if size < largest_dimension]
+    return sizes or [VARIANT_SIZES[0]]
+
+
+async def generate_variants(image: "ListingImage") -> list[ListingImageVariant]:
+    """Render every variant of an image, returning (unsaved) rows describing them."""
+    outputs: list[VariantOutput] = []
+    variants: list[ListingImageVariant] = []
+
+    for size in variant_sizes(image):
+        for format in supported_formats():
+            outputs.append(
+                (variant_path(image.id, size, format), size, format.pillow_format)
+            )
+            variants.append(
+                ListingImageVariant(image_id=image.id, size=size, format=format)
+            )
+
+    results = await image_processor.run(
+        render_variants, config.image_path / image.path, outputs
+    )
+
+    for variant, (width, height, byte_size) in zip(variants, results):
+        variant.width = width
+        variant.height = height
+        variant.byte_size = byte_size
+
+    return variants
+
+
+async def ensure_variant(
+    image_id: int, source: Path, size: int, format: ImageFormat
+) -> Path:
+    """Get the path to a single variant of an image, rendering it from the source image
+    if it doesn't exist yet."""
+    path = variant_path(image_id, size, format)
+
+    if path.exists():
+        return path
+
+    # Concurrent requests for the same missing variant share a single render
+    if path not in _in_flight:
+        _in_flight[path] = asyncio.ensure_future(
+            image_processor.run(
+                render_variants,
+                source,
+                [(path, size, format.pillow_format)],
+            )
+        )
+        _in_flight[path].add_done_callback(lambda _: _in_flight.pop(path, None))
+
+    await asyncio.shield(_in_flight[path])
+
+    return path
+
+
+__all__ = [
+    "THUMBNAIL_SIZE",
+    "VARIANT_SIZES",
+    "ensure_variant",
+    "generate_variants",
+    "variant_path",
+]
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from dataclasses import dataclass
+
+from shopkeeper.config import config
+from shopkeeper.metrics import DEFAULT_BUCKETS, Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+event_loop_lag_seconds = Histogram(
+    "shopkeeper_event_loop_lag_seconds",
+    "How much later than asked the event loop woke up a task, i.e. how long it was kept "
+    "from running by other work.",
+    buckets=(0.001, *DEFAULT_BUCKETS),
+)
+event_loop_blocks = Counter(
+    "shopkeeper_event_loop_blocks_total",
+    "Times the event loop was blocked for longer than the loop block threshold.",
+)
+event_loop_block_seconds = Histogram(
+    "shopkeeper_event_loop_block_seconds",
+    "How long the event loop was blocked for, each time it was blocked for longer than "
+    "the loop block threshold.",
+)
+
+
+class EventLoopBlocked(Exception):
+    """Raised in strict mode when something blocked the event loop."""
+
+
+@dataclass
+class BlockReport:
+    # When the heartbeat that didn't happen was due, on the monotonic clock
+    started_at: float
+    # The stack of the event loop's thread when the block was first noticed
+    stack: str
+    seconds: float | None = None
+
+
+class LoopWatchdog:
+    """Watches the event loop from a separate thread. A task on the loop records a
+    heartbeat, and if the heartbeat stops for longer than the threshold, the watchdog
+    captures the loop thread's stack so it's clear what was blocking it.
+
+    Blocking the loop also holds up the Discord gateway's heartbeats, so can get the
+    bot disconnected."""
+
+    def __init__(self, threshold: float, *, strict: bool = False) -> None:
+        self.threshold = threshold
+        self.strict = strict
+        self.interval = threshold / 2
+        # Only kept in strict mode, to be raised at shutdown
+        self.reports: list[BlockReport] = []
+
+        self._last_beat = time.monotonic()
+        self._loop_thread_id: int | None = None
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+
+        self._task = asyncio.create_task(self.beat())
+        self._thread = threading.Thread(
+            target=self.watch, name="loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    async def beat(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        while True:
+            started_at = loop.time()
+            await asyncio.sleep(self.interval)
+            event_loop_lag_seconds.observe(
+                max(loop.time() - started_at - self.interval, 0)
+            )
+            self._last_beat = time.monotonic()
+
+    def watch(self) -> None:
+        report: BlockReport | None = None
+
+        while not self._stopped.wait(self.interval / 2):
+            # The interval the heartbeat sleeps for isn't time the loop was blocked
+            blocked_for = time.monotonic() - self._last_beat - self.interval
+
+            if report is None and blocked_for > self.threshold:
+                report = BlockReport(
+                    started_at=self._last_beat + self.interval,
+                    stack=self.loop_stack(),
+                )
+                if self.strict:
+                    self.reports.append(report)
+                event_loop_blocks.inc()
+                logger.warning(
+                    "Event loop blocked for over %.0fms, in:\n%s",
+                    self.threshold * 1000,
+                    report.stack,
+                )
+            elif report is not None and blocked_for <= 0:
+                # The heartbeat has caught up, and the first one since is about when
+                # the loop got going again
+                report.seconds = self._last_beat - report.started_at
+                event_loop_block_seconds.observe(report.seconds)
+                report = None
+
+    def loop_stack(self) -> str:
+        if self._loop_thread_id is None:
+            return ""
+        # The only way to see what another thread is running, as faulthandler can only
+        # print it
+        frame = sys._current_frames().get(self._loop_thread_id)  # pyright: ignore[reportPrivateUsage]
+        return "".join(traceback.format_stack(frame)) if frame is not None else ""
+
+    def raise_for_blocks(self) -> None:
+        """In strict mode, fail loudly if anything blocked the loop, e.g. at the end of
+        a test run."""
+        if self.strict and self.reports:
+            raise EventLoopBlocked(
+                f"The event loop was blocked {len(self.reports)} times, first in:\n"
+                f"{self.reports[0].stack}"
+            )
+
+
+loop_watchdog = LoopWatchdog(
+    config.loop_block_threshold, strict=config.loop_watchdog_strict
+)
+
+
+__all__ = ["EventLoopBlocked", "LoopWatchdog", "loop_watchdog"]
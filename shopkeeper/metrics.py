@@ -0,0 +1,208 @@
+import math
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from threading import Lock
+from typing import Any, Iterable
+
+type LabelValues = tuple[str, ...]
+# Every metric's state by name, as recorded by another process: a list of the label
+# values of each series with its state, in a form which survives a round trip through JSON
+type Snapshot = dict[str, list[tuple[list[str], Any]]]
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    math.inf,
+)
+
+
+def _escape(label_value: str) -> str:
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric(ABC):
+    type_name: str
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = Lock()
+
+        registry.append(self)
+
+    def _label_values(self, labels: dict[str, str]) -> LabelValues:
+        return tuple(labels[label] for label in self.labelnames)
+
+    def _format_labels(
+        self, values: LabelValues, extra: tuple[tuple[str, str], ...] = ()
+    ) -> str:
+        pairs = [*zip(self.labelnames, values), *extra]
+        if not pairs:
+            return ""
+
+        return (
+            "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+        )
+
+    @abstractmethod
+    def snapshot(self) -> list[tuple[list[str], Any]]:
+        """This process's state of every series, to be added to another's."""
+
+    @abstractmethod
+    def samples(self, others: Iterable[list[tuple[list[str], Any]]] = ()) -> list[str]:
+        """Every series in the text format, adding up the snapshots of other processes
+        to this one's state."""
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: tuple[str, ...] = ()
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: dict[LabelValues, float] = defaultdict(float)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        with self._lock:
+            self.values[self._label_values(labels)] += amount
+
+    def snapshot(self) -> list[tuple[list[str], Any]]:
+        with self._lock:
+            return [(list(values), value) for values, value in self.values.items()]
+
+    def samples(self, others: Iterable[list[tuple[list[str], Any]]] = ()) -> list[str]:
+        with self._lock:
+            totals = dict(self.values)
+
+        for snapshot in others:
+            for values, value in snapshot:
+                totals[tuple(values)] = totals.get(tuple(values), 0) + value
+
+        return [
+            f"{self.name}{self._format_labels(values)} {value}"
+            for values, value in totals.items()
+        ]
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+        self.bucket_counts: dict[LabelValues, list[int]] = defaultdict(
+            lambda: [0] * len(self.buckets)
+        )
+        self.sums: dict[LabelValues, float] = defaultdict(float)
+        self.counts: dict[LabelValues, int] = defaultdict(int)
+
+    def observe(self, value: float, **labels: str) -> None:
+        label_values = self._label_values(labels)
+
+        with self._lock:
+            bucket_counts = self.bucket_counts[label_values]
+            for i, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    bucket_counts[i] += 1
+
+            self.sums[label_values] += value
+            self.counts[label_values] += 1
+
+    def snapshot(self) -> list[tuple[list[str], Any]]:
+        with self._lock:
+            return [
+                (
+                    list(values),
+                    (list(bucket_counts), self.sums[values], self.counts[values]),
+                )
+                for values, bucket_counts in self.bucket_counts.items()
+            ]
+
+    def samples(self, others: Iterable[list[tuple[list[str], Any]]] = ()) -> list[str]:
+        totals: dict[LabelValues, tuple[list[int], float, int]] = {}
+
+        for values, (bucket_counts, observed_sum, count) in [
+            *self.snapshot(),
+            *(series for snapshot in others for series in snapshot),
+        ]:
+            # Another process may have been started with different buckets
+            if len(bucket_counts) != len(self.buckets):
+                continue
+
+            total_counts, total_sum, total_count = totals.get(
+                tuple(values), ([0] * len(self.buckets), 0.0, 0)
+            )
+            totals[tuple(values)] = (
+                [a + b for a, b in zip(total_counts, bucket_counts)],
+                total_sum + observed_sum,
+                total_count + count,
+            )
+
+        samples: list[str] = []
+
+        for values, (bucket_counts, observed_sum, count) in totals.items():
+            # Counts are already cumulative, as observations are added to every bucket
+            # they fit in
+            for upper_bound, bucket_count in zip(self.buckets, bucket_counts):
+                le = "+Inf" if upper_bound == math.inf else str(upper_bound)
+                samples.append(
+                    f"{self.name}_bucket{self._format_labels(values, (('le', le),))} {bucket_count}"
+                )
+            samples.append(
+                f"{self.name}_sum{self._format_labels(values)} {observed_sum}"
+            )
+            samples.append(f"{self.name}_count{self._format_labels(values)} {count}")
+
+        return samples
+
+
+def take_snapshot() -> Snapshot:
+    """The state of every registered metric, for render_metrics in another process."""
+    return {metric.name: metric.snapshot() for metric in registry}
+
+
+def render_metrics(others: Iterable[Snapshot] = ()) -> str:
+    """Render every registered metric in the Prometheus text exposition format, adding
+    up the snapshots of any other processes."""
+    others = list(others)
+    lines: list[str] = []
+
+    for metric in registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+        lines.extend(
+            metric.samples(snapshot.get(metric.name, []) for snapshot in others)
+        )
+
+    return "\n".join(lines) + "\n"
+
+
+registry: list[Metric] = []
+
+__all__ = [
+    "Counter",
+    "Histogram",
+    "Snapshot",
+    "registry",
+    "render_metrics",
+    "take_snapshot",
+]
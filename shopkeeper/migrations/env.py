@@ -6,6 +6,7 @@ from sqlalchemy import create_engine
 import shopkeeper.models._all_models  # noqa: F401 # type: ignore
 from shopkeeper.config import config as shopkeeper_config
 from shopkeeper.db import Base
+from shopkeeper.models.listing_search import listing_search_metadata
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -22,6 +23,19 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+
+def include_name(name: str | None, type_: str, parent_names: object) -> bool:
+    # The full-text search table (and the shadow tables FTS5 creates for it) is managed
+    # by hand, as Alembic can't autogenerate virtual tables
+    if type_ == "table" and name is not None:
+        return not any(
+            name == table or name.startswith(f"{table}_")
+            for table in listing_search_metadata.tables
+        )
+
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -43,6 +57,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=shopkeeper_config.sync_db_connection_uri,
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -62,7 +77,10 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata, render_as_batch=True
+            connection=connection,
+            target_metadata=target_metadata,
+            include_name=include_name,
+            render_as_batch=True,
         )
 
         with context.begin_transaction():
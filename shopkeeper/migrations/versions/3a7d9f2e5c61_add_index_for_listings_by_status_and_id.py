@@ -0,0 +1,33 @@
+"""Add index for listings by status and id
+
+Revision ID: 3a7d9f2e5c61
+Revises: c8e3f1a7b294
+Create Date: 2026-10-18 23:05:12.418630
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3a7d9f2e5c61"
+down_revision: Union[str, None] = "c8e3f1a7b294"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("listings", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_listings_status_id",
+            ["status", "id"],
+            unique=False,
+            sqlite_where=sa.text("is_hidden = 0"),
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("listings", schema=None) as batch_op:
+        batch_op.drop_index("ix_listings_status_id")
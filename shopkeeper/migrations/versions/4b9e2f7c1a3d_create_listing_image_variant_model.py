@@ -0,0 +1,44 @@
+"""Create listing image variant model
+
+Revision ID: 4b9e2f7c1a3d
+Revises: f3ca43b9a652
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "4b9e2f7c1a3d"
+down_revision: Union[str, None] = "f3ca43b9a652"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "listing_image_variants",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column(
+            "format",
+            sa.Enum("AVIF", "WebP", "JPEG", name="imageformat", native_enum=False),
+            nullable=False,
+        ),
+        sa.Column("width", sa.Integer(), nullable=False),
+        sa.Column("height", sa.Integer(), nullable=False),
+        sa.Column("byte_size", sa.Integer(), nullable=False),
+        sa.Column("image_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["image_id"],
+            ["listing_images.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("listing_image_variants")
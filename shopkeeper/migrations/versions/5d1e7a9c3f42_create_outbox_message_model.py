@@ -0,0 +1,64 @@
+"""Create outbox message model
+
+Revision ID: 5d1e7a9c3f42
+Revises: a3f8c2e61b95
+Create Date: 2026-10-18 17:21:36.518204
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5d1e7a9c3f42"
+down_revision: Union[str, None] = "a3f8c2e61b95"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "outbox_messages",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column(
+            "type",
+            sa.Enum(
+                "ListingMessage",
+                "ListingThread",
+                "ChannelMessage",
+                "DirectMessage",
+                name="outboxmessagetype",
+                native_enum=False,
+            ),
+            nullable=False,
+        ),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("coalesce_key", sa.String(), nullable=True),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("available_at", sa.DateTime(), nullable=False),
+        sa.Column("claimed_at", sa.DateTime(), nullable=True),
+        sa.Column("failed_at", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_outbox_messages_available_at",
+        "outbox_messages",
+        ["available_at"],
+        unique=False,
+        sqlite_where=sa.text("claimed_at IS NULL AND failed_at IS NULL"),
+    )
+    op.create_index(
+        op.f("ix_outbox_messages_coalesce_key"),
+        "outbox_messages",
+        ["coalesce_key"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_outbox_messages_coalesce_key"), table_name="outbox_messages")
+    op.drop_index("ix_outbox_messages_available_at", table_name="outbox_messages")
+    op.drop_table("outbox_messages")
@@ -0,0 +1,70 @@
+"""Add full-text search for listings
+
+Revision ID: 7e2d9b4a6c18
+Revises: d61a8e4f2c90
+Create Date: 2026-10-18 14:02:37.581904
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7e2d9b4a6c18"
+down_revision: Union[str, None] = "d61a8e4f2c90"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE VIRTUAL TABLE listings_fts USING fts5(
+            title,
+            description,
+            content='listings',
+            content_rowid='id',
+            prefix='2 3',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """
+    )
+    op.execute(
+        "INSERT INTO listings_fts(listings_fts, rank) VALUES('rank', 'bm25(10.0, 1.0)')"
+    )
+    op.execute(
+        """
+        CREATE TRIGGER listings_fts_after_insert AFTER INSERT ON listings BEGIN
+            INSERT INTO listings_fts(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER listings_fts_after_delete AFTER DELETE ON listings BEGIN
+            INSERT INTO listings_fts(listings_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER listings_fts_after_update AFTER UPDATE OF title, description ON listings BEGIN
+            INSERT INTO listings_fts(listings_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO listings_fts(rowid, title, description)
+            VALUES (new.id, new.title, new.description);
+        END
+        """
+    )
+    # Index the existing listings
+    op.execute("INSERT INTO listings_fts(listings_fts) VALUES('rebuild')")
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER listings_fts_after_update")
+    op.execute("DROP TRIGGER listings_fts_after_delete")
+    op.execute("DROP TRIGGER listings_fts_after_insert")
+    op.execute("DROP TABLE listings_fts")
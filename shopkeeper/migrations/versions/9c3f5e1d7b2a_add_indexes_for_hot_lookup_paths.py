@@ -0,0 +1,69 @@
+"""Add indexes for hot lookup paths
+
+Revision ID: 9c3f5e1d7b2a
+Revises: 4b9e2f7c1a3d
+Create Date: 2026-10-18 11:04:27.640391
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9c3f5e1d7b2a"
+down_revision: Union[str, None] = "4b9e2f7c1a3d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("listings", schema=None) as batch_op:
+        batch_op.create_index("ix_listings_thread_id", ["thread_id"], unique=False)
+        batch_op.create_index(
+            "ix_listings_owner_id_status", ["owner_id", "status"], unique=False
+        )
+        batch_op.create_index(
+            "ix_listings_status_type",
+            ["status", "type"],
+            unique=False,
+            sqlite_where=sa.text("is_hidden = 0"),
+        )
+
+    with op.batch_alter_table("listing_images", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_listing_images_listing_id",
+            ["listing_id"],
+            unique=False,
+            sqlite_where=sa.text("is_hidden = 0"),
+        )
+
+    with op.batch_alter_table("listing_events", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_listing_events_listing_id", ["listing_id"], unique=False
+        )
+
+    with op.batch_alter_table("listing_image_variants", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_listing_image_variants_image_id", ["image_id"], unique=False
+        )
+
+    # Give the query planner statistics to choose between the new indexes with
+    op.execute("ANALYZE")
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("listing_image_variants", schema=None) as batch_op:
+        batch_op.drop_index("ix_listing_image_variants_image_id")
+
+    with op.batch_alter_table("listing_events", schema=None) as batch_op:
+        batch_op.drop_index("ix_listing_events_listing_id")
+
+    with op.batch_alter_table("listing_images", schema=None) as batch_op:
+        batch_op.drop_index("ix_listing_images_listing_id")
+
+    with op.batch_alter_table("listings", schema=None) as batch_op:
+        batch_op.drop_index("ix_listings_status_type")
+        batch_op.drop_index("ix_listings_owner_id_status")
+        batch_op.drop_index("ix_listings_thread_id")
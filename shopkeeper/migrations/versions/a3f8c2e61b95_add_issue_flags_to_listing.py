@@ -0,0 +1,56 @@
+"""Add issue flags to listing
+
+Revision ID: a3f8c2e61b95
+Revises: 7e2d9b4a6c18
+Create Date: 2026-10-18 15:47:12.403118
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a3f8c2e61b95"
+down_revision: Union[str, None] = "7e2d9b4a6c18"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Altered directly rather than in batch mode, as recreating the listings table would
+    # drop the full-text search triggers. The server default lets SQLite add the column
+    # in place.
+    op.add_column(
+        "listings",
+        sa.Column(
+            "issue_flags", sa.Integer(), nullable=False, server_default=sa.text("0")
+        ),
+    )
+    op.create_index(
+        "ix_listings_owner_id_issue_flags",
+        "listings",
+        ["owner_id", "issue_flags"],
+        unique=False,
+    )
+
+    # Backfill with the issues as they were defined at this revision: no images (1), no
+    # price (2) and no description (4)
+    op.execute(
+        """
+        UPDATE listings SET issue_flags =
+            (CASE WHEN type = 'Sell' AND NOT EXISTS (
+                SELECT 1 FROM listing_images
+                WHERE listing_images.listing_id = listings.id
+                AND listing_images.is_hidden = 0
+            ) THEN 1 ELSE 0 END)
+            | (CASE WHEN type = 'Sell' AND price = '' THEN 2 ELSE 0 END)
+            | (CASE WHEN description = '' THEN 4 ELSE 0 END)
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_listings_owner_id_issue_flags", table_name="listings")
+    op.drop_column("listings", "issue_flags")
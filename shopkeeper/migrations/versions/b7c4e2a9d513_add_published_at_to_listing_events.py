@@ -0,0 +1,39 @@
+"""Add published at to listing events
+
+Revision ID: b7c4e2a9d513
+Revises: 5d1e7a9c3f42
+Create Date: 2026-10-18 18:04:52.771390
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b7c4e2a9d513"
+down_revision: Union[str, None] = "5d1e7a9c3f42"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "listing_events", sa.Column("published_at", sa.DateTime(), nullable=True)
+    )
+    op.create_index(
+        "ix_listing_events_unpublished",
+        "listing_events",
+        ["id"],
+        unique=False,
+        sqlite_where=sa.text("published_at IS NULL"),
+    )
+
+    # Existing events were already posted individually, so shouldn't be posted again
+    op.execute("UPDATE listing_events SET published_at = time")
+
+
+def downgrade() -> None:
+    op.drop_index("ix_listing_events_unpublished", table_name="listing_events")
+    op.drop_column("listing_events", "published_at")
@@ -0,0 +1,162 @@
+"""Store images by content hash
+
+Revision ID: c8e3f1a7b294
+Revises: e4a1b6d8c207
+Create Date: 2026-10-18 22:14:37.582903
+
+"""
+
+import enum
+import hashlib
+import os
+import shutil
+import typing
+from typing import Optional, Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from PIL import Image
+from sqlalchemy.ext.asyncio import AsyncAttrs
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+
+from shopkeeper.config import config
+
+# revision identifiers, used by Alembic.
+revision: str = "c8e3f1a7b294"
+down_revision: Union[str, None] = "e4a1b6d8c207"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+FORMAT_EXTENSIONS = {"PNG": ".png", "JPEG": ".jpg"}
+
+
+class Base(AsyncAttrs, DeclarativeBase):
+    type_annotation_map = {
+        enum.Enum: sa.Enum(enum.Enum, native_enum=False),
+        typing.Literal: sa.Enum(enum.Enum, native_enum=False),
+    }
+
+
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    hash: Mapped[str] = mapped_column(primary_key=True)
+    path: Mapped[str]
+    byte_size: Mapped[int]
+    ref_count: Mapped[int]
+
+
+class ListingImage(Base):
+    __tablename__ = "listing_images"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    path: Mapped[str]
+    is_hidden: Mapped[bool]
+    blob_hash: Mapped[Optional[str]]
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def rehash_images() -> None:
+    """Copy every image into the blob store, pointing the rows at their blobs. The
+    original files are left where they are until gc-images removes them, so a failed
+    migration leaves nothing behind that the previous revision can't use."""
+    session = Session(bind=op.get_bind())
+    blobs: dict[str, Blob] = {}
+    newly_hidden = 0
+
+    for listing_image in session.execute(sa.select(ListingImage)).scalars().all():
+        source = config.image_path / listing_image.path
+
+        if not source.exists():
+            # Hidden images are never served, so there's nothing to keep, and a visible
+            # one with nothing to serve is hidden rather than failing the migration
+            if listing_image.is_hidden:
+                print("Image", listing_image.id, "is hidden and missing, skipping")
+            else:
+                print("Image", listing_image.id, "is missing, hiding it")
+                listing_image.is_hidden = True
+                newly_hidden += 1
+            continue
+
+        digest = hash_file(str(source))
+        blob = blobs.get(digest)
+
+        if blob is None:
+            with Image.open(source) as img:
+                extension = FORMAT_EXTENSIONS[str(img.format)]
+
+            blob = Blob(
+                hash=digest,
+                path=f"{digest[:2]}/{digest}{extension}",
+                byte_size=source.stat().st_size,
+                ref_count=0,
+            )
+            blobs[digest] = blob
+
+            destination = config.image_path / blob.path
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            if not destination.exists():
+                try:
+                    os.link(source, destination)
+                except OSError:
+                    shutil.copyfile(source, destination)
+
+        listing_image.blob_hash = blob.hash
+        listing_image.path = blob.path
+        if not listing_image.is_hidden:
+            blob.ref_count += 1
+
+    session.add_all(blobs.values())
+    session.commit()
+
+    print(
+        f"Stored {len(blobs)} unique images, run gc-images to remove the original files"
+    )
+    if newly_hidden:
+        print(
+            f"Hid {newly_hidden} missing images, run check-issue-flags --fix to update "
+            "the issues of their listings"
+        )
+
+
+def upgrade() -> None:
+    op.create_table(
+        "blobs",
+        sa.Column("hash", sa.String(), nullable=False),
+        sa.Column("path", sa.String(), nullable=False),
+        sa.Column("byte_size", sa.Integer(), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("hash"),
+    )
+    with op.batch_alter_table("listing_images", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("blob_hash", sa.String(), nullable=True))
+        batch_op.create_index(
+            batch_op.f("ix_listing_images_blob_hash"), ["blob_hash"], unique=False
+        )
+        batch_op.create_foreign_key(
+            batch_op.f("fk_listing_images_blob_hash_blobs"),
+            "blobs",
+            ["blob_hash"],
+            ["hash"],
+        )
+
+    rehash_images()
+
+
+def downgrade() -> None:
+    # Images stay in the blob store, where the rows' paths still point
+    with op.batch_alter_table("listing_images", schema=None) as batch_op:
+        batch_op.drop_constraint(
+            batch_op.f("fk_listing_images_blob_hash_blobs"), type_="foreignkey"
+        )
+        batch_op.drop_index(batch_op.f("ix_listing_images_blob_hash"))
+        batch_op.drop_column("blob_hash")
+
+    op.drop_table("blobs")
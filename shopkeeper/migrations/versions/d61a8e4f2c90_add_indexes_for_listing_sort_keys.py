@@ -0,0 +1,40 @@
+"""Add indexes for listing sort keys
+
+Revision ID: d61a8e4f2c90
+Revises: 9c3f5e1d7b2a
+Create Date: 2026-10-18 12:31:55.207316
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d61a8e4f2c90"
+down_revision: Union[str, None] = "9c3f5e1d7b2a"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("listings", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_listings_status_title",
+            ["status", "title"],
+            unique=False,
+            sqlite_where=sa.text("is_hidden = 0"),
+        )
+        batch_op.create_index(
+            "ix_listings_status_price",
+            ["status", "price"],
+            unique=False,
+            sqlite_where=sa.text("is_hidden = 0"),
+        )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("listings", schema=None) as batch_op:
+        batch_op.drop_index("ix_listings_status_price")
+        batch_op.drop_index("ix_listings_status_title")
@@ -0,0 +1,41 @@
+"""Create user reminder model and index listings with issues
+
+Revision ID: e4a1b6d8c207
+Revises: b7c4e2a9d513
+Create Date: 2026-10-18 18:49:05.120447
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "e4a1b6d8c207"
+down_revision: Union[str, None] = "b7c4e2a9d513"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "user_reminders",
+        sa.Column("user_id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("last_reminded_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+    # Created directly rather than in batch mode, as recreating the listings table would
+    # drop the full-text search triggers
+    op.create_index(
+        "ix_listings_owner_id_status_with_issues",
+        "listings",
+        ["owner_id", "status"],
+        unique=False,
+        sqlite_where=sa.text("issue_flags != 0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_listings_owner_id_status_with_issues", table_name="listings")
+    op.drop_table("user_reminders")
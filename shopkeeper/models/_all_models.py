@@ -3,6 +3,10 @@
 # Utility file to ensure all models are imported for Alembic auto-generation.
 # Should not be imported outside of shopkeeper.migrations.env
 
+from .blob import Blob  # type: ignore
 from .listing import Listing  # type: ignore
 from .listing_event import ListingEvent  # type: ignore
 from .listing_image import ListingImage  # type: ignore
+from .listing_image_variant import ListingImageVariant  # type: ignore
+from .outbox_message import OutboxMessage  # type: ignore
+from .user_reminder import UserReminder  # type: ignore
@@ -0,0 +1,55 @@
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+from shopkeeper.db import Base
+
+
+class Blob(Base):
+    """A file in the content-addressed image store, shared by every listing image with
+    the same contents. The reference count is the number of visible listing images using
+    it - blobs which drop to zero are removed by gc-images."""
+
+    __tablename__ = "blobs"
+
+    # SHA-256 of the file's contents
+    hash: Mapped[str] = mapped_column(primary_key=True)
+    # Relative to the image path
+    path: Mapped[str]
+    byte_size: Mapped[int]
+    ref_count: Mapped[int] = mapped_column(default=0)
+
+    @staticmethod
+    def path_for(hash: str, extension: str) -> str:
+        return f"{hash[:2]}/{hash}{extension}"
+
+    @classmethod
+    async def acquire(
+        cls, session: AsyncSession, *, hash: str, extension: str, byte_size: int
+    ) -> str:
+        """Add a reference to a blob, creating it if it doesn't exist yet, and return
+        its path."""
+        path = cls.path_for(hash, extension)
+        statement = insert(Blob).values(
+            hash=hash, path=path, byte_size=byte_size, ref_count=1
+        )
+        await session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[Blob.hash],
+                set_={"ref_count": Blob.ref_count + 1},
+            )
+        )
+        return path
+
+    @classmethod
+    async def release(cls, session: AsyncSession, hash: str) -> None:
+        await session.execute(
+            update(Blob)
+            .filter(Blob.hash == hash, Blob.ref_count > 0)
+            .values(ref_count=Blob.ref_count - 1)
+            .execution_options(synchronize_session=False)
+        )
+
+
+__all__ = ["Blob"]
@@ -1,19 +1,32 @@
+import time
 from dataclasses import dataclass
-from difflib import unified_diff
 from enum import Enum
+from functools import reduce
 from types import EllipsisType
-from typing import TYPE_CHECKING, Callable, Literal, cast
+from typing import TYPE_CHECKING, Callable, Iterable, Literal, cast
 
 import discord
 from fastapi import HTTPException
-from sqlalchemy import ColumnElement, and_, not_, or_, select
+from sqlalchemy import (
+    ColumnElement,
+    Index,
+    and_,
+    case,
+    literal_column,
+    not_,
+    select,
+    text,
+    update,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import Mapped, joinedload, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 import shopkeeper.bot as bot
 import shopkeeper.models.listing_event as listing_event
 from shopkeeper.config import config
 from shopkeeper.db import Base
+from shopkeeper.metrics import Histogram
+from shopkeeper.models.outbox_message import OutboxMessage, OutboxMessageType
 
 if TYPE_CHECKING:
     from .listing_event import ListingEvent
@@ -31,6 +44,11 @@ class ListingStatus(Enum):
     Closed = "closed"
 
 
+listing_edit_transaction_seconds = Histogram(
+    "shopkeeper_listing_edit_transaction_seconds",
+    "Time spent in the database transaction of successful listing edits.",
+)
+
 listing_colours: dict[tuple[ListingType, ListingStatus], discord.Colour] = {
     (ListingType.Buy, ListingStatus.Open): discord.Colour.blue(),
     (ListingType.Buy, ListingStatus.Pending): discord.Colour.gold(),
@@ -47,6 +65,40 @@ def stringify_diff_field(val: str | None, empty_placeholder: str = "`(empty)`")
 
 class Listing(Base):
     __tablename__ = "listings"
+    __table_args__ = (
+        Index("ix_listings_owner_id_status", "owner_id", "status"),
+        Index("ix_listings_owner_id_issue_flags", "owner_id", "issue_flags"),
+        Index(
+            "ix_listings_owner_id_status_with_issues",
+            "owner_id",
+            "status",
+            sqlite_where=text("issue_flags != 0"),
+        ),
+        Index(
+            "ix_listings_status_type",
+            "status",
+            "type",
+            sqlite_where=text("is_hidden = 0"),
+        ),
+        Index(
+            "ix_listings_status_id",
+            "status",
+            "id",
+            sqlite_where=text("is_hidden = 0"),
+        ),
+        Index(
+            "ix_listings_status_title",
+            "status",
+            "title",
+            sqlite_where=text("is_hidden = 0"),
+        ),
+        Index(
+            "ix_listings_status_price",
+            "status",
+            "price",
+            sqlite_where=text("is_hidden = 0"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
@@ -56,10 +108,13 @@ class Listing(Base):
     type: Mapped[ListingType]
     status: Mapped[ListingStatus]
     is_hidden: Mapped[bool] = mapped_column(default=False)
+    # Bitmask of the flags of the issues in all_listing_issues which apply to the listing,
+    # kept up to date with update_issue_flags
+    issue_flags: Mapped[int] = mapped_column(default=0)
 
     owner_id: Mapped[int]
     message_id: Mapped[int]
-    thread_id: Mapped[int]
+    thread_id: Mapped[int] = mapped_column(index=True)
 
     images: Mapped[list["ListingImage"]] = relationship(
         back_populates="listing",
@@ -97,11 +152,48 @@ class Listing(Base):
         if self.status == ListingStatus.Closed:
             return []
 
-        return [issue.details for issue in all_listing_issues if issue.predicate(self)]
+        return [
+            issue.details
+            for issue in all_listing_issues
+            if self.issue_flags & issue.flag
+        ]
 
     @staticmethod
     def get_issues_clause() -> ColumnElement[bool]:
-        return or_(*[issue.sql_clause() for issue in all_listing_issues])
+        # Inlined rather than bound, so that SQLite can use the partial index on listings
+        # with issues
+        return Listing.issue_flags != literal_column("0")
+
+    @staticmethod
+    def get_issue_flags_expression() -> ColumnElement[int]:
+        """Compute the issue flags of a listing from scratch."""
+        return reduce(
+            lambda flags, flag: flags.op("|")(flag),
+            [
+                case((issue.sql_clause(), issue.flag), else_=0)
+                for issue in all_listing_issues
+            ],
+        )
+
+    @staticmethod
+    async def update_issue_flags(
+        session: AsyncSession, listing_ids: Iterable[int]
+    ) -> None:
+        """Recompute the stored issue flags of listings. This must be called whenever
+        anything an issue depends on changes - a listing's fields or its images.
+
+        Any of the listings already loaded are repopulated, which resets their loaded
+        relationships, so their images can't be read afterwards without loading them
+        again."""
+        # Returning the updated rows refreshes any of the listings already loaded, which
+        # would otherwise be left stale or, with the "fetch" strategy, expired
+        await session.scalars(
+            update(Listing)
+            .filter(Listing.id.in_(listing_ids))
+            .values(issue_flags=Listing.get_issue_flags_expression())
+            .returning(Listing)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
 
     @classmethod
     async def create(
@@ -124,7 +216,7 @@ class Listing(Base):
         )
 
         marketplace_channel = cast(
-            discord.TextChannel, await bot.client.fetch_channel(config.channel_id)
+            discord.TextChannel, await bot.client.resolve_channel(config.channel_id)
         )
 
         thread_message = await marketplace_channel.send(embed=new_listing.embed)
@@ -142,6 +234,7 @@ class Listing(Base):
         async with session.begin():
             session.add(new_listing)
             await session.flush()
+            await Listing.update_issue_flags(session, [new_listing.id])
             session.add(
                 listing_event.ListingEvent(
                     listing_id=new_listing.id,
@@ -151,15 +244,6 @@ class Listing(Base):
             )
             await session.commit()
 
-        if config.events_channel_id is not None:
-            await cast(
-                discord.TextChannel,
-                await bot.client.fetch_channel(config.events_channel_id),
-            ).send(
-                content=f"## Listing **[{new_listing.title}]({thread_message.jump_url})** created",
-                suppress_embeds=True,
-            )
-
         return new_listing
 
     @classmethod
@@ -174,18 +258,12 @@ class Listing(Base):
         price: str | EllipsisType = ...,
         status: ListingStatus | EllipsisType = ...,
     ) -> "Listing":
+        transaction_start = time.perf_counter()
+
         async with session.begin():
             listing_instance = (
-                (
-                    await session.execute(
-                        select(Listing)
-                        .options(joinedload(Listing.images))
-                        .filter_by(id=listing)
-                    )
-                )
-                .unique()
-                .scalar_one_or_none()
-            )
+                await session.execute(select(Listing).filter_by(id=listing))
+            ).scalar_one_or_none()
 
             if listing_instance is None:
                 raise HTTPException(status_code=404, detail="Listing not found")
@@ -198,24 +276,11 @@ class Listing(Base):
             if listing_instance.status == ListingStatus.Closed:
                 raise HTTPException(status_code=400, detail="Listing is closed")
 
-            channel = cast(
-                discord.TextChannel, await bot.client.fetch_channel(config.channel_id)
-            )
-            message = await channel.fetch_message(listing_instance.message_id)
-            thread = cast(
-                discord.Thread,
-                await bot.client.fetch_channel(listing_instance.thread_id),
-            )
-
-            edited_message_sections: list[str] = []
             listing_events: list["ListingEvent"] = []
-            should_close_thread = False
+            thread_changed = False
 
             if title is not ...:
                 if listing_instance.title != title:
-                    edited_message_sections.append(
-                        f"Title changed from {listing_instance.title} to {title}"
-                    )
                     listing_events.append(
                         listing_event.ListingEvent(
                             listing_id=listing_instance.id,
@@ -224,25 +289,12 @@ class Listing(Base):
                             to_value=title,
                         )
                     )
-                    await thread.edit(name=title)
+                    thread_changed = True
 
                 listing_instance.title = title
 
             if description is not ...:
                 if listing_instance.description != description:
-                    diff = unified_diff(
-                        stringify_diff_field(
-                            listing_instance.description, ""
-                        ).splitlines(),
-                        stringify_diff_field(description, "").splitlines(),
-                        lineterm="",
-                        fromfile="Old description",
-                        tofile="New description",
-                    )
-
-                    edited_message_sections.append(
-                        f"Description changed:\n```diff\n{'\n'.join(diff)}\n```"
-                    )
                     listing_events.append(
                         listing_event.ListingEvent(
                             listing_id=listing_instance.id,
@@ -255,9 +307,6 @@ class Listing(Base):
                 listing_instance.description = description
             if price is not ...:
                 if listing_instance.price != price:
-                    edited_message_sections.append(
-                        f"Price changed from {stringify_diff_field(listing_instance.price)} to {stringify_diff_field(price)}"
-                    )
                     listing_events.append(
                         listing_event.ListingEvent(
                             listing_id=listing_instance.id,
@@ -270,9 +319,6 @@ class Listing(Base):
                 listing_instance.price = price
             if status is not ...:
                 if listing_instance.status != status:
-                    edited_message_sections.append(
-                        f"Status changed from {listing_instance.status.name} to {status.name}"
-                    )
                     listing_events.append(
                         listing_event.ListingEvent(
                             listing_id=listing_instance.id,
@@ -282,29 +328,40 @@ class Listing(Base):
                         )
                     )
                     if status == ListingStatus.Closed:
-                        should_close_thread = True
+                        thread_changed = True
 
                 listing_instance.status = status
 
             if listing_events:
                 session.add_all(listing_events)
 
-            await session.commit()
+            await Listing.update_issue_flags(session, [listing_instance.id])
 
-        if edited_message_sections:
-            await message.edit(embed=listing_instance.embed)
+            # Discord is updated by the outbox worker once the edit is committed, so that
+            # the database isn't kept locked while waiting on (possibly rate limited)
+            # requests. The message and thread are rendered from the listing when they
+            # are delivered, so pending updates to them are coalesced.
+            if listing_events:
+                await OutboxMessage.enqueue(
+                    session,
+                    OutboxMessageType.ListingMessage,
+                    {"listing_id": listing_instance.id},
+                    coalesce_key=f"listing_message:{listing_instance.id}",
+                )
 
-        if should_close_thread:
-            await thread.edit(archived=True, locked=True)
+            if thread_changed:
+                await OutboxMessage.enqueue(
+                    session,
+                    OutboxMessageType.ListingThread,
+                    {"listing_id": listing_instance.id},
+                    coalesce_key=f"listing_thread:{listing_instance.id}",
+                )
 
-        if config.events_channel_id is not None and edited_message_sections:
-            await cast(
-                discord.TextChannel,
-                await bot.client.fetch_channel(config.events_channel_id),
-            ).send(
-                content=f"## Listing **[{listing_instance.title}]({message.jump_url})** edited\n{'\n'.join(edited_message_sections)}",
-                suppress_embeds=True,
-            )
+            await session.commit()
+
+        listing_edit_transaction_seconds.observe(
+            time.perf_counter() - transaction_start
+        )
 
         return listing_instance
 
@@ -324,8 +381,8 @@ class ListingIssueDetails:
 @dataclass
 class ListingIssues:
     details: ListingIssueDetails
+    flag: int
     sql_clause: Callable[[], ColumnElement[bool]]
-    predicate: Callable[["Listing"], bool]
 
 
 all_listing_issues: list[ListingIssues] = [
@@ -336,12 +393,10 @@ all_listing_issues: list[ListingIssues] = [
             icon="image",
             resolution_location="discord",
         ),
+        flag=1 << 0,
         sql_clause=lambda: and_(
             not_(Listing.images.any()), Listing.type == ListingType.Sell
         ),
-        predicate=lambda listing: (
-            len(listing.images) == 0 and listing.type == ListingType.Sell
-        ),
     ),
     ListingIssues(
         details=ListingIssueDetails(
@@ -349,10 +404,8 @@ all_listing_issues: list[ListingIssues] = [
             description="Your listing has no price.",
             icon="dollar-sign",
         ),
+        flag=1 << 1,
         sql_clause=lambda: and_(Listing.price == "", Listing.type == ListingType.Sell),
-        predicate=lambda listing: (
-            listing.price == "" and listing.type == ListingType.Sell
-        ),
     ),
     ListingIssues(
         details=ListingIssueDetails(
@@ -360,7 +413,7 @@ all_listing_issues: list[ListingIssues] = [
             description="Your listing has no description.",
             icon="text",
         ),
+        flag=1 << 2,
         sql_clause=lambda: Listing.description == "",
-        predicate=lambda listing: listing.description == "",
     ),
 ]
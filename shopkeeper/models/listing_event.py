@@ -2,7 +2,7 @@ from datetime import datetime, timezone
 from enum import Enum
 from typing import TYPE_CHECKING, Optional
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from shopkeeper.db import Base
@@ -17,10 +17,20 @@ class EventType(Enum):
     DescriptionChanged = "description_changed"
     PriceChanged = "price_changed"
     StatusChanged = "status_changed"
+    ListingHidden = "listing_hidden"
+    ImageAdded = "image_added"
+    ImageHidden = "image_hidden"
 
 
 class ListingEvent(Base):
     __tablename__ = "listing_events"
+    __table_args__ = (
+        Index(
+            "ix_listing_events_unpublished",
+            "id",
+            sqlite_where=text("published_at IS NULL"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     type: Mapped[EventType]
@@ -29,8 +39,10 @@ class ListingEvent(Base):
     time: Mapped[datetime] = mapped_column(
         default=lambda: datetime.now(tz=timezone.utc)
     )
+    # When the event was posted to the events channel, as part of a digest
+    published_at: Mapped[Optional[datetime]]
 
-    listing_id: Mapped[int] = mapped_column(ForeignKey("listings.id"))
+    listing_id: Mapped[int] = mapped_column(ForeignKey("listings.id"), index=True)
     listing: Mapped["Listing"] = relationship(back_populates="events")
 
 
@@ -1,32 +1,46 @@
-import uuid
-from pathlib import Path
-from typing import TYPE_CHECKING
+import asyncio
+from typing import TYPE_CHECKING, Optional
 
-import discord
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
-from shopkeeper.config import config
 from shopkeeper.db import Base
+from shopkeeper.imaging import IngestedImage, store_blob
+from shopkeeper.models.blob import Blob
+from shopkeeper.models.listing_event import EventType, ListingEvent
 
 if TYPE_CHECKING:
     from .listing import Listing
-
-PERMITTED_FILE_TYPES = [".png", ".jpg", ".jpeg"]
+    from .listing_image_variant import ListingImageVariant
 
 
 class ListingImage(Base):
     __tablename__ = "listing_images"
+    __table_args__ = (
+        Index(
+            "ix_listing_images_listing_id",
+            "listing_id",
+            sqlite_where=text("is_hidden = 0"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
+    # The blob's path, kept here so that serving an image doesn't need a join
     path: Mapped[str]
+    # None once the image has been hidden and gc-images has removed its blob
+    blob_hash: Mapped[Optional[str]] = mapped_column(
+        ForeignKey("blobs.hash"), index=True
+    )
     width: Mapped[int]
     height: Mapped[int]
     is_hidden: Mapped[bool] = mapped_column(default=False)
 
     listing_id: Mapped[int] = mapped_column(ForeignKey("listings.id"))
     listing: Mapped["Listing"] = relationship(back_populates="images")
+    variants: Mapped[list["ListingImageVariant"]] = relationship(
+        back_populates="image", lazy="raise"
+    )
 
     @property
     def url(self) -> str:
@@ -37,30 +51,43 @@ class ListingImage(Base):
     def thumbnail_url(self) -> str:
         return f"/images/{self.id}/thumbnail"
 
-    @classmethod
-    async def from_attachment(
-        cls, *, listing_id: int, attachment: discord.Attachment, session: AsyncSession
-    ) -> "ListingImage | None":
-        attachment_extension = Path(attachment.filename).suffix.lower()
-
-        if attachment_extension not in PERMITTED_FILE_TYPES:
-            return None
-
-        listing_image_prefix = config.image_path / str(listing_id)
-        listing_image_prefix.mkdir(parents=True, exist_ok=True)
-
-        image_path = Path(str(listing_id)) / (str(uuid.uuid4()) + attachment_extension)
-        file_path = config.image_path / image_path
+    @property
+    def srcset(self) -> list["ListingImageVariant"]:
+        # Formats are negotiated when the variant is requested, so only one entry per size is needed
+        variants_by_size = {variant.size: variant for variant in self.variants}
+        return [variants_by_size[size] for size in sorted(variants_by_size)]
 
-        with open(file_path, "wb") as f:
-            await attachment.save(f)
+    @classmethod
+    async def from_ingested(
+        cls, *, listing_id: int, image: IngestedImage, session: AsyncSession
+    ) -> "ListingImage":
+        """Add a row for a downloaded image, moving it into the blob store. Reposting an
+        image that's already stored adds a reference to the existing blob instead."""
+        path = await Blob.acquire(
+            session,
+            hash=image.hash,
+            extension=image.extension,
+            byte_size=image.byte_size,
+        )
+        # Moved only once the blob's row is written and holds the write lock, so that
+        # gc-images can't remove the blob between the two
+        await asyncio.to_thread(store_blob, image.temporary_path, path)
 
         instance = ListingImage(
             listing_id=listing_id,
-            path=str(image_path),
-            width=attachment.width,
-            height=attachment.height,
+            path=path,
+            blob_hash=image.hash,
+            width=image.width,
+            height=image.height,
         )
         session.add(instance)
+        await session.flush()
+        session.add(
+            ListingEvent(
+                listing_id=listing_id,
+                type=EventType.ImageAdded,
+                to_value=str(instance.id),
+            )
+        )
 
         return instance
@@ -0,0 +1,46 @@
+from enum import Enum
+from typing import TYPE_CHECKING
+
+from sqlalchemy import ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from shopkeeper.db import Base
+
+if TYPE_CHECKING:
+    from .listing_image import ListingImage
+
+
+class ImageFormat(Enum):
+    # Ordered from smallest to largest typical encoded size
+    AVIF = "avif"
+    WebP = "webp"
+    JPEG = "jpeg"
+
+    @property
+    def media_type(self) -> str:
+        return f"image/{self.value}"
+
+    @property
+    def pillow_format(self) -> str:
+        return self.name.upper()
+
+
+class ListingImageVariant(Base):
+    __tablename__ = "listing_image_variants"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    size: Mapped[int]
+    format: Mapped[ImageFormat]
+    width: Mapped[int]
+    height: Mapped[int]
+    byte_size: Mapped[int]
+
+    image_id: Mapped[int] = mapped_column(ForeignKey("listing_images.id"), index=True)
+    image: Mapped["ListingImage"] = relationship(back_populates="variants")
+
+    @property
+    def url(self) -> str:
+        return f"/images/{self.image_id}/variants/{self.size}"
+
+
+__all__ = ["ImageFormat", "ListingImageVariant"]
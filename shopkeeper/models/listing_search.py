@@ -0,0 +1,85 @@
+from sqlalchemy import Column, Integer, MetaData, String, Subquery, Table, select
+
+# The full-text index is an FTS5 external content table over listings, kept in sync by
+# triggers. Alembic can't autogenerate virtual tables or triggers, so it lives in its own
+# metadata and is excluded from autogeneration - its schema is managed by hand in
+# migrations. Note that SQLite drops the triggers whenever the listings table is recreated,
+# which batch migrations do for most alterations, so migrations should alter the listings
+# table directly where possible or recreate the triggers afterwards.
+listing_search_metadata = MetaData()
+
+listings_fts = Table(
+    "listings_fts",
+    listing_search_metadata,
+    Column("rowid", Integer, primary_key=True),
+    Column("title", String),
+    Column("description", String),
+    # Hidden columns - the one named after the table is the left hand side of MATCH
+    Column("listings_fts", String),
+    Column("rank", String),
+)
+
+listings_fts_ddl = (
+    """
+    CREATE VIRTUAL TABLE listings_fts USING fts5(
+        title,
+        description,
+        content='listings',
+        content_rowid='id',
+        prefix='2 3',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    # Rank by bm25, with matches in the title weighted over those in the description
+    "INSERT INTO listings_fts(listings_fts, rank) VALUES('rank', 'bm25(10.0, 1.0)')",
+    """
+    CREATE TRIGGER listings_fts_after_insert AFTER INSERT ON listings BEGIN
+        INSERT INTO listings_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER listings_fts_after_delete AFTER DELETE ON listings BEGIN
+        INSERT INTO listings_fts(listings_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER listings_fts_after_update AFTER UPDATE OF title, description ON listings BEGIN
+        INSERT INTO listings_fts(listings_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO listings_fts(rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+)
+
+
+def to_fts_query(text: str) -> str | None:
+    """Convert free text into an FTS5 query matching listings containing every word
+    as a prefix, or None if there is nothing to search for."""
+    terms = ['"' + term.replace('"', '""') + '"*' for term in text.split()]
+    return " ".join(terms) if terms else None
+
+
+def listing_matches(text: str) -> Subquery | None:
+    """Select the ids (as `rowid`) and relevance (as `rank`, lower is better) of the
+    listings matching free text, or None if there is nothing to search for."""
+    fts_query = to_fts_query(text)
+    if fts_query is None:
+        return None
+
+    return (
+        select(listings_fts.c.rowid, listings_fts.c.rank)
+        .filter(listings_fts.c.listings_fts.match(fts_query))
+        .subquery("listing_matches")
+    )
+
+
+__all__ = [
+    "listing_matches",
+    "listing_search_metadata",
+    "listings_fts",
+    "listings_fts_ddl",
+    "to_fts_query",
+]
@@ -0,0 +1,88 @@
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Optional
+
+from sqlalchemy import JSON, Index, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Mapped, mapped_column
+
+from shopkeeper.db import Base
+from shopkeeper.metrics import Counter
+
+outbox_messages_coalesced = Counter(
+    "shopkeeper_outbox_messages_coalesced_total",
+    "Outbox messages which were merged into an identical one instead of being delivered.",
+    ("type",),
+)
+
+
+class OutboxMessageType(Enum):
+    # Bring a listing's message in the marketplace channel up to date with the listing
+    ListingMessage = "listing_message"
+    # Bring a listing's thread name and archived state up to date with the listing
+    ListingThread = "listing_thread"
+    ChannelMessage = "channel_message"
+    DirectMessage = "direct_message"
+
+
+class OutboxMessage(Base):
+    """A Discord side effect of a change to the database, written in the same transaction
+    as the change and delivered afterwards by the outbox worker."""
+
+    __tablename__ = "outbox_messages"
+    __table_args__ = (
+        Index(
+            "ix_outbox_messages_available_at",
+            "available_at",
+            sqlite_where=text("claimed_at IS NULL AND failed_at IS NULL"),
+        ),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    type: Mapped[OutboxMessageType]
+    payload: Mapped[dict[str, Any]] = mapped_column(JSON)
+    # Pending messages with the same key have the same effect, so only one is kept
+    coalesce_key: Mapped[Optional[str]] = mapped_column(index=True)
+
+    attempts: Mapped[int] = mapped_column(default=0)
+    available_at: Mapped[datetime] = mapped_column(
+        default=lambda: datetime.now(tz=timezone.utc)
+    )
+    claimed_at: Mapped[Optional[datetime]]
+    failed_at: Mapped[Optional[datetime]]
+    last_error: Mapped[Optional[str]]
+
+    @classmethod
+    async def enqueue(
+        cls,
+        session: AsyncSession,
+        type: OutboxMessageType,
+        payload: dict[str, Any],
+        *,
+        coalesce_key: str | None = None,
+    ) -> None:
+        """Add a message to the outbox as part of the session's transaction. If the
+        message can be coalesced with one that hasn't been picked up yet, that one will
+        deliver it instead."""
+        if coalesce_key is not None:
+            pending = (
+                await session.execute(
+                    select(OutboxMessage.id).filter(
+                        OutboxMessage.coalesce_key == coalesce_key,
+                        OutboxMessage.claimed_at.is_(None),
+                        OutboxMessage.failed_at.is_(None),
+                    )
+                )
+            ).first()
+
+            if pending is not None:
+                outbox_messages_coalesced.inc(type=type.value)
+                return
+
+        session.add(
+            OutboxMessage(type=type, payload=payload, coalesce_key=coalesce_key)
+        )
+        session.info["outbox_enqueued"] = True
+
+
+__all__ = ["OutboxMessage", "OutboxMessageType"]
@@ -0,0 +1,18 @@
+from datetime import datetime
+
+from sqlalchemy.orm import Mapped, mapped_column
+
+from shopkeeper.db import Base
+
+
+class UserReminder(Base):
+    """When a user was last reminded about their listings with issues, so that reminders
+    are spaced out by the reminder interval across restarts."""
+
+    __tablename__ = "user_reminders"
+
+    user_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    last_reminded_at: Mapped[datetime]
+
+
+__all__ = ["UserReminder"]
@@ -0,0 +1,320 @@
+import asyncio
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+from typing import Any, Sequence, cast
+
+import discord
+from sqlalchemy import Select, delete, event, select, update
+from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm import Session
+
+from shopkeeper.bot import client
+from shopkeeper.config import config
+from shopkeeper.db import read_session, write_session
+from shopkeeper.metrics import Counter, Histogram
+from shopkeeper.models.listing import Listing, ListingStatus
+from shopkeeper.models.outbox_message import (
+    OutboxMessage,
+    OutboxMessageType,
+    outbox_messages_coalesced,
+)
+
+outbox_delivery_seconds = Histogram(
+    "shopkeeper_outbox_delivery_seconds",
+    "Time taken to deliver outbox messages to Discord.",
+    ("type",),
+)
+outbox_delivery_failures = Counter(
+    "shopkeeper_outbox_delivery_failures_total",
+    "Failed attempts at delivering outbox messages, by whether they will be retried.",
+    ("type", "retrying"),
+)
+
+# Retrying can't fix these - the listing, channel, thread or user is gone or out of reach
+PERMANENT_ERRORS = (discord.Forbidden, discord.NotFound, NoResultFound)
+
+
+def now() -> datetime:
+    return datetime.now(tz=timezone.utc)
+
+
+async def deliver(message: OutboxMessage) -> None:
+    payload = message.payload
+
+    match message.type:
+        case OutboxMessageType.ListingMessage | OutboxMessageType.ListingThread:
+            # Rendered from the listing as it is now, so coalesced messages deliver the
+            # latest state
+            async with read_session() as session:
+                listing = await session.get_one(Listing, payload["listing_id"])
+
+            if message.type == OutboxMessageType.ListingMessage:
+                await (
+                    client.messageable(config.channel_id)
+                    .get_partial_message(listing.message_id)
+                    .edit(embed=listing.embed)
+                )
+            else:
+                thread = cast(
+                    discord.Thread, await client.resolve_channel(listing.thread_id)
+                )
+                thread_changes: dict[str, Any] = {"name": listing.title}
+                if listing.status == ListingStatus.Closed:
+                    thread_changes.update(archived=True, locked=True)
+                await thread.edit(**thread_changes)
+
+        case OutboxMessageType.ChannelMessage:
+            await client.messageable(payload["channel_id"]).send(
+                content=payload["content"], suppress_embeds=True
+            )
+
+        case OutboxMessageType.DirectMessage:
+            user = client.get_user(payload["user_id"]) or await client.fetch_user(
+                payload["user_id"]
+            )
+            await user.send(payload["content"])
+
+
+def pending_outbox_messages_query(limit: int) -> Select[tuple[OutboxMessage]]:
+    return (
+        select(OutboxMessage)
+        .filter(
+            OutboxMessage.claimed_at.is_(None),
+            OutboxMessage.failed_at.is_(None),
+            OutboxMessage.available_at <= now(),
+        )
+        .order_by(OutboxMessage.available_at, OutboxMessage.id)
+        .limit(limit)
+    )
+
+
+def delivery_lane(message: OutboxMessage) -> str:
+    """Messages in the same lane are delivered in the order they were enqueued in, while
+    different lanes are delivered concurrently."""
+    match message.type:
+        case OutboxMessageType.ListingMessage | OutboxMessageType.ListingThread:
+            return f"listing:{message.payload['listing_id']}"
+        case OutboxMessageType.ChannelMessage:
+            return f"channel:{message.payload['channel_id']}"
+        case OutboxMessageType.DirectMessage:
+            return f"user:{message.payload['user_id']}"
+
+
+def retry_after(error: Exception) -> float | None:
+    """How long Discord asked us to back off for, if the error was due to rate limits."""
+    if isinstance(error, discord.RateLimited):
+        return error.retry_after
+    if isinstance(error, discord.HTTPException) and error.status == 429:
+        return float(error.response.headers.get("Retry-After", 1))
+    return None
+
+
+class OutboxWorker:
+    """Delivers outbox messages in the background. Delivery is at least once - a message
+    being delivered when the worker stops is delivered again when it next starts."""
+
+    def __init__(
+        self,
+        *,
+        batch_size: int = 50,
+        concurrency: int = 4,
+        max_attempts: int = 8,
+        base_delay: float = 2.0,
+    ) -> None:
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        self._stopping = False
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self, timeout: float) -> None:
+        """Stop once the batch being delivered has finished, or after the timeout."""
+        if self._task is None:
+            return
+
+        self._stopping = True
+        self._wake.set()
+
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except TimeoutError:
+            pass
+        finally:
+            self._task = None
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    async def run(self) -> None:
+        # Only one worker runs at a time, so anything still claimed was being delivered
+        # when the previous one stopped
+        async with write_session() as session:
+            await session.execute(
+                update(OutboxMessage)
+                .filter(OutboxMessage.claimed_at.is_not(None))
+                .values(claimed_at=None)
+            )
+            await session.commit()
+
+        while not self._stopping:
+            try:
+                delivered_any = await self.deliver_batch()
+            except Exception:
+                traceback.print_exc()
+                delivered_any = False
+
+            if not delivered_any and not self._stopping:
+                try:
+                    await asyncio.wait_for(
+                        self._wake.wait(), timeout=config.outbox_poll_interval
+                    )
+                except TimeoutError:
+                    pass
+                self._wake.clear()
+
+    async def claim_batch(self) -> Sequence[OutboxMessage]:
+        async with write_session() as session:
+            messages = (
+                (await session.execute(pending_outbox_messages_query(self.batch_size)))
+                .scalars()
+                .all()
+            )
+
+            claimed_at = now()
+            for message in messages:
+                message.claimed_at = claimed_at
+            await session.commit()
+
+            return messages
+
+    async def deliver_batch(self) -> bool:
+        messages = await self.claim_batch()
+        if not messages:
+            return False
+
+        # Messages with the same key have the same effect, so each group is delivered
+        # once. Messages without a key form groups of their own.
+        groups_by_key: dict[str | int, list[OutboxMessage]] = {}
+        for message in messages:
+            groups_by_key.setdefault(message.coalesce_key or message.id, []).append(
+                message
+            )
+
+        lanes: dict[str, list[list[OutboxMessage]]] = {}
+        for group in groups_by_key.values():
+            lanes.setdefault(delivery_lane(group[0]), []).append(group)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        rate_limited_for: float | None = None
+
+        async def deliver_lane(groups: list[list[OutboxMessage]]) -> None:
+            nonlocal rate_limited_for
+
+            async with semaphore:
+                for index, group in enumerate(groups):
+                    if self._stopping or rate_limited_for is not None:
+                        # Rate limited - hold the rest of the batch back for as long as
+                        # asked
+                        await self.release(
+                            [message for group in groups[index:] for message in group],
+                            delay=rate_limited_for or 0,
+                        )
+                        return
+
+                    delay = await self.deliver_group(group)
+                    if delay is not None:
+                        rate_limited_for = max(delay, rate_limited_for or 0)
+
+        await asyncio.gather(*(deliver_lane(groups) for groups in lanes.values()))
+
+        return True
+
+    async def deliver_group(self, group: list[OutboxMessage]) -> float | None:
+        """Deliver a group of identical messages, returning how long to back off for if
+        Discord rate limited the delivery."""
+        message = group[0]
+        ids = [message.id for message in group]
+        start = time.perf_counter()
+
+        if len(group) > 1:
+            outbox_messages_coalesced.inc(len(group) - 1, type=message.type.value)
+
+        try:
+            await deliver(message)
+        except Exception as e:
+            delay = retry_after(e)
+            attempts = message.attempts + 1
+            retrying = not isinstance(e, PERMANENT_ERRORS) and (
+                delay is not None or attempts < self.max_attempts
+            )
+
+            outbox_delivery_failures.inc(
+                type=message.type.value, retrying=str(retrying).lower()
+            )
+            if not retrying:
+                traceback.print_exc()
+
+            async with write_session() as session:
+                await session.execute(
+                    update(OutboxMessage)
+                    .filter(OutboxMessage.id.in_(ids))
+                    .values(
+                        attempts=attempts,
+                        last_error=repr(e),
+                        claimed_at=None,
+                        available_at=now()
+                        + timedelta(
+                            seconds=delay or self.base_delay * 2 ** (attempts - 1)
+                        ),
+                        failed_at=None if retrying else now(),
+                    )
+                )
+                await session.commit()
+
+            return delay
+        finally:
+            outbox_delivery_seconds.observe(
+                time.perf_counter() - start, type=message.type.value
+            )
+
+        async with write_session() as session:
+            await session.execute(
+                delete(OutboxMessage).filter(OutboxMessage.id.in_(ids))
+            )
+            await session.commit()
+
+        return None
+
+    async def release(self, messages: list[OutboxMessage], *, delay: float = 0) -> None:
+        """Return claimed messages to the outbox without counting it as an attempt."""
+        if not messages:
+            return
+
+        async with write_session() as session:
+            await session.execute(
+                update(OutboxMessage)
+                .filter(OutboxMessage.id.in_([message.id for message in messages]))
+                .values(claimed_at=None, available_at=now() + timedelta(seconds=delay))
+            )
+            await session.commit()
+
+
+outbox_worker = OutboxWorker()
+
+
+@event.listens_for(Session, "after_commit")
+def wake_outbox_worker(session: Session) -> None:
+    # Deliver new messages straight away rather than at the next poll
+    if session.info.pop("outbox_enqueued", False):
+        outbox_worker.wake()
+
+
+__all__ = ["OutboxWorker", "outbox_worker"]
@@ -0,0 +1,68 @@
+import re
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+
+def normalize_statement(statement: str) -> str:
+    """Collapse a statement's whitespace, literals and lists of parameters, so that the
+    same query with different values is counted as one."""
+    statement = re.sub(r"'(?:[^']|'')*'", "?", statement)
+    statement = re.sub(r"\b\d+(?:\.\d+)?\b", "?", statement)
+    statement = re.sub(r"\(\s*\?(?:\s*,\s*\?)*\s*\)", "(?)", statement)
+    return " ".join(statement.split())
+
+
+@dataclass
+class StatementStats:
+    count: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+@dataclass
+class QueryProfile:
+    """The database statements executed while handling one request."""
+
+    statements: dict[str, StatementStats] = field(
+        default_factory=dict[str, StatementStats]
+    )
+    statement_count: int = 0
+    total_seconds: float = 0.0
+
+    def record(self, statement: str, seconds: float) -> None:
+        stats = self.statements.setdefault(
+            normalize_statement(statement), StatementStats()
+        )
+        stats.count += 1
+        stats.total_seconds += seconds
+        stats.max_seconds = max(stats.max_seconds, seconds)
+
+        self.statement_count += 1
+        self.total_seconds += seconds
+
+    def slowest(self, limit: int) -> list[tuple[str, StatementStats]]:
+        """The statements which took the most time in total, slowest first."""
+        return sorted(
+            self.statements.items(),
+            key=lambda item: item[1].total_seconds,
+            reverse=True,
+        )[:limit]
+
+    def repeated(self, threshold: int) -> list[tuple[str, StatementStats]]:
+        """Statements executed at least the given number of times, which usually means
+        something is being loaded one row at a time in a loop (an N+1 query)."""
+        return [
+            (statement, stats)
+            for statement, stats in self.statements.items()
+            if stats.count >= threshold
+        ]
+
+
+# Set for the duration of a request when profiling is enabled, and recorded into by
+# the engine events in shopkeeper.db
+current_query_profile: ContextVar[QueryProfile | None] = ContextVar(
+    "current_query_profile", default=None
+)
+
+
+__all__ = ["QueryProfile", "current_query_profile", "normalize_statement"]
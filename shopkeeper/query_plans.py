@@ -0,0 +1,216 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import Connection, Select, create_engine, select, text
+from sqlalchemy.dialects import sqlite
+
+import shopkeeper.bot as bot
+from shopkeeper.db import Base
+from shopkeeper.models.listing import ListingStatus, ListingType
+from shopkeeper.models.listing_image import ListingImage
+from shopkeeper.models.listing_image_variant import ListingImageVariant
+from shopkeeper.models.listing_search import listings_fts_ddl
+from shopkeeper.models.outbox_message import OutboxMessage
+from shopkeeper.outbox import pending_outbox_messages_query
+from shopkeeper.web.cursors import encode_cursor
+from shopkeeper.web.listing_stream import listing_events_query
+from shopkeeper.web.routers.listings import (
+    build_issue_count_query,
+    build_listings_query,
+)
+from shopkeeper.web.schemas.listings import SearchListingsSchema
+from shopkeeper.web.tasks.event_digests import unpublished_events_query
+from shopkeeper.web.tasks.reminders import reminders_due_query
+
+
+@dataclass
+class QueryPlan:
+    name: str
+    details: list[str]
+    # The id of the detail each one is nested under, or 0 at the top level
+    parents: list[int] = field(default_factory=list[int])
+    scannable_indexes: frozenset[str] = frozenset()
+    paginated: bool = False
+
+    @property
+    def subqueries(self) -> set[str]:
+        return {
+            detail.split()[1]
+            for detail in self.details
+            if detail.startswith(("CO-ROUTINE", "MATERIALIZE"))
+        }
+
+    @property
+    def has_scan(self) -> bool:
+        # Scanning the handful of rows produced by a subquery, a full-text index lookup or
+        # a partial index that only covers the rows wanted is fine, scanning a table isn't
+        subqueries = self.subqueries
+        return any(
+            detail.startswith("SCAN ")
+            and detail.split()[1] not in subqueries
+            and "VIRTUAL TABLE INDEX" not in detail
+            and not (
+                " INDEX " in detail and detail.split()[-1] in self.scannable_indexes
+            )
+            for detail in self.details
+        )
+
+    @property
+    def has_sort(self) -> bool:
+        # Sorting the rows of a subquery, which is limited to a page itself, is fine, but
+        # sorting rows read from a table means reading every match to find the first page
+        subqueries = self.subqueries
+        for detail, parent in zip(self.details, self.parents):
+            if detail != "USE TEMP B-TREE FOR ORDER BY":
+                continue
+
+            # The outermost loop the sorted rows come from
+            source = next(
+                (
+                    other
+                    for other, other_parent in zip(self.details, self.parents)
+                    if other_parent == parent and other.startswith(("SCAN ", "SEARCH "))
+                ),
+                "",
+            )
+            if not (source.startswith("SCAN ") and source.split()[1] in subqueries):
+                return True
+
+        return False
+
+    @property
+    def failed(self) -> bool:
+        return self.has_scan or (self.paginated and self.has_sort)
+
+
+@dataclass
+class HotPathQuery:
+    query: Select[Any]
+    # Paged through with a limit, so rows should be read in order from an index
+    paginated: bool = False
+    # Partial indexes so selective that the query may read them from start to end
+    scannable_indexes: frozenset[str] = frozenset()
+
+
+def hot_path_queries() -> dict[str, HotPathQuery]:
+    """Queries issued on hot paths, which should never need a full table scan, and if
+    they're paginated, shouldn't need to sort every matching row either."""
+    default_filters = SearchListingsSchema(
+        statuses=[ListingStatus.Open], types=[ListingType.Buy, ListingType.Sell]
+    )
+    several_statuses = [ListingStatus.Open, ListingStatus.Pending]
+
+    def search(**update: Any) -> HotPathQuery:
+        return HotPathQuery(
+            build_listings_query(default_filters.model_copy(update=update)),
+            paginated=True,
+        )
+
+    return {
+        "bot: open listing by thread": HotPathQuery(
+            bot.open_listing_by_thread_query(1)
+        ),
+        "bot: owned listing by thread": HotPathQuery(
+            bot.owned_listing_by_thread_query(1, 1)
+        ),
+        "listings: search (default filters)": search(),
+        "listings: search (by owner)": search(owners=["1"]),
+        "listings: search (with issues)": search(has_issues=True),
+        "listings: search (several statuses)": search(statuses=several_statuses),
+        "listings: search (next page by created)": search(
+            cursor=encode_cursor(("created", None, 100))
+        ),
+        "listings: search (next page by title)": search(
+            sort="title", cursor=encode_cursor(("title", "a", 1))
+        ),
+        "listings: search (next page by title, several statuses)": search(
+            statuses=several_statuses,
+            sort="title",
+            cursor=encode_cursor(("title", "a", 1)),
+        ),
+        "listings: search (next page by price)": search(
+            sort="price", cursor=encode_cursor(("price", "$1", 1))
+        ),
+        "listings: search (next page by price, any status)": search(
+            statuses=None, sort="price", cursor=encode_cursor(("price", "$1", 1))
+        ),
+        "listings: search (by text)": search(query="desk lamp"),
+        # Ranks aren't indexed, so every match has to be sorted by relevance
+        "listings: search (next page by relevance)": HotPathQuery(
+            build_listings_query(
+                default_filters.model_copy(
+                    update={
+                        "query": "desk lamp",
+                        "sort": "relevance",
+                        "cursor": encode_cursor(("relevance", None, 1)),
+                    }
+                )
+            )
+        ),
+        "listings: issue count": HotPathQuery(build_issue_count_query(1)),
+        "listings: images by listing": HotPathQuery(
+            select(ListingImage).filter(
+                ListingImage.listing_id.in_([1, 2]),
+                ListingImage.is_hidden == False,  # noqa: E712
+            )
+        ),
+        "listings: variants by image": HotPathQuery(
+            select(ListingImageVariant).filter(ListingImageVariant.image_id.in_([1, 2]))
+        ),
+        # Only open and pending listings with issues are in the index
+        "reminders: users due a reminder": HotPathQuery(
+            reminders_due_query(datetime(2000, 1, 1, tzinfo=timezone.utc)),
+            scannable_indexes=frozenset({"ix_listings_owner_id_status_with_issues"}),
+        ),
+        # Only events which are yet to be published are in the index
+        "event digests: unpublished events": HotPathQuery(
+            unpublished_events_query(),
+            scannable_indexes=frozenset({"ix_listing_events_unpublished"}),
+        ),
+        "listing stream: events after id": HotPathQuery(
+            listing_events_query(100, up_to_id=200, limit=200), paginated=True
+        ),
+        "outbox: pending messages": HotPathQuery(
+            pending_outbox_messages_query(50), paginated=True
+        ),
+        "outbox: pending message by coalesce key": HotPathQuery(
+            select(OutboxMessage.id).filter(
+                OutboxMessage.coalesce_key == "listing_message:1",
+                OutboxMessage.claimed_at.is_(None),
+                OutboxMessage.failed_at.is_(None),
+            )
+        ),
+    }
+
+
+def explain(connection: Connection, name: str, hot_path: HotPathQuery) -> QueryPlan:
+    compiled = hot_path.query.compile(
+        dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}
+    )
+    rows = connection.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+    return QueryPlan(
+        name=name,
+        details=[row.detail for row in rows],
+        parents=[row.parent for row in rows],
+        scannable_indexes=hot_path.scannable_indexes,
+        paginated=hot_path.paginated,
+    )
+
+
+def check_query_plans() -> list[QueryPlan]:
+    """Explain every hot path query against a fresh copy of the schema."""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+
+    with engine.connect() as connection:
+        for statement in listings_fts_ddl:
+            connection.execute(text(statement))
+
+        return [
+            explain(connection, name, hot_path)
+            for name, hot_path in hot_path_queries().items()
+        ]
+
+
+__all__ = ["HotPathQuery", "QueryPlan", "check_query_plans"]
@@ -0,0 +1,279 @@
+import hashlib
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from typing import Any
+
+import alembic.config
+from PIL import Image
+from sqlalchemy import create_engine, func, insert, inspect, select, text, update
+
+# Only imported so that their tables are part of the schema
+import shopkeeper.models.listing_image_variant  # noqa: F401 # pyright: ignore[reportUnusedImport]
+import shopkeeper.models.outbox_message  # noqa: F401 # pyright: ignore[reportUnusedImport]
+import shopkeeper.models.user_reminder  # noqa: F401 # pyright: ignore[reportUnusedImport]
+from shopkeeper.config import config
+from shopkeeper.db import Base
+from shopkeeper.imaging.blobs import FORMAT_EXTENSIONS
+from shopkeeper.models.blob import Blob
+from shopkeeper.models.listing import Listing, ListingStatus, ListingType
+from shopkeeper.models.listing_event import EventType, ListingEvent
+from shopkeeper.models.listing_image import ListingImage
+from shopkeeper.models.listing_search import listings_fts_ddl
+
+ADJECTIVES = [
+    "Vintage",
+    "Barely used",
+    "Mechanical",
+    "Wireless",
+    "Refurbished",
+    "Handmade",
+    "Boxed",
+    "Spare",
+    "Limited edition",
+    "Broken",
+]
+ITEMS = [
+    "keyboard",
+    "monitor",
+    "graphics card",
+    "bicycle",
+    "camera lens",
+    "desk lamp",
+    "board game",
+    "headphones",
+    "synthesizer",
+    "road bike helmet",
+    "espresso machine",
+    "mouse",
+]
+DESCRIPTION_WORDS = (
+    "works perfectly with a few scratches on the side, comes with the original box and "
+    "cables, collection only from the city centre or can post at cost, open to offers "
+    "and trades, selling because I upgraded, price is firm"
+).split()
+IMAGE_SIZES = [(1600, 1200), (1200, 1600), (2048, 1536), (1024, 1024), (800, 600)]
+
+
+@dataclass
+class SeedSummary:
+    listings: int
+    images: int
+    blobs: int
+    events: int
+
+
+def render_image(rng: random.Random, size: tuple[int, int]) -> bytes:
+    """Render a JPEG which compresses about as well as a photo, rather than a flat
+    colour which would make decoding and resizing unrealistically cheap."""
+    width, height = size
+    gradient = (
+        Image.linear_gradient("L")
+        .rotate(rng.uniform(0, 360))
+        # Pillow's annotations leave part of the size's type unknown
+        .resize((width, height))  # pyright: ignore[reportUnknownMemberType]
+    )
+    noise = Image.effect_noise((width, height), rng.uniform(16, 64))
+    tint = Image.new("L", (width, height), rng.randrange(256))
+
+    channels = [gradient, noise, tint]
+    rng.shuffle(channels)
+
+    output = BytesIO()
+    Image.merge("RGB", channels).save(output, "JPEG", quality=90)
+    return output.getvalue()
+
+
+def store_image(data: bytes) -> dict[str, Any]:
+    """Write an image into the blob store, returning its blob row."""
+    hash = hashlib.sha256(data).hexdigest()
+    path = Blob.path_for(hash, FORMAT_EXTENSIONS["JPEG"])
+
+    destination = config.image_path / path
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    destination.write_bytes(data)
+
+    return {"hash": hash, "path": path, "byte_size": len(data), "ref_count": 0}
+
+
+def listing_row(rng: random.Random, id: int, owners: int) -> dict[str, Any]:
+    type = rng.choice([ListingType.Sell] * 3 + [ListingType.Buy])
+    # Some listings are left without a description or price, so that some have issues
+    description = (
+        " ".join(rng.choices(DESCRIPTION_WORDS, k=rng.randrange(10, 80)))
+        if rng.random() > 0.1
+        else ""
+    )
+    price = f"${rng.randrange(5, 2000)}" if rng.random() > 0.15 else ""
+
+    return {
+        "id": id,
+        "title": f"{rng.choice(ADJECTIVES)} {rng.choice(ITEMS)}",
+        "description": description,
+        "price": price,
+        "type": type,
+        "status": rng.choices(
+            [ListingStatus.Open, ListingStatus.Pending, ListingStatus.Closed],
+            weights=[6, 1, 3],
+        )[0],
+        "is_hidden": rng.random() < 0.02,
+        "owner_id": rng.randrange(1, owners + 1),
+        "message_id": 10**15 + id,
+        "thread_id": 10**15 + id,
+    }
+
+
+def event_rows(
+    rng: random.Random, listing: dict[str, Any], count: int, created_at: datetime
+) -> list[dict[str, Any]]:
+    """A history of edits for a listing, ending in its current state."""
+    events = [
+        {
+            "listing_id": listing["id"],
+            "type": EventType.ListingCreated,
+            "from_value": None,
+            "to_value": listing["title"],
+            "time": created_at,
+        }
+    ]
+
+    for n in range(1, count):
+        type = rng.choice(
+            [EventType.TitleChanged, EventType.PriceChanged, EventType.StatusChanged]
+        )
+        from_value, to_value = {
+            EventType.TitleChanged: ("Untitled", listing["title"]),
+            EventType.PriceChanged: (f"${rng.randrange(5, 2000)}", listing["price"]),
+            EventType.StatusChanged: (
+                ListingStatus.Open.name,
+                listing["status"].name,
+            ),
+        }[type]
+        events.append(
+            {
+                "listing_id": listing["id"],
+                "type": type,
+                "from_value": from_value,
+                "to_value": to_value,
+                "time": created_at + timedelta(hours=n),
+            }
+        )
+
+    for event in events:
+        # Already history, so not posted again in the next digest
+        event["published_at"] = event["time"]
+
+    return events
+
+
+def create_schema() -> None:
+    """Create the schema of a fresh database from the models and stamp it as migrated.
+    Replaying every migration instead would run the old data migrations, one of which
+    logs in to Discord to backfill images. A database which has been migrated before is
+    upgraded as usual."""
+    engine = create_engine(config.sync_db_connection_uri)
+
+    with engine.begin() as connection:
+        fresh = not inspect(connection).has_table("alembic_version")
+        if fresh:
+            Base.metadata.create_all(connection)
+            for statement in listings_fts_ddl:
+                connection.execute(text(statement))
+
+    engine.dispose()
+
+    alembic.config.main(argv=["--raiseerr", "stamp" if fresh else "upgrade", "head"])
+
+
+def seed(
+    *,
+    listings: int,
+    images_per_listing: int,
+    events_per_listing: int,
+    distinct_images: int,
+    owners: int,
+    random_seed: int,
+) -> SeedSummary:
+    """Fill an empty database, e.g. one made by create_schema, with synthetic listings,
+    images and events. Images are real JPEGs in the blob store, but only
+    distinct_images of them are rendered and listings share them, as listings reposting
+    the same photo would."""
+    rng = random.Random(random_seed)
+    engine = create_engine(config.sync_db_connection_uri)
+
+    with engine.begin() as connection:
+        if connection.execute(select(func.count()).select_from(Listing)).scalar_one():
+            raise ValueError("The database already has listings in it.")
+
+        blobs: list[dict[str, Any]] = []
+        sizes: dict[str, tuple[int, int]] = {}
+        for _ in range(distinct_images if images_per_listing > 0 else 0):
+            size = rng.choice(IMAGE_SIZES)
+            blob = store_image(render_image(rng, size))
+            blobs.append(blob)
+            sizes[blob["hash"]] = size
+
+        listing_rows = [listing_row(rng, id, owners) for id in range(1, listings + 1)]
+        image_rows: list[dict[str, Any]] = []
+        events: list[dict[str, Any]] = []
+        started_at = datetime.now(tz=timezone.utc) - timedelta(days=365)
+
+        for listing in listing_rows:
+            # Buy listings rarely have photos, and some sell listings haven't any yet
+            count = (
+                rng.randrange(0, images_per_listing + 1)
+                if listing["type"] == ListingType.Buy or rng.random() < 0.1
+                else images_per_listing
+            )
+            for blob in rng.sample(blobs, min(count, len(blobs))):
+                width, height = sizes[blob["hash"]]
+                is_hidden = rng.random() < 0.05
+                if not is_hidden:
+                    blob["ref_count"] += 1
+                image_rows.append(
+                    {
+                        "listing_id": listing["id"],
+                        "path": blob["path"],
+                        "blob_hash": blob["hash"],
+                        "width": width,
+                        "height": height,
+                        "is_hidden": is_hidden,
+                    }
+                )
+
+            events.extend(
+                event_rows(
+                    rng,
+                    listing,
+                    max(events_per_listing, 1),
+                    started_at + timedelta(minutes=listing["id"]),
+                )
+            )
+
+        if blobs:
+            connection.execute(insert(Blob), blobs)
+        if listing_rows:
+            connection.execute(insert(Listing), listing_rows)
+        if image_rows:
+            connection.execute(insert(ListingImage), image_rows)
+        if events:
+            # Inserted in time order, as event ids are expected to follow it
+            events.sort(key=lambda event: event["time"])
+            connection.execute(insert(ListingEvent), events)
+
+        connection.execute(
+            update(Listing).values(issue_flags=Listing.get_issue_flags_expression())
+        )
+
+    engine.dispose()
+
+    return SeedSummary(
+        listings=len(listing_rows),
+        images=len(image_rows),
+        blobs=len(blobs),
+        events=len(events),
+    )
+
+
+__all__ = ["SeedSummary", "create_schema", "seed"]
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import logging
+import os
+from pathlib import Path
+
+from shopkeeper.config import config
+from shopkeeper.metrics import Snapshot, take_snapshot
+
+logger = logging.getLogger(__name__)
+
+
+class SharedMetrics:
+    """Shares metrics between the processes of a split deployment - the bot and each web
+    worker - so that /metrics, answered by whichever web worker gets the request, adds
+    up all of them rather than describing only itself.
+
+    Each process periodically writes a snapshot of its metrics into a directory they
+    all share, named after its process id. Snapshots are left behind by processes which
+    have exited, so that the totals don't go backwards, until the web command clears
+    them on startup."""
+
+    def __init__(self, path: Path, interval: float) -> None:
+        self.path = path
+        self.interval = interval
+
+        self._task: asyncio.Task[None] | None = None
+
+    @property
+    def snapshot_path(self) -> Path:
+        return self.path / f"{os.getpid()}.json"
+
+    def clear(self) -> None:
+        """Remove every snapshot, before any of the processes sharing them start."""
+        for snapshot_path in self.path.glob("*.json"):
+            snapshot_path.unlink(missing_ok=True)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        self._task = None
+        # So that nothing recorded since the last snapshot is lost
+        await asyncio.to_thread(self.write)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.to_thread(self.write)
+            except OSError:
+                logger.exception("Failed to share metrics")
+
+            await asyncio.sleep(self.interval)
+
+    def write(self) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        # Replaced in one go, so that other processes never read half a snapshot
+        temporary_path = self.snapshot_path.with_suffix(".tmp")
+        temporary_path.write_text(json.dumps(take_snapshot()))
+        temporary_path.replace(self.snapshot_path)
+
+    def read_others(self) -> list[Snapshot]:
+        """Read the snapshots of every other process."""
+        snapshots: list[Snapshot] = []
+
+        for snapshot_path in self.path.glob("*.json"):
+            if snapshot_path == self.snapshot_path:
+                continue
+
+            try:
+                snapshots.append(json.loads(snapshot_path.read_text()))
+            except (OSError, ValueError):
+                # e.g. removed since being listed, by the web command starting up
+                continue
+
+        return snapshots
+
+
+shared_metrics = SharedMetrics(config.metrics_path, config.metrics_share_interval)
+
+__all__ = ["SharedMetrics", "shared_metrics"]
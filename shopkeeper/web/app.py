@@ -1,10 +1,8 @@
-import asyncio
-from contextlib import asynccontextmanager
+from contextlib import AsyncExitStack, asynccontextmanager
 
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 from fastapi.routing import APIRoute
-from fastapi_utils.tasks import repeat_every
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.responses import Response
@@ -12,31 +10,47 @@ from starlette.staticfiles import StaticFiles
 from starlette.templating import Jinja2Templates
 from starlette.types import Scope
 
-from shopkeeper.bot import client, guild
+from shopkeeper.bot import client
+from shopkeeper.bot_runner import running_bot
 from shopkeeper.config import config
-from shopkeeper.web.routers import auth_router, listing_images_router, listings_router
-from shopkeeper.web.tasks import send_reminders
+from shopkeeper.imaging import image_processor
+from shopkeeper.loop_watchdog import loop_watchdog
+from shopkeeper.shared_metrics import shared_metrics
+from shopkeeper.web.instrumentation import MetricsMiddleware, ProfilingMiddleware
+from shopkeeper.web.listing_stream import listing_stream
+from shopkeeper.web.routers import (
+    auth_router,
+    listing_images_router,
+    listings_router,
+    metrics_router,
+)
 
 templates = Jinja2Templates(directory="shopkeeper/web/templates")
 
 
-@repeat_every(seconds=config.reminder_interval, wait_first=config.reminder_interval)
-async def run_background_tasks():
-    await send_reminders()
-
-
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await client.login(config.token)
-    if config.init_on_startup:
-        await client.tree.sync(guild=guild)
+    loop_watchdog.start()
+    if config.share_metrics:
+        shared_metrics.start()
 
-    asyncio.create_task(client.connect())
-    await run_background_tasks()
+    async with AsyncExitStack() as stack:
+        if config.embedded_bot:
+            await stack.enter_async_context(running_bot())
+        else:
+            # The bot runs in a process of its own, so only the REST API is used here,
+            # e.g. to post new listings to the marketplace channel
+            await client.login(config.token)
+            stack.push_async_callback(client.close)
 
-    yield
+        listing_stream.start()
+        yield
+        await listing_stream.stop()
 
-    await client.close()
+    image_processor.shutdown()
+    await shared_metrics.stop()
+    loop_watchdog.stop()
+    loop_watchdog.raise_for_blocks()
 
 
 class SPAStaticFiles(StaticFiles):
@@ -65,21 +79,29 @@ app = FastAPI(
 async def http_exception_handler(request: Request, exc: HTTPException) -> Response:
     accept = request.headers.get("accept", "")
     if "text/html" not in accept:
-        return JSONResponse({"detail": exc.detail}, status_code=exc.status_code)
+        return JSONResponse(
+            {"detail": exc.detail}, status_code=exc.status_code, headers=exc.headers
+        )
 
     return templates.TemplateResponse(
         request=request,
         name="error.html",
         context={"detail": exc.detail},
         status_code=exc.status_code,
+        headers=exc.headers,
     )
 
 
 app.add_middleware(SessionMiddleware, secret_key=config.session_secret)
+if config.profile_requests:
+    app.add_middleware(ProfilingMiddleware)
+# Added last so that it's outermost, timing everything else
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(listings_router, prefix="/api/listings")
 app.include_router(auth_router, prefix="/auth")
 app.include_router(listing_images_router, prefix="/images")
+app.include_router(metrics_router, prefix="/metrics")
 
 app.mount("/", SPAStaticFiles(directory="frontend/dist", html=True), "frontend")
 
@@ -0,0 +1,46 @@
+import base64
+import binascii
+import json
+from typing import get_args
+
+from fastapi import HTTPException
+
+from shopkeeper.web.schemas.listings import ListingSortKey
+
+# The sort a page was in, the sort key of its last listing, and that listing's id
+type ListingCursor = tuple[ListingSortKey, str | None, int]
+
+SORT_KEYS: tuple[ListingSortKey, ...] = get_args(ListingSortKey.__value__)
+
+
+def encode_cursor(values: ListingCursor) -> str:
+    """Encode keyset values into an opaque cursor."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> ListingCursor:
+    """Decode a cursor produced by encode_cursor, raising a 400 if it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(400, "Invalid cursor.")
+
+    if not isinstance(values, list) or len(values) != 3:  # type: ignore
+        raise HTTPException(400, "Invalid cursor.")
+
+    sort, value, id = values  # type: ignore
+    # Titles and prices are never null, and the other sorts have no value to continue
+    # from, so a mismatch would silently match nothing
+    expected_value = str if sort in ("title", "price") else type(None)
+    if (
+        sort not in SORT_KEYS
+        or not isinstance(value, expected_value)
+        or not isinstance(id, int)
+        or isinstance(id, bool)
+    ):
+        raise HTTPException(400, "Invalid cursor.")
+
+    return sort, value, id
+
+
+__all__ = ["ListingCursor", "decode_cursor", "encode_cursor"]
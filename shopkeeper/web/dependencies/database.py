@@ -2,12 +2,17 @@ from typing import AsyncGenerator
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from shopkeeper.db import async_session
+from shopkeeper.db import read_session, write_session
 
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
-    async with async_session() as session:
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    async with read_session() as session:
         yield session
 
 
-__all__ = ["get_db"]
+async def get_write_db() -> AsyncGenerator[AsyncSession, None]:
+    async with write_session() as session:
+        yield session
+
+
+__all__ = ["get_read_db", "get_write_db"]
@@ -0,0 +1,170 @@
+import asyncio
+import mimetypes
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shopkeeper.config import config
+from shopkeeper.metrics import Counter
+from shopkeeper.models.listing_image import ListingImage
+from shopkeeper.web.listing_cache import etag_matches
+
+image_lookup_requests = Counter(
+    "shopkeeper_image_lookup_requests_total",
+    "Image lookups, by whether they were answered from the lookup cache or the database.",
+    ("result",),
+)
+
+
+@dataclass(frozen=True)
+class ImageLookup:
+    # Relative to the image path
+    path: str
+    blob_hash: str | None
+    is_hidden: bool
+
+
+class ImageLookupCache:
+    """A least recently used cache of what's needed to serve an image, so that image
+    requests don't need a database query. An image's path never changes, so the only
+    invalidation needed is when it's hidden. Other web workers can't invalidate this
+    one's cache, so entries also expire after a while."""
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[int, tuple[ImageLookup, float]] = OrderedDict()
+
+    def get(self, image_id: int) -> ImageLookup | None:
+        entry = self._entries.get(image_id)
+        if entry is None:
+            return None
+
+        lookup, cached_at = entry
+        if time.monotonic() - cached_at > self.ttl:
+            del self._entries[image_id]
+            return None
+
+        self._entries.move_to_end(image_id)
+        return lookup
+
+    def set(self, image_id: int, lookup: ImageLookup) -> None:
+        self._entries[image_id] = (lookup, time.monotonic())
+        self._entries.move_to_end(image_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, image_id: int) -> None:
+        self._entries.pop(image_id, None)
+
+
+image_lookups = ImageLookupCache(
+    config.image_lookup_cache_size, config.image_lookup_cache_ttl
+)
+
+
+async def lookup_image(db: AsyncSession, image_id: int) -> ImageLookup | None:
+    lookup = image_lookups.get(image_id)
+    if lookup is not None:
+        image_lookup_requests.inc(result="hit")
+        return lookup
+
+    image_lookup_requests.inc(result="miss")
+    row = (
+        await db.execute(
+            select(
+                ListingImage.path, ListingImage.blob_hash, ListingImage.is_hidden
+            ).filter_by(id=image_id)
+        )
+    ).one_or_none()
+    if row is None:
+        return None
+
+    lookup = ImageLookup(
+        path=row.path, blob_hash=row.blob_hash, is_hidden=row.is_hidden
+    )
+    image_lookups.set(image_id, lookup)
+    return lookup
+
+
+async def is_not_modified(request: Request, path: Path, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is given
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None:
+        return False
+
+    try:
+        modified_since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+    modified_at = (await asyncio.to_thread(os.stat, path)).st_mtime
+    # HTTP dates have a resolution of one second
+    return int(modified_at) <= modified_since
+
+
+def sendfile_location(path: Path) -> str:
+    """Where the reverse proxy should read a file from: the absolute path for
+    X-Sendfile, or a URI under the internal location for X-Accel-Redirect."""
+    if config.image_sendfile_header == "X-Sendfile":
+        return str(path.resolve())
+
+    for name, root in (
+        ("images", config.image_path),
+        ("thumbnails", config.thumbnail_path),
+    ):
+        if path.is_relative_to(root):
+            return f"{config.image_accel_redirect_prefix}/{name}/{path.relative_to(root).as_posix()}"
+
+    raise ValueError(f"{path} is not in the image or thumbnail path")
+
+
+async def serve_file(
+    request: Request,
+    path: Path,
+    *,
+    etag: str,
+    headers: dict[str, str],
+    media_type: str | None = None,
+) -> Response:
+    """Serve a file which never changes once written, answering conditional requests
+    with a 304 and range requests with the requested bytes."""
+    headers = {**headers, "ETag": etag}
+
+    if await is_not_modified(request, path, etag):
+        return Response(status_code=304, headers=headers)
+
+    if config.behind_reverse_proxy and config.image_sendfile_header is not None:
+        # The proxy sends the file (including ranges) itself, keeping the bytes out of
+        # the application entirely
+        return Response(
+            media_type=media_type or mimetypes.guess_type(path.name)[0],
+            headers={
+                **headers,
+                config.image_sendfile_header: sendfile_location(path),
+            },
+        )
+
+    # Handles Range and If-Range, comparing against the strong ETag given here
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+__all__ = [
+    "ImageLookup",
+    "ImageLookupCache",
+    "image_lookups",
+    "lookup_image",
+    "serve_file",
+]
@@ -0,0 +1,133 @@
+import logging
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from shopkeeper.config import config
+from shopkeeper.metrics import Histogram
+from shopkeeper.profiling import QueryProfile, current_query_profile
+
+logger = logging.getLogger(__name__)
+
+http_request_seconds = Histogram(
+    "shopkeeper_http_request_seconds",
+    "Time taken to handle HTTP requests, by method, route and response status.",
+    ("method", "route", "status"),
+)
+
+
+class MetricsMiddleware:
+    """Times every HTTP request, labelled by the route's path template rather than the
+    requested path so that e.g. every image shares one label."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started_at = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Set by the router once a route matches - anything else is the frontend
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - started_at,
+                method=scope["method"],
+                route=getattr(route, "path", "frontend"),
+                status=str(status),
+            )
+
+
+def _timing_description(value: str) -> str:
+    value = value if len(value) <= 100 else f"{value[:97]}..."
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    # Header values have to be Latin-1
+    return escaped.encode("latin-1", "replace").decode("latin-1")
+
+
+def server_timing(profile: QueryProfile) -> str:
+    """Describe a request's database work as Server-Timing metrics, which browsers show
+    alongside the request in their developer tools."""
+    metrics = [
+        f'db;dur={profile.total_seconds * 1000:.1f};desc="{profile.statement_count} statements"'
+    ]
+    for index, (statement, stats) in enumerate(
+        profile.slowest(config.profile_top_statements), start=1
+    ):
+        description = _timing_description(f"{stats.count}x {statement}")
+        metrics.append(
+            f'db-{index};dur={stats.total_seconds * 1000:.1f};desc="{description}"'
+        )
+    return ", ".join(metrics)
+
+
+def report_slow_request(scope: Scope, profile: QueryProfile) -> None:
+    repeated = profile.repeated(config.profile_repeated_statement_threshold)
+    if (
+        profile.statement_count < config.profile_statement_threshold
+        and profile.total_seconds < config.profile_db_time_threshold
+        and not repeated
+    ):
+        return
+
+    lines = [
+        f"{scope['method']} {scope['path']} ran {profile.statement_count} statements "
+        f"taking {profile.total_seconds * 1000:.1f}ms in total"
+    ]
+    for statement, stats in profile.slowest(config.profile_top_statements):
+        lines.append(
+            f"  {stats.total_seconds * 1000:.1f}ms over {stats.count}x: {statement}"
+        )
+    for statement, stats in repeated:
+        lines.append(f"  Possible N+1, run {stats.count}x: {statement}")
+
+    logger.warning("\n".join(lines))
+
+
+class ProfilingMiddleware:
+    """Records the database statements run while handling each request, adding a
+    summary of them to the response's Server-Timing header and warning about requests
+    which run too many statements, spend too long in the database, or look like they
+    have an N+1 query."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile()
+        token = current_query_profile.set(profile)
+
+        async def send_with_timing(message: Message) -> None:
+            # Streamed responses start before they're finished, so only include the
+            # statements run up to that point
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append(
+                    "Server-Timing", server_timing(profile)
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_query_profile.reset(token)
+            report_slow_request(scope, profile)
+
+
+__all__ = ["MetricsMiddleware", "ProfilingMiddleware"]
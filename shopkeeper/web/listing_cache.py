@@ -0,0 +1,103 @@
+import hashlib
+import json
+from collections import OrderedDict
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from shopkeeper.config import config
+from shopkeeper.metrics import Counter
+from shopkeeper.models.listing_event import ListingEvent
+from shopkeeper.models.listing_image_variant import ListingImageVariant
+from shopkeeper.web.schemas.listings import SearchListingsSchema
+
+listing_cache_requests = Counter(
+    "shopkeeper_listing_cache_requests_total",
+    "Listing searches, by whether they were answered with a 304, from the response "
+    "cache, or by querying the database.",
+    ("result",),
+)
+
+
+async def listing_set_version(session: AsyncSession) -> str:
+    """A version which changes whenever any listing as returned by the API might have.
+
+    Every change to a listing, its images or their visibility is recorded as a listing
+    event, and variants are the only thing which is added to a listing without one, so
+    the highest ids of the two are enough. Both are lookups of the end of a primary key.
+    """
+    events, variants = (
+        await session.execute(
+            select(
+                select(func.max(ListingEvent.id)).scalar_subquery(),
+                select(func.max(ListingImageVariant.id)).scalar_subquery(),
+            )
+        )
+    ).one()
+    return f"{events or 0}.{variants or 0}"
+
+
+def normalize_filters(filters: SearchListingsSchema) -> str:
+    """Serialise filters so that equivalent ones (e.g. listing the same statuses in a
+    different order) are equal."""
+    values = filters.model_dump(mode="json")
+    for key in ("statuses", "owners", "types"):
+        if values[key] is not None:
+            values[key] = sorted(set(values[key]))
+    if values["query"] is not None:
+        values["query"] = " ".join(values["query"].split())
+    return json.dumps(values, sort_keys=True)
+
+
+def search_etag(normalized_filters: str, version: str) -> str:
+    digest = hashlib.blake2b(normalized_filters.encode(), digest_size=8).hexdigest()
+    # Weak, as the same results may not be serialised byte for byte identically
+    return f'W/"{version}-{digest}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    # Weak comparison - the W/ prefix is ignored on both sides
+    opaque_tag = etag.removeprefix("W/")
+    return any(
+        tag.strip().removeprefix("W/") == opaque_tag for tag in if_none_match.split(",")
+    )
+
+
+class ResponseCache:
+    """A least recently used cache of serialised responses. Keys include the listing set
+    version, so entries never go stale - they just stop being requested and are evicted."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[str, str], bytes] = OrderedDict()
+
+    def get(self, key: tuple[str, str]) -> bytes | None:
+        body = self._entries.get(key)
+        if body is not None:
+            self._entries.move_to_end(key)
+        return body
+
+    def set(self, key: tuple[str, str], body: bytes) -> None:
+        self._entries[key] = body
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+search_cache = ResponseCache(config.listing_cache_size)
+
+
+__all__ = [
+    "ResponseCache",
+    "etag_matches",
+    "listing_cache_requests",
+    "listing_set_version",
+    "normalize_filters",
+    "search_cache",
+    "search_etag",
+]
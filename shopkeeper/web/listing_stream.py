@@ -0,0 +1,351 @@
+import asyncio
+import traceback
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Sequence
+
+from sqlalchemy import Select, event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
+
+from shopkeeper.config import config
+from shopkeeper.db import read_session
+from shopkeeper.metrics import Counter
+from shopkeeper.models.listing import Listing
+from shopkeeper.models.listing_event import ListingEvent
+from shopkeeper.models.listing_image import ListingImage
+from shopkeeper.models.listing_search import listing_matches
+from shopkeeper.web.schemas.listings import (
+    FullListingSchema,
+    ListingFiltersSchema,
+    ListingStreamEventSchema,
+)
+
+listing_stream_clients_dropped = Counter(
+    "shopkeeper_listing_stream_clients_dropped_total",
+    "Listing stream clients disconnected for falling too far behind.",
+)
+
+# How many missed events a reconnecting client is sent before it's told to reload instead
+MAX_BACKLOG = 500
+
+
+def listing_events_query(
+    after_id: int, *, up_to_id: int | None = None, limit: int
+) -> Select[tuple[ListingEvent]]:
+    query = (
+        select(ListingEvent)
+        .options(
+            selectinload(ListingEvent.listing)
+            .selectinload(Listing.images)
+            .selectinload(ListingImage.variants)
+        )
+        .filter(ListingEvent.id > after_id)
+        .order_by(ListingEvent.id)
+        .limit(limit)
+    )
+    if up_to_id is not None:
+        query = query.filter(ListingEvent.id <= up_to_id)
+    return query
+
+
+async def text_matches(
+    session: AsyncSession, queries: set[str], events: Sequence[ListingEvent]
+) -> dict[str, set[int]]:
+    """Find which of the events' listings match each free text query."""
+    listing_ids = {event.listing_id for event in events}
+    results: dict[str, set[int]] = {}
+
+    for query in queries:
+        matches = listing_matches(query)
+        results[query] = (
+            set(
+                (
+                    await session.execute(
+                        select(matches.c.rowid).filter(matches.c.rowid.in_(listing_ids))
+                    )
+                )
+                .scalars()
+                .all()
+            )
+            if matches is not None
+            else listing_ids
+        )
+
+    return results
+
+
+def message(id: int, data: str, *, event_name: str = "listing") -> str:
+    return f"id: {id}\nevent: {event_name}\ndata: {data}\n\n"
+
+
+@dataclass
+class RenderedEvent:
+    event: ListingEvent
+    # Sent to subscribers whose filters the listing matches
+    matched: str | None
+    # Sent to the others, which only need to know to stop showing the listing. Nothing
+    # else about it is included, so that hiding a listing doesn't broadcast its contents.
+    unmatched: str
+
+
+def render_events(events: Sequence[ListingEvent]) -> list[RenderedEvent]:
+    """Render the messages for a batch of events once, for every subscriber to choose
+    from."""
+    rendered: list[RenderedEvent] = []
+
+    for listing_event in events:
+        listing = listing_event.listing
+        matched = (
+            message(
+                listing_event.id,
+                ListingStreamEventSchema(
+                    id=listing.id,
+                    type=listing_event.type,
+                    matches=True,
+                    listing=FullListingSchema.model_validate(
+                        listing, from_attributes=True
+                    ),
+                ).model_dump_json(),
+            )
+            # Hidden listings match no filters
+            if not listing.is_hidden
+            else None
+        )
+        unmatched = message(
+            listing_event.id,
+            ListingStreamEventSchema(
+                id=listing.id, type=listing_event.type, matches=False
+            ).model_dump_json(exclude_none=True),
+        )
+        rendered.append(RenderedEvent(listing_event, matched, unmatched))
+
+    return rendered
+
+
+@dataclass(eq=False)
+class Subscription:
+    filters: ListingFiltersSchema
+    queue: asyncio.Queue[str | None] = field(
+        default_factory=lambda: asyncio.Queue(maxsize=config.listing_stream_buffer_size)
+    )
+
+    def select(
+        self, events: Sequence[RenderedEvent], text_matches: dict[str, set[int]]
+    ) -> list[str]:
+        """Pick the messages the subscriber needs to hear about."""
+        filters = self.filters
+        messages: list[str] = []
+
+        for rendered in events:
+            listing = rendered.event.listing
+
+            # Owner and type never change, so listings which don't match them can't be
+            # shown by the client. Anything else might have been shown before the event,
+            # so the client is told whether the listing still matches.
+            if (
+                filters.owners is not None
+                and str(listing.owner_id) not in filters.owners
+            ) or (filters.types is not None and listing.type not in filters.types):
+                continue
+
+            matches = (
+                not listing.is_hidden
+                and (filters.statuses is None or listing.status in filters.statuses)
+                and (
+                    filters.has_issues is None
+                    or filters.has_issues == (listing.issue_flags != 0)
+                )
+                and (filters.query is None or listing.id in text_matches[filters.query])
+            )
+
+            messages.append(
+                rendered.matched
+                if matches and rendered.matched is not None
+                else rendered.unmatched
+            )
+
+        return messages
+
+    def offer(self, messages: list[str]) -> None:
+        for item in messages:
+            try:
+                self.queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # Dropped rather than buffering without limit - the client reconnects and
+                # resumes from the last event it received
+                listing_stream_clients_dropped.inc()
+                self.close()
+                return
+
+    def close(self) -> None:
+        """End the client's stream, discarding anything it hasn't been sent yet."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class ListingStream:
+    """Fans out listing events to connected clients. Events are read back from the
+    database after being committed, so the stream also picks up events written by
+    other processes, and clients can resume from any event id."""
+
+    def __init__(self, *, batch_size: int = 200) -> None:
+        self.batch_size = batch_size
+        self.last_event_id = 0
+
+        self._subscriptions: set[Subscription] = set()
+        self._ready = asyncio.Event()
+        self._wake = asyncio.Event()
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        for subscription in self._subscriptions:
+            subscription.close()
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    async def run(self) -> None:
+        async with read_session() as session:
+            self.last_event_id = (
+                await session.execute(select(func.max(ListingEvent.id)))
+            ).scalar_one_or_none() or 0
+        self._ready.set()
+
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._wake.wait(), timeout=config.listing_stream_poll_interval
+                )
+            except TimeoutError:
+                pass
+            self._wake.clear()
+
+            try:
+                while await self.publish_batch():
+                    pass
+            except Exception:
+                traceback.print_exc()
+
+    async def publish_batch(self) -> bool:
+        """Publish the next batch of events, returning whether there may be more."""
+        async with read_session() as session:
+            events = (
+                (
+                    await session.execute(
+                        listing_events_query(self.last_event_id, limit=self.batch_size)
+                    )
+                )
+                .scalars()
+                .all()
+            )
+            if not events:
+                return False
+
+            # The single write connection commits events in id order, so nothing can
+            # appear behind the last event that was published
+            self.last_event_id = events[-1].id
+
+            subscriptions = list(self._subscriptions)
+            matches = await text_matches(
+                session,
+                {
+                    subscription.filters.query
+                    for subscription in subscriptions
+                    if subscription.filters.query is not None
+                },
+                events,
+            )
+
+        if not subscriptions:
+            return len(events) == self.batch_size
+
+        rendered = render_events(events)
+        for subscription in subscriptions:
+            subscription.offer(subscription.select(rendered, matches))
+
+        return len(events) == self.batch_size
+
+    async def stream(
+        self, filters: ListingFiltersSchema, last_event_id: int | None
+    ) -> AsyncIterator[str]:
+        """Stream listing events matching the filters as Server-Sent Events, starting
+        after the given event id if there is one."""
+        await self._ready.wait()
+
+        subscription = Subscription(filters)
+        # Subscribed before the backlog is loaded, so that no events fall between the two
+        up_to_id = self.last_event_id
+        self._subscriptions.add(subscription)
+
+        try:
+            if last_event_id is not None and last_event_id < up_to_id:
+                async with read_session() as session:
+                    backlog = (
+                        (
+                            await session.execute(
+                                listing_events_query(
+                                    last_event_id,
+                                    up_to_id=up_to_id,
+                                    limit=MAX_BACKLOG + 1,
+                                )
+                            )
+                        )
+                        .scalars()
+                        .all()
+                    )
+                    matches = await text_matches(
+                        session,
+                        {filters.query} if filters.query is not None else set(),
+                        backlog,
+                    )
+
+                if len(backlog) > MAX_BACKLOG:
+                    # Too much was missed - the client should reload instead
+                    yield message(up_to_id, "{}", event_name="reset")
+                else:
+                    for item in subscription.select(render_events(backlog), matches):
+                        yield item
+
+            while True:
+                try:
+                    item = await asyncio.wait_for(
+                        subscription.queue.get(),
+                        timeout=config.listing_stream_heartbeat_interval,
+                    )
+                except TimeoutError:
+                    # Keeps proxies from closing the connection as idle
+                    yield ": heartbeat\n\n"
+                    continue
+
+                if item is None:
+                    return
+                yield item
+        finally:
+            self._subscriptions.discard(subscription)
+
+
+listing_stream = ListingStream()
+
+
+@event.listens_for(Session, "after_flush")
+def track_listing_events(session: Session, _: object) -> None:
+    if any(isinstance(instance, ListingEvent) for instance in session.new):
+        session.info["listing_events_added"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def wake_listing_stream(session: Session) -> None:
+    # Publish new events straight away rather than at the next poll
+    if session.info.pop("listing_events_added", False):
+        listing_stream.wake()
+
+
+__all__ = ["ListingStream", "listing_stream"]
@@ -1,5 +1,6 @@
 from .auth import auth_router
 from .listing_images import listing_images_router
 from .listings import listings_router
+from .metrics import metrics_router
 
-__all__ = ["auth_router", "listings_router", "listing_images_router"]
+__all__ = ["auth_router", "listings_router", "listing_images_router", "metrics_router"]
@@ -1,17 +1,26 @@
-from io import BytesIO
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse, StreamingResponse
-from PIL import Image
-from PIL.Image import Resampling
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from shopkeeper.config import config
+from shopkeeper.imaging import (
+    THUMBNAIL_SIZE,
+    VARIANT_SIZES,
+    ImageProcessorBusy,
+    ensure_variant,
+    negotiate_format,
+    supported_formats,
+)
+from shopkeeper.models.blob import Blob
+from shopkeeper.models.listing import Listing
+from shopkeeper.models.listing_event import EventType, ListingEvent
 from shopkeeper.models.listing_image import ListingImage
 from shopkeeper.web.dependencies.auth import require_discord_user
-from shopkeeper.web.dependencies.database import get_db
+from shopkeeper.web.dependencies.database import get_read_db, get_write_db
+from shopkeeper.web.image_files import image_lookups, lookup_image, serve_file
 from shopkeeper.web.schemas.discord_user import DiscordUser
 
 listing_images_router = APIRouter(
@@ -20,50 +29,77 @@ listing_images_router = APIRouter(
 
 
 @listing_images_router.get("/{image_id}", include_in_schema=False)
-async def get_image(image_id: int, db: AsyncSession = Depends(get_db)) -> Any:
+async def get_image(
+    request: Request, image_id: int, db: AsyncSession = Depends(get_read_db)
+) -> Any:
     """Retrieve a listing image."""
+    image = await lookup_image(db, image_id)
 
-    image = (
-        await db.execute(select(ListingImage).filter_by(id=image_id, is_hidden=False))
-    ).scalar_one_or_none()
-
-    if not image:
+    if not image or image.is_hidden or image.blob_hash is None:
         raise HTTPException(404, "Image not found.")
 
-    return FileResponse(
+    return await serve_file(
+        request,
         config.image_path / image.path,
+        # Blobs are named by their contents, so their hash is a strong validator
+        etag=f'"{image.blob_hash}"',
         headers={"Cache-Control": "private, max-age=31536000"},
     )
 
 
-@listing_images_router.get("/{image_id}/thumbnail", include_in_schema=False)
-async def get_image_thumbnail(image_id: int, db: AsyncSession = Depends(get_db)) -> Any:
-    """Retrieve a listing image thumbnail."""
+async def serve_variant(
+    request: Request, image_id: int, size: int, db: AsyncSession
+) -> Response:
+    if size not in VARIANT_SIZES:
+        raise HTTPException(404, "Image size not found.")
 
-    image = (
-        await db.execute(select(ListingImage).filter_by(id=image_id, is_hidden=False))
-    ).scalar_one_or_none()
+    image = await lookup_image(db, image_id)
 
-    if not image:
+    if not image or image.is_hidden or image.blob_hash is None:
         raise HTTPException(404, "Image not found.")
 
-    with Image.open(config.image_path / image.path) as img:
-        img.thumbnail((350, 350), Resampling.LANCZOS)
-        img_bytes = BytesIO()
-        img.save(img_bytes, format="PNG")
-        img_bytes.seek(0)
-
-    return StreamingResponse(
-        img_bytes,
-        media_type="image/png",
-        headers={"Cache-Control": "private, max-age=31536000"},
+    format = negotiate_format(request.headers.get("accept", ""), supported_formats())
+
+    try:
+        variant = await ensure_variant(
+            image_id, config.image_path / image.path, size, format
+        )
+    except ImageProcessorBusy:
+        raise HTTPException(
+            503, "Image processing is busy, try again shortly.", {"Retry-After": "1"}
+        )
+
+    return await serve_file(
+        request,
+        variant,
+        # A variant is rendered once from the blob and never rewritten, so the blob's
+        # hash along with how it was rendered identifies its contents
+        etag=f'"{image.blob_hash}-{size}.{format.value}"',
+        media_type=format.media_type,
+        headers={"Cache-Control": "private, max-age=31536000", "Vary": "Accept"},
     )
 
 
+@listing_images_router.get("/{image_id}/thumbnail", include_in_schema=False)
+async def get_image_thumbnail(
+    request: Request, image_id: int, db: AsyncSession = Depends(get_read_db)
+) -> Any:
+    """Retrieve a listing image thumbnail."""
+    return await serve_variant(request, image_id, THUMBNAIL_SIZE, db)
+
+
+@listing_images_router.get("/{image_id}/variants/{size}", include_in_schema=False)
+async def get_image_variant(
+    request: Request, image_id: int, size: int, db: AsyncSession = Depends(get_read_db)
+) -> Any:
+    """Retrieve a resized variant of a listing image, in the best format the client accepts."""
+    return await serve_variant(request, image_id, size, db)
+
+
 @listing_images_router.post("/{image_id}/hide", status_code=202)
 async def hide_image(
     image_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     user: DiscordUser = Depends(require_discord_user),
 ) -> Any:
     """Hide a listing image. This route requires you to be the owner of the bot."""
@@ -78,7 +114,19 @@ async def hide_image(
         raise HTTPException(404, "Image not found.")
 
     image.is_hidden = True
+    if image.blob_hash is not None:
+        # The file itself is removed by gc-images once no visible image uses it
+        await Blob.release(db, image.blob_hash)
+    db.add(
+        ListingEvent(
+            listing_id=image.listing_id,
+            type=EventType.ImageHidden,
+            from_value=str(image.id),
+        )
+    )
+    await Listing.update_issue_flags(db, [image.listing_id])
     await db.commit()
+    image_lookups.invalidate(image.id)
 
     return None
 
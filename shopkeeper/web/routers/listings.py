@@ -1,20 +1,47 @@
-from typing import Any
+from typing import Annotated, Any
 
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import and_, func, not_, select
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import (
+    ColumnElement,
+    Select,
+    Subquery,
+    and_,
+    func,
+    literal,
+    not_,
+    select,
+    tuple_,
+    union_all,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import InstrumentedAttribute, selectinload
 
 from shopkeeper.config import config
 from shopkeeper.models.listing import Listing, ListingStatus
+from shopkeeper.models.listing_event import EventType, ListingEvent
+from shopkeeper.models.listing_image import ListingImage
+from shopkeeper.models.listing_search import listing_matches
+from shopkeeper.web.cursors import ListingCursor, decode_cursor, encode_cursor
 from shopkeeper.web.dependencies.auth import require_discord_user
-from shopkeeper.web.dependencies.database import get_db
+from shopkeeper.web.dependencies.database import get_read_db, get_write_db
+from shopkeeper.web.listing_cache import (
+    etag_matches,
+    listing_cache_requests,
+    listing_set_version,
+    normalize_filters,
+    search_cache,
+    search_etag,
+)
+from shopkeeper.web.listing_stream import listing_stream
 from shopkeeper.web.schemas.discord_user import DiscordUser
 from shopkeeper.web.schemas.listings import (
     CreateListingSchema,
     EditListingSchema,
-    FullListingSchema,
+    ListingFiltersSchema,
     ListingSchema,
+    ListingSearchResultsSchema,
+    ListingSortKey,
     SearchListingsSchema,
 )
 
@@ -23,39 +50,238 @@ listings_router = APIRouter(
 )
 
 
-@listings_router.post("/search", response_model=list[FullListingSchema])
-async def get_listings(
-    filters: SearchListingsSchema,
-    db: AsyncSession = Depends(get_db),
-) -> Any:
-    """Retrieve a list of listings."""
-    listings_query = (
-        select(Listing).options(joinedload(Listing.images)).filter_by(is_hidden=False)
+def sort_order(
+    filters: SearchListingsSchema, matches: Subquery | None
+) -> list[ColumnElement[Any] | InstrumentedAttribute[Any]]:
+    """Prices are sorted as the free text they are entered as, not by amount, so that
+    the sort can be read in order from ix_listings_status_price."""
+    if filters.sort == "created":
+        return [Listing.id.desc()]
+    if filters.sort == "relevance" and matches is not None:
+        return [matches.c.rank, Listing.id]
+    return [Listing.title if filters.sort == "title" else Listing.price, Listing.id]
+
+
+def after_cursor(
+    filters: SearchListingsSchema, matches: Subquery | None, cursor: ListingCursor
+) -> ColumnElement[bool]:
+    """Keyset pagination - each page continues from the sort key of the last row of
+    the previous one, with the listing id as a tiebreaker, rather than using an offset.
+    Like the sort, price cursors compare the price as text."""
+    if filters.sort == "created":
+        return Listing.id < cursor[2]
+    if filters.sort == "relevance" and matches is not None:
+        # Rank the cursor's listing again rather than trusting a score from the client,
+        # as ranks shift slightly as listings are added
+        cursor_rank = (
+            select(matches.c.rank)
+            .filter(matches.c.rowid == cursor[2])
+            .scalar_subquery()
+        )
+        return tuple_(matches.c.rank, Listing.id) > tuple_(
+            cursor_rank, literal(cursor[2])
+        )
+
+    sort_column = Listing.title if filters.sort == "title" else Listing.price
+    return tuple_(sort_column, Listing.id) > tuple_(
+        literal(cursor[1]), literal(cursor[2])
     )
 
-    if filters.statuses is not None:
-        listings_query = listings_query.filter(Listing.status.in_(filters.statuses))
+
+def filter_listings[T: tuple[Any, ...]](
+    query: Select[T],
+    filters: SearchListingsSchema,
+    statuses: list[ListingStatus] | None,
+    matches: Subquery | None,
+    cursor: ListingCursor | None,
+) -> Select[T]:
+    """Apply the filters, sort and page size to a query over listings."""
+    query = query.filter_by(is_hidden=False)
+
+    if statuses is not None:
+        query = query.filter(Listing.status.in_(statuses))
 
     if filters.owners is not None:
-        listings_query = listings_query.filter(
+        query = query.filter(
             Listing.owner_id.in_([int(owner) for owner in filters.owners])
         )
 
     if filters.types is not None:
-        listings_query = listings_query.filter(Listing.type.in_(filters.types))
+        query = query.filter(Listing.type.in_(filters.types))
 
     if filters.has_issues is not None:
-        listings_query = listings_query.filter(
-            Listing.get_issues_clause() == filters.has_issues
+        issues_clause = Listing.get_issues_clause()
+        query = query.filter(
+            issues_clause if filters.has_issues else not_(issues_clause)
         )
 
-    return (await db.execute(listings_query)).unique().scalars().all()
+    if matches is not None:
+        query = query.join(matches, matches.c.rowid == Listing.id)
+
+    if cursor is not None:
+        query = query.filter(after_cursor(filters, matches, cursor))
+
+    # Fetch an extra row to find out whether there is another page
+    return query.order_by(*sort_order(filters, matches)).limit(filters.limit + 1)
+
+
+def build_listings_query(filters: SearchListingsSchema) -> Select[tuple[Listing]]:
+    matches = listing_matches(filters.query) if filters.query is not None else None
+    if filters.sort == "relevance" and matches is None:
+        raise HTTPException(400, "Sorting by relevance requires a search query.")
+
+    cursor = decode_cursor(filters.cursor) if filters.cursor is not None else None
+    if cursor is not None and cursor[0] != filters.sort:
+        raise HTTPException(400, "Cursor does not match the requested sort.")
+
+    listings_query = select(Listing).options(
+        selectinload(Listing.images).selectinload(ListingImage.variants)
+    )
+
+    statuses = filters.statuses
+    if statuses is None and filters.sort in ("title", "price"):
+        # Listings are only indexed by title and price within each status
+        statuses = list(ListingStatus)
+
+    if statuses is None or len(statuses) < 2 or filters.sort == "relevance":
+        return filter_listings(
+            listings_query, filters, filters.statuses, matches, cursor
+        )
+
+    # An index can only be read in order within a single status, so a page across
+    # several would otherwise sort every listing with any of them. Instead each status
+    # is paged through its own index, and only the pages are sorted together.
+    pages = [
+        filter_listings(
+            select(Listing.id), filters, [status], matches, cursor
+        ).subquery()
+        for status in statuses
+    ]
+    page_ids = union_all(*(select(page.c.id) for page in pages)).subquery()
+
+    return (
+        listings_query.join(page_ids, page_ids.c.id == Listing.id)
+        .order_by(*sort_order(filters, None))
+        .limit(filters.limit + 1)
+    )
+
+
+def listing_cursor(sort: ListingSortKey, listing: Listing) -> str:
+    sort_values: dict[ListingSortKey, str | None] = {
+        "created": None,
+        "relevance": None,
+        "price": listing.price,
+        "title": listing.title,
+    }
+    return encode_cursor((sort, sort_values[sort], listing.id))
+
+
+async def check_relevance_cursor(
+    db: AsyncSession, filters: SearchListingsSchema
+) -> None:
+    """Raise a 400 if the listing a relevance cursor continues from no longer matches
+    the query, as there is no rank left to continue from."""
+    if filters.sort != "relevance" or filters.cursor is None or filters.query is None:
+        return
+
+    matches = listing_matches(filters.query)
+    if matches is None:
+        return
+
+    listing_id = decode_cursor(filters.cursor)[2]
+    still_matches = await db.scalar(
+        select(matches.c.rowid).filter(matches.c.rowid == listing_id)
+    )
+    if still_matches is None:
+        raise HTTPException(
+            400, "The listing this cursor continues from no longer matches the query."
+        )
+
+
+def build_issue_count_query(owner_id: int) -> Select[tuple[int]]:
+    return (
+        select(func.count("*"))
+        .select_from(Listing)
+        .filter(
+            and_(
+                Listing.status != ListingStatus.Closed,
+                not_(Listing.is_hidden),
+                Listing.owner_id == owner_id,
+                Listing.get_issues_clause(),
+            )
+        )
+    )
+
+
+@listings_router.post("/search", response_model=ListingSearchResultsSchema)
+async def get_listings(
+    filters: SearchListingsSchema,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+) -> Any:
+    """Retrieve a page of listings. Responses carry an ETag, and a 304 is returned
+    instead when it is given in If-None-Match and nothing has changed since."""
+    # Read before the listings, so a response is never cached under a newer version
+    # than the listings in it
+    version = await listing_set_version(db)
+    normalized_filters = normalize_filters(filters)
+    etag = search_etag(normalized_filters, version)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag_matches(request.headers.get("If-None-Match"), etag):
+        listing_cache_requests.inc(result="not_modified")
+        return Response(status_code=304, headers=headers)
+
+    body = search_cache.get((normalized_filters, version))
+    if body is not None:
+        listing_cache_requests.inc(result="cached")
+    else:
+        listing_cache_requests.inc(result="queried")
+        listings_query = build_listings_query(filters)
+        await check_relevance_cursor(db, filters)
+        listings = list((await db.execute(listings_query)).scalars().all())
+
+        next_cursor = None
+        if len(listings) > filters.limit:
+            listings = listings[: filters.limit]
+            next_cursor = listing_cursor(filters.sort, listings[-1])
+
+        body = (
+            # From attributes, so that the images and issues nested in the listings
+            # can be read from the ORM objects too
+            ListingSearchResultsSchema.model_validate(
+                {"listings": listings, "next_cursor": next_cursor},
+                from_attributes=True,
+            )
+            .model_dump_json()
+            .encode()
+        )
+        search_cache.set((normalized_filters, version), body)
+
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@listings_router.get(
+    "/events", response_class=StreamingResponse, include_in_schema=False
+)
+async def stream_listing_events(
+    filters: Annotated[ListingFiltersSchema, Query()],
+    last_event_id: Annotated[int | None, Header()] = None,
+) -> StreamingResponse:
+    """Stream changes to listings matching the filters as Server-Sent Events, resuming
+    after the Last-Event-ID if one is given."""
+    return StreamingResponse(
+        listing_stream.stream(filters, last_event_id),
+        media_type="text/event-stream",
+        # Stop reverse proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @listings_router.post("/", response_model=ListingSchema)
 async def create_listing(
     listing: CreateListingSchema,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     user: DiscordUser = Depends(require_discord_user),
 ) -> Listing:
     """Create a new listing."""
@@ -75,7 +301,7 @@ async def create_listing(
 async def edit_listing(
     listing_id: int,
     listing: EditListingSchema,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     user: DiscordUser = Depends(require_discord_user),
 ) -> Listing:
     """Edit an existing listing."""
@@ -93,7 +319,7 @@ async def edit_listing(
 @listings_router.post("/{listing_id}/hide", status_code=202)
 async def hide_listing(
     listing_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_write_db),
     user: DiscordUser = Depends(require_discord_user),
 ) -> None:
     """Hide a listing. This route requires you to be the owner of the bot."""
@@ -108,6 +334,7 @@ async def hide_listing(
         raise HTTPException(404, "Listing not found.")
 
     listing.is_hidden = True
+    db.add(ListingEvent(listing_id=listing.id, type=EventType.ListingHidden))
     await db.commit()
 
     return None
@@ -115,24 +342,11 @@ async def hide_listing(
 
 @listings_router.get("/issue-count")
 async def get_user_issue_count(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user: DiscordUser = Depends(require_discord_user),
 ) -> int:
     """Retrieve a count of the number of listings owned by the user with issues needing resolution."""
-    return (
-        await db.execute(
-            select(func.count("*"))
-            .select_from(Listing)
-            .filter(
-                and_(
-                    Listing.status != ListingStatus.Closed,
-                    not_(Listing.is_hidden),
-                    Listing.owner_id == int(user.id),
-                    Listing.get_issues_clause(),
-                )
-            )
-        )
-    ).scalar_one()
+    return (await db.execute(build_issue_count_query(int(user.id)))).scalar_one()
 
 
 __all__ = ["listings_router"]
@@ -0,0 +1,58 @@
+import asyncio
+from ipaddress import ip_address
+from typing import Any
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from shopkeeper.config import config
+from shopkeeper.metrics import render_metrics
+from shopkeeper.shared_metrics import shared_metrics
+from shopkeeper.web.dependencies.auth import get_discord_user
+
+
+def is_loopback(host: str) -> bool:
+    try:
+        return ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def require_metrics_access(request: Request) -> None:
+    """Allow the bot's owner, or anything on the same machine (e.g. a Prometheus agent).
+    Behind a reverse proxy the client's address comes from forwarded headers, which
+    can't be trusted for this, so only the owner is allowed."""
+    user = get_discord_user(request)
+    if user is not None and user.is_owner:
+        return
+
+    if (
+        not config.behind_reverse_proxy
+        and request.client is not None
+        and is_loopback(request.client.host)
+    ):
+        return
+
+    raise HTTPException(403, "You do not have permission to view metrics.")
+
+
+metrics_router = APIRouter(
+    tags=["Metrics"], dependencies=[Depends(require_metrics_access)]
+)
+
+
+@metrics_router.get("", include_in_schema=False)
+async def get_metrics() -> Any:
+    """Export metrics in the Prometheus text format. When the bot and web workers run
+    as separate processes, these are the totals across all of them."""
+    others = (
+        await asyncio.to_thread(shared_metrics.read_others)
+        if config.share_metrics
+        else []
+    )
+    return PlainTextResponse(
+        render_metrics(others), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+__all__ = ["metrics_router"]
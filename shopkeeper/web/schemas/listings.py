@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel, ConfigDict, Field
 
 from shopkeeper.models.listing import (
@@ -6,6 +8,13 @@ from shopkeeper.models.listing import (
     ListingStatus,
     ListingType,
 )
+from shopkeeper.models.listing_event import EventType
+
+
+class ListingImageVariantSchema(BaseModel):
+    url: str
+    width: int
+    height: int
 
 
 class ListingImageSchema(BaseModel):
@@ -14,6 +23,7 @@ class ListingImageSchema(BaseModel):
     height: int
     url: str
     thumbnail_url: str
+    srcset: list[ListingImageVariantSchema]
 
 
 class ListingIssueDetailsSchema(BaseModel):
@@ -41,11 +51,40 @@ class FullListingSchema(ListingSchema):
     images: list[ListingImageSchema]
 
 
-class SearchListingsSchema(BaseModel):
+type ListingSortKey = Literal["created", "price", "title", "relevance"]
+
+
+class ListingFiltersSchema(BaseModel):
     statuses: list[ListingStatus] | None = None
     owners: list[str] | None = None
     types: list[ListingType] | None = None
     has_issues: bool | None = None
+    query: str | None = None
+
+
+class SearchListingsSchema(ListingFiltersSchema):
+    sort: ListingSortKey = Field(
+        default="created",
+        description="Prices are free text, so price order is text order rather than by "
+        'amount: "£100" comes before "£20", and listings without a price come first.',
+    )
+    limit: int = Field(default=50, ge=1, le=200)
+    cursor: str | None = None
+
+
+class ListingSearchResultsSchema(BaseModel):
+    listings: list[FullListingSchema]
+    next_cursor: str | None
+
+
+class ListingStreamEventSchema(BaseModel):
+    # The listing's id
+    id: int
+    type: EventType
+    # Whether the listing still matches the stream's filters, or should be removed
+    matches: bool
+    # Only included when the listing matches
+    listing: FullListingSchema | None = None
 
 
 class CreateListingSchema(BaseModel):
@@ -1,3 +1,4 @@
+from .event_digests import publish_event_digest
 from .reminders import send_reminders
 
-__all__ = ["send_reminders"]
+__all__ = ["publish_event_digest", "send_reminders"]
@@ -0,0 +1,193 @@
+from datetime import datetime, timezone
+from difflib import unified_diff
+from typing import Sequence
+
+from sqlalchemy import Select, select, update
+from sqlalchemy.orm import joinedload
+
+from shopkeeper.config import config
+from shopkeeper.db import write_session
+from shopkeeper.models.listing import Listing, stringify_diff_field
+from shopkeeper.models.listing_event import EventType, ListingEvent
+from shopkeeper.models.outbox_message import OutboxMessage, OutboxMessageType
+
+DISCORD_MESSAGE_LIMIT = 2000
+# Room for closing a code block at the end of a piece and reopening it in the next
+CODE_BLOCK_RESERVE = 16
+
+
+def unpublished_events_query() -> Select[tuple[ListingEvent]]:
+    return (
+        select(ListingEvent)
+        .options(joinedload(ListingEvent.listing))
+        .filter(ListingEvent.published_at.is_(None))
+        .order_by(ListingEvent.id)
+    )
+
+
+def merge_events(
+    events: Sequence[ListingEvent],
+) -> dict[EventType, tuple[str | None, str | None]]:
+    """Merge consecutive changes to a listing into one change per field, from the value
+    before the first change to the value after the last."""
+    changes: dict[EventType, tuple[str | None, str | None]] = {}
+    for event in events:
+        from_value = (
+            changes[event.type][0] if event.type in changes else event.from_value
+        )
+        changes[event.type] = (from_value, event.to_value)
+    return changes
+
+
+def render_change(
+    type: EventType, from_value: str | None, to_value: str | None
+) -> str | None:
+    match type:
+        case EventType.TitleChanged:
+            return f"Title changed from {from_value} to {to_value}"
+        case EventType.DescriptionChanged:
+            diff = unified_diff(
+                stringify_diff_field(from_value, "").splitlines(),
+                stringify_diff_field(to_value, "").splitlines(),
+                lineterm="",
+                fromfile="Old description",
+                tofile="New description",
+            )
+            return f"Description changed:\n```diff\n{'\n'.join(diff)}\n```"
+        case EventType.PriceChanged:
+            return f"Price changed from {stringify_diff_field(from_value)} to {stringify_diff_field(to_value)}"
+        case EventType.StatusChanged:
+            return f"Status changed from {from_value} to {to_value}"
+        case _:
+            # Images and moderation aren't announced
+            return None
+
+
+def render_listing_digest(
+    listing: Listing, events: Sequence[ListingEvent]
+) -> str | None:
+    """Describe what happened to a listing over a digest window, or None if nothing
+    worth mentioning did (e.g. a change was made and then reverted)."""
+    changes = merge_events(events)
+    heading = f"## Listing **[{listing.title}]({listing.url})**"
+
+    # The listing as it is now is already shown in the marketplace channel, so there's
+    # no need to go through what changed since it was created
+    if EventType.ListingCreated in changes:
+        return f"{heading} created"
+
+    sections = [
+        section
+        for type, (from_value, to_value) in changes.items()
+        if from_value != to_value
+        and (section := render_change(type, from_value, to_value)) is not None
+    ]
+    if not sections:
+        return None
+
+    return f"{heading} edited\n{'\n'.join(sections)}"
+
+
+def split_block(block: str, limit: int) -> list[str]:
+    """Split a block which is too long for one message by line (or within lines which
+    are too long by themselves), closing and reopening code blocks across pieces."""
+    line_limit = limit - CODE_BLOCK_RESERVE
+    lines = [
+        line[start : start + line_limit]
+        for line in block.split("\n")
+        for start in range(0, max(len(line), 1), line_limit)
+    ]
+
+    pieces: list[str] = []
+    piece: list[str] = []
+    length = 0
+    # The line which opened the code block the current line is in
+    code_block: str | None = None
+
+    for line in lines:
+        if piece and length + 1 + len(line) > line_limit:
+            if code_block is not None:
+                piece.append("```")
+            pieces.append("\n".join(piece))
+            piece = [code_block] if code_block is not None else []
+            length = len(code_block) if code_block is not None else 0
+
+        length += len(line) + (1 if piece else 0)
+        piece.append(line)
+
+        if line.startswith("```"):
+            code_block = None if code_block is not None else line
+
+    if piece:
+        pieces.append("\n".join(piece))
+
+    return pieces
+
+
+def chunk_message(
+    blocks: Sequence[str], limit: int = DISCORD_MESSAGE_LIMIT
+) -> list[str]:
+    """Pack blocks of text into as few messages as fit within Discord's length limit."""
+    chunks: list[str] = []
+    chunk = ""
+
+    for block in blocks:
+        for piece in split_block(block, limit) if len(block) > limit else [block]:
+            if chunk and len(chunk) + 1 + len(piece) > limit:
+                chunks.append(chunk)
+                chunk = piece
+            else:
+                chunk = f"{chunk}\n{piece}" if chunk else piece
+
+    if chunk:
+        chunks.append(chunk)
+
+    return chunks
+
+
+async def publish_event_digest() -> None:
+    """Post the listing events since the last digest to the events channel, merged per
+    listing, as one message (or as few as fit within Discord's length limit)."""
+    async with write_session() as session:
+        events = (await session.execute(unpublished_events_query())).scalars().all()
+        if not events:
+            return
+
+        # Without an events channel the events are still marked as published, so that
+        # configuring one later doesn't post the whole history
+        if config.events_channel_id is not None:
+            events_by_listing: dict[int, list[ListingEvent]] = {}
+            for event in events:
+                events_by_listing.setdefault(event.listing_id, []).append(event)
+
+            blocks = [
+                block
+                for listing_events in events_by_listing.values()
+                if (
+                    block := render_listing_digest(
+                        listing_events[0].listing, listing_events
+                    )
+                )
+                is not None
+            ]
+
+            for content in chunk_message(blocks):
+                await OutboxMessage.enqueue(
+                    session,
+                    OutboxMessageType.ChannelMessage,
+                    {"channel_id": config.events_channel_id, "content": content},
+                )
+
+        await session.execute(
+            update(ListingEvent)
+            .filter(
+                ListingEvent.published_at.is_(None),
+                ListingEvent.id <= events[-1].id,
+            )
+            .values(published_at=datetime.now(tz=timezone.utc))
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+
+__all__ = ["publish_event_digest"]
@@ -1,50 +1,88 @@
-from itertools import groupby
+from datetime import datetime, timedelta, timezone
 from typing import cast
 
 import discord
-from sqlalchemy import select
+from sqlalchemy import Select, func, or_, select
+from sqlalchemy.dialects.sqlite import insert
 
 from shopkeeper.bot import client
 from shopkeeper.config import config
-from shopkeeper.db import async_session
+from shopkeeper.db import write_session
 from shopkeeper.models.listing import Listing, ListingStatus
+from shopkeeper.models.outbox_message import OutboxMessage, OutboxMessageType
+from shopkeeper.models.user_reminder import UserReminder
 
 
 def pluralise(count: int, singular: str, plural: str) -> str:
     return singular if count == 1 else plural
 
 
+def reminders_due_query(reminded_before: datetime) -> Select[tuple[int, int]]:
+    """Count the open listings with issues of each user who hasn't been reminded about
+    them since the given time."""
+    return (
+        select(Listing.owner_id, func.count())
+        .outerjoin(UserReminder, UserReminder.user_id == Listing.owner_id)
+        .filter(Listing.get_issues_clause())
+        .filter(Listing.status != ListingStatus.Closed)
+        .filter(
+            or_(
+                UserReminder.last_reminded_at.is_(None),
+                UserReminder.last_reminded_at <= reminded_before,
+            )
+        )
+        .group_by(Listing.owner_id)
+    )
+
+
 async def send_reminders():
+    await client.wait_until_ready()
     guild = cast(discord.Guild, client.get_guild(config.guild_id))
-    guild_members = guild.members
+    now = datetime.now(tz=timezone.utc)
 
-    async with async_session() as session:
-        pending_listings_with_issues = (
-            (
+    async with write_session() as session:
+        issues_by_user = {
+            user_id: issues_count
+            for user_id, issues_count in (
                 await session.execute(
-                    select(Listing)
-                    .filter(
-                        Listing.owner_id.in_([member.id for member in guild_members])
+                    reminders_due_query(
+                        now - timedelta(seconds=config.reminder_interval)
                     )
-                    .filter(Listing.get_issues_clause())
-                    .filter(Listing.status != ListingStatus.Closed)
                 )
-            )
-            .scalars()
-            .all()
-        )
-
-        issues_by_user = {
-            k: len(list(v))
-            for k, v in groupby(pending_listings_with_issues, key=lambda x: x.owner_id)
+            ).all()
+            # Users who have left can't be messaged
+            if guild.get_member(user_id) is not None
         }
 
+        if not issues_by_user:
+            return
+
+        # Sent by the outbox worker, which limits how many are sent at once and backs off
+        # when rate limited. They are recorded as sent in the same transaction, so a
+        # restart neither sends them twice nor skips them.
         for user_id, issues_count in issues_by_user.items():
-            user = guild.get_member(user_id)
-            if user:
-                await user.send(
-                    f"You have {issues_count} active {pluralise(issues_count, 'listing', 'listings')} with issues that need your attention. Please check the Shopkeeper UI for more details."
-                )
+            await OutboxMessage.enqueue(
+                session,
+                OutboxMessageType.DirectMessage,
+                {
+                    "user_id": user_id,
+                    "content": f"You have {issues_count} active {pluralise(issues_count, 'listing', 'listings')} with issues that need your attention. Please check the Shopkeeper UI for more details.",
+                },
+            )
+
+        statement = insert(UserReminder).values(
+            [
+                {"user_id": user_id, "last_reminded_at": now}
+                for user_id in issues_by_user
+            ]
+        )
+        await session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[UserReminder.user_id],
+                set_={"last_reminded_at": statement.excluded.last_reminded_at},
+            )
+        )
+        await session.commit()
 
 
 __all__ = ["send_reminders"]